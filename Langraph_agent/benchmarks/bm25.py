@@ -0,0 +1,58 @@
+"""BM25 query latency on a synthetic corpus with a Zipf-distributed vocabulary.
+
+Usage:
+    python -m benchmarks.bm25 --chunks 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src.core.bm25 import BM25Index
+
+
+def synthetic_chunks(count: int, words: int, vocabulary: int, rng: np.random.Generator):
+    """Yield chunk texts whose word frequencies follow Zipf's law, like natural text."""
+    terms = np.array([f"w{i}" for i in range(vocabulary)])
+    for _ in range(count):
+        ranks = np.minimum(rng.zipf(1.1, words), vocabulary) - 1
+        yield " ".join(terms[ranks])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=200_000)
+    parser.add_argument("--words", type=int, default=150)
+    parser.add_argument("--vocabulary", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-terms", type=int, default=4)
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    index = BM25Index()
+    start = time.perf_counter()
+    batch_size = 10_000
+    for first in range(0, args.chunks, batch_size):
+        count = min(batch_size, args.chunks - first)
+        index.add(range(first, first + count), list(synthetic_chunks(count, args.words, args.vocabulary, rng)))
+    build_seconds = time.perf_counter() - start
+
+    # Queries mix common and rare terms, like an identifier plus context words
+    queries = [
+        " ".join(f"w{rank}" for rank in np.minimum(rng.zipf(1.1, args.query_terms), args.vocabulary) - 1)
+        for _ in range(args.queries)
+    ]
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, args.k)
+        latencies.append(1000 * (time.perf_counter() - start))
+
+    print(f"chunks={args.chunks} terms={len(index.vocabulary)} build={build_seconds:.1f}s")
+    print(f"ms/query p50={np.percentile(latencies, 50):.2f} p95={np.percentile(latencies, 95):.2f} "
+          f"p99={np.percentile(latencies, 99):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Ingestion with and without duplicate detection on a corpus with exact, re-exported and edited copies.
+
+Documents go through DocumentManager and RetrievalAgent with FakeEmbeddings
+(optionally with simulated API latency). A share of the uploads are byte
+copies, copies with changed case and whitespace (like a re-exported file) or
+copies with a few words edited, so each mode reports how many chunks had to be
+embedded and how long ingestion took.
+
+Usage:
+    python -m benchmarks.dedup --documents 300 --duplicate-share 0.33 --embedding-latency-ms 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.bm25 import synthetic_chunks
+
+
+def corpus(args: argparse.Namespace, rng: np.random.Generator):
+    """Yield (filename, bytes): originals, with a share of them copied, re-exported or edited."""
+    originals = []
+    for n, text in enumerate(synthetic_chunks(args.documents, args.document_words, 50_000, rng)):
+        if originals and rng.random() < args.duplicate_share:
+            source = originals[rng.integers(len(originals))]
+            kind = rng.integers(3)
+            if kind == 0:
+                text = source
+            elif kind == 1:
+                text = source.upper().replace(" ", "\n")
+            else:
+                words = source.split()
+                for position in rng.integers(len(words), size=max(1, len(words) // 300)):
+                    words[position] = f"edit{position}"
+                text = " ".join(words)
+        else:
+            originals.append(text)
+        yield f"doc-{n}.txt", text.encode("utf-8")
+
+
+async def ingest(args: argparse.Namespace, storage_dir: Path, uploads) -> None:
+    from src.agents.retrieval import RetrievalAgent
+    from src.core.document_manager import DocumentManager, DuplicateDocumentError
+    from src.core.fake_models import FakeEmbeddings
+
+    agent = RetrievalAgent(storage_dir / "vectors", FakeEmbeddings(args.dimension, args.embedding_latency_ms / 1000))
+    manager = DocumentManager(str(storage_dir), vector_index=agent)
+    duplicates = 0
+    start = time.perf_counter()
+    for filename, data in uploads:
+        try:
+            stored = await manager.store_document(filename, data, {})
+        except DuplicateDocumentError:
+            duplicates += 1
+            continue
+        await manager.index_documents([stored])
+    seconds = time.perf_counter() - start
+    chunks = manager.db.execute("SELECT SUM(chunk_count) FROM documents").fetchone()[0]
+    print(f"  {len(uploads)} uploads ({duplicates} duplicate files) in {seconds:.2f}s; "
+          f"{len(agent.vector_store)} of {chunks} document chunks embedded and indexed")
+    manager.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--document-words", type=int, default=3000)
+    parser.add_argument("--duplicate-share", type=float, default=0.33)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0)
+    parser.add_argument("--modes", nargs="+", default=["off", "link"], choices=["off", "skip", "link"])
+    args = parser.parse_args()
+
+    # Settings are read at import time, so configure the fake models first
+    os.environ.update(
+        MODEL_PROVIDER="fake",
+        FAKE_EMBEDDING_DIMENSION=str(args.dimension),
+        EMBEDDING_CACHE_ENABLED="false",
+    )
+    from src.config.settings import get_settings
+
+    uploads = list(corpus(args, np.random.default_rng(42)))
+    for mode in args.modes:
+        get_settings().DEDUP_MODE = mode
+        print(f"DEDUP_MODE={mode}")
+        with tempfile.TemporaryDirectory() as storage_dir:
+            asyncio.run(ingest(args, Path(storage_dir), uploads))
+
+
+if __name__ == "__main__":
+    main()
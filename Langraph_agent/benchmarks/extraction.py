@@ -0,0 +1,109 @@
+"""PDF text extraction: in-process vs process pool, over synthetic PDFs.
+
+Also reports the worst event-loop stall seen while each extraction runs,
+which is what other clients of the same worker experience.
+
+Usage:
+    python -m benchmarks.extraction --pages 10 100 500
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+from src.core.extraction import _extract_pdf_range, extract_pdf_pages, get_extraction_pool
+
+LINE = "Synthetic benchmark text with identifiers like ERR-4021 and part 7731-B."
+
+
+def synthetic_pdf(page_count: int, lines_per_page: int = 40) -> bytes:
+    """Build a minimal PDF with `page_count` pages of Helvetica text."""
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # Pages object, filled in once page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for page in range(page_count):
+        lines = "".join(
+            f"({LINE} page {page + 1} line {line + 1}) Tj T* " for line in range(lines_per_page)
+        )
+        stream = f"BT /F1 10 Tf 14 TL 40 800 Td {lines}ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, page_count)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+async def max_loop_stall(work) -> tuple:
+    """Run `work` while measuring the longest gap between event-loop ticks."""
+    stall = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal stall
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            stall = max(stall, now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)  # Let the ticker start
+    start = time.perf_counter()
+    result = await work()
+    elapsed = time.perf_counter() - start
+    done = True
+    await task
+    return result, elapsed, stall
+
+
+async def run(page_counts: List[int]) -> None:
+    # Start the workers before timing anything
+    await asyncio.gather(*(
+        asyncio.get_running_loop().run_in_executor(get_extraction_pool(), time.sleep, 0)
+        for _ in range(get_extraction_pool()._max_workers)
+    ))
+
+    print(f"{'pages':>6} {'inline s':>10} {'inline stall ms':>16} {'pool s':>8} {'pool stall ms':>14}")
+    for page_count in page_counts:
+        data = synthetic_pdf(page_count)
+
+        async def inline():
+            return _extract_pdf_range(data, 0, page_count)
+
+        inline_pages, inline_s, inline_stall = await max_loop_stall(inline)
+        pool_pages, pool_s, pool_stall = await max_loop_stall(lambda: extract_pdf_pages(data))
+        assert inline_pages == pool_pages
+        print(
+            f"{page_count:>6} {inline_s:>10.2f} {1000 * inline_stall:>16.1f} "
+            f"{pool_s:>8.2f} {1000 * pool_stall:>14.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500])
+    args = parser.parse_args()
+    asyncio.run(run(args.pages))
+
+
+if __name__ == "__main__":
+    main()
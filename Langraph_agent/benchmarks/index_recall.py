@@ -0,0 +1,55 @@
+"""Recall@k vs latency report for the supported FAISS index types.
+
+Usage:
+    python -m benchmarks.index_recall --vectors 200000 --dimension 768
+"""
+import argparse
+
+import numpy as np
+
+from src.config.settings import Settings
+from src.core.index_backends import INDEX_TYPES, benchmark_index_types
+
+
+def clustered_vectors(count: int, dimension: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Generate float32 vectors around random centres, like real embeddings."""
+    centres = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    labels = rng.integers(0, clusters, count)
+    noise = 0.3 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return np.ascontiguousarray(centres[labels] + noise)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--pq-m", type=int, default=64)
+    parser.add_argument("--index-types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    args = parser.parse_args()
+
+    settings = Settings(
+        GOOGLE_API_KEY="unused",
+        IVF_NLIST=args.nlist,
+        IVF_NPROBE=args.nprobe,
+        PQ_M=args.pq_m,
+        INDEX_TRAIN_MIN_VECTORS=0,
+    )
+    rng = np.random.default_rng(42)
+    vectors = clustered_vectors(args.vectors, args.dimension, args.nlist, rng)
+    queries = clustered_vectors(args.queries, args.dimension, args.nlist, rng)
+
+    report = benchmark_index_types(vectors, queries, settings, k=args.k, index_types=tuple(args.index_types))
+    print(f"{'index':<10} {'recall@' + str(args.k):>10} {'ms/query':>10} {'build s':>10}")
+    for row in report:
+        print(
+            f"{row['index_type']:<10} {row[f'recall@{args.k}']:>10.3f} "
+            f"{row['latency_ms']:>10.3f} {row['build_s']:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
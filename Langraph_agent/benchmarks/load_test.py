@@ -0,0 +1,122 @@
+"""HTTP load test for /api/v1/ask, reporting latency percentiles and throughput.
+
+By default the app runs in-process with fake models (MODEL_PROVIDER=fake)
+and simulated model latency, so no Google API calls are made. Pass --url to
+load-test a running server instead (start it with MODEL_PROVIDER=fake to stay
+offline); time to first token is only measurable that way.
+
+Usage:
+    python -m benchmarks.load_test --requests 2000 --concurrency 64 --llm-latency-ms 300
+    python -m benchmarks.load_test --url http://localhost:8000 --stream
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from contextlib import AsyncExitStack
+from typing import List, Optional
+
+import httpx
+import numpy as np
+
+from benchmarks.bm25 import synthetic_chunks
+
+
+def report(name: str, latencies: List[float], seconds: float) -> None:
+    if not latencies:
+        print(f"{name}: no successful requests")
+        return
+    print(f"{name}: " + " ".join(f"p{p}={np.percentile(latencies, p):.1f}ms" for p in (50, 95, 99))
+          + f" mean={np.mean(latencies):.1f}ms throughput={len(latencies) / seconds:.1f} req/s")
+
+
+async def run(args: argparse.Namespace) -> None:
+    async with AsyncExitStack() as stack:
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=120)
+        else:
+            from src.main import app
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            transport = httpx.ASGITransport(app=app)
+            client = httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120)
+        client = await stack.enter_async_context(client)
+
+        rng = np.random.default_rng(42)
+        texts = list(synthetic_chunks(args.documents, 2000, 50_000, rng))
+        for n, text in enumerate(texts):
+            response = await client.post(
+                "/api/v1/documents/upload",
+                files=[("file", (f"load-{n}.txt", text.encode("utf-8")))]
+            )
+            response.raise_for_status()
+
+        # Distinct questions, so the answer cache does not short-circuit the workflow
+        questions = iter(f"{' '.join(texts[n % len(texts)].split()[n % 50:n % 50 + 5])} #{n}" for n in range(args.requests))
+        latencies: List[float] = []
+        first_token: List[float] = []
+        errors = 0
+
+        async def worker() -> None:
+            nonlocal errors
+            for question in questions:
+                payload = {"query": question}
+                start = time.perf_counter()
+                try:
+                    if args.stream:
+                        ttft: Optional[float] = None
+                        async with client.stream("POST", "/api/v1/ask/stream", json=payload) as response:
+                            response.raise_for_status()
+                            async for line in response.aiter_lines():
+                                if ttft is None and line == "event: token":
+                                    ttft = 1000 * (time.perf_counter() - start)
+                                if line == "event: error":
+                                    raise RuntimeError("stream error")
+                        if ttft is not None:
+                            first_token.append(ttft)
+                    else:
+                        response = await client.post("/api/v1/ask", json=payload)
+                        response.raise_for_status()
+                except Exception:
+                    errors += 1
+                    continue
+                latencies.append(1000 * (time.perf_counter() - start))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        seconds = time.perf_counter() - start
+
+    print(f"requests={args.requests} concurrency={args.concurrency} errors={errors} time={seconds:.1f}s")
+    report("/ask/stream total" if args.stream else "/ask", latencies, seconds)
+    if args.stream and not args.url:
+        print("time to first token: needs --url (the in-process transport buffers response bodies)")
+    elif first_token:
+        print("time to first token: " + " ".join(f"p{p}={np.percentile(first_token, p):.1f}ms" for p in (50, 95, 99)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Base URL of a running server; default runs the app in-process")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--documents", type=int, default=20, help="Synthetic documents uploaded first")
+    parser.add_argument("--stream", action="store_true", help="Use /ask/stream and report time to first token")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-token-latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    if not args.url:
+        # Settings are read at import time, so configure the in-process app first
+        os.environ.update(
+            MODEL_PROVIDER="fake",
+            FAKE_EMBEDDING_LATENCY_MS=str(args.embedding_latency_ms),
+            FAKE_LLM_LATENCY_MS=str(args.llm_latency_ms),
+            FAKE_LLM_TOKEN_LATENCY_MS=str(args.llm_token_latency_ms),
+        )
+        os.environ.setdefault("STORAGE_DIR", tempfile.mkdtemp(prefix="load-test-"))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Several processes writing to and reading from one shared index directory.
+
+Each process plays an API worker: it adds and removes chunks through
+vector store transactions while querying the generations published by the
+others. Every chunk's vector is derived from its text, so a reader can check
+that the index, lexical index and docstore it is serving agree. At the end
+all processes must converge on the same generation and contents.
+
+Usage:
+    python -m benchmarks.multiprocess_consistency --processes 4 --rounds 20
+"""
+import argparse
+import multiprocessing
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+DIMENSION = 16
+
+
+class _NoEmbeddings:
+    """Stand-in for the embedding model; vectors are supplied directly."""
+
+
+def chunk_vector(text: str) -> np.ndarray:
+    """Deterministic vector for a chunk text."""
+    return np.random.default_rng(zlib.crc32(text.encode())).standard_normal(DIMENSION).astype(np.float32)
+
+
+def check_generation(store) -> int:
+    """Assert the served generation is internally consistent; return its live chunk count."""
+    live = [i for i in range(len(store.documents)) if i not in store.documents.deleted]
+    assert len(live) == len(store) == len(store.lexical), "docstore and lexical index disagree"
+    if live:
+        texts = [store.documents[i][0] for i in live]
+        expected = np.stack([chunk_vector(text) for text in texts])
+        assert np.allclose(store.reconstruct(live), expected), "index and docstore disagree"
+        text = texts[len(texts) // 2]
+        assert store.search(chunk_vector(text), k=1)[0][0] == live[len(texts) // 2], "vector search missed"
+        assert store.lexical_search(text.split()[-1], k=1)[0][0] == live[len(texts) // 2], "BM25 missed"
+    return len(live)
+
+
+def worker(storage_dir: str, worker_id: int, rounds: int, batch: int, barrier) -> Tuple[int, List[str], List[str]]:
+    """Write and verify chunks; return (final generation, added texts, removed texts)."""
+    from src.core.vector_store import VectorStore
+
+    store = VectorStore(_NoEmbeddings(), storage_dir)
+    rng = np.random.default_rng(worker_id)
+    added: Dict[str, int] = {}
+    removed: List[str] = []
+    for round_number in range(rounds):
+        texts = [f"worker {worker_id} round {round_number} chunk {n} w{worker_id}r{round_number}c{n}" for n in range(batch)]
+        with store.transaction() as writer:
+            ids = writer.add_vectors(np.stack([chunk_vector(t) for t in texts]), [(t, f"w{worker_id}", None, 0) for t in texts])
+        added.update(zip(texts, ids))
+
+        if round_number % 3 == 2:
+            text = rng.choice(sorted(set(added) - set(removed)))
+            with store.transaction() as writer:
+                writer.remove([added[text]])
+            removed.append(text)
+
+        store.refresh(force=True)
+        check_generation(store)
+
+    # Wait for every writer, then converge on the final generation
+    barrier.wait()
+    store.refresh(force=True)
+    check_generation(store)
+    return store.generation, list(added), removed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        context = multiprocessing.get_context("spawn")
+        barrier = context.Manager().Barrier(args.processes)
+        start = time.perf_counter()
+        with context.Pool(args.processes) as pool:
+            results = pool.starmap(
+                worker,
+                [(storage_dir, n, args.rounds, args.batch, barrier) for n in range(args.processes)]
+            )
+        seconds = time.perf_counter() - start
+
+        from src.core.vector_store import VectorStore
+
+        store = VectorStore(_NoEmbeddings(), storage_dir)
+        generations = {generation for generation, _, _ in results}
+        added = [text for _, texts, _ in results for text in texts]
+        removed = {text for _, _, texts in results for text in texts}
+        served = [store.documents[i][0] for i in range(len(store.documents)) if i not in store.documents.deleted]
+
+        assert generations == {store.generation}, f"workers ended on generations {generations}"
+        assert sorted(served) == sorted(set(added) - removed), "lost or duplicated chunks"
+        check_generation(store)
+        files = sorted(p.name for p in Path(storage_dir).iterdir() if p.name.startswith(("index-", "lexical-")))
+
+    print(f"processes={args.processes} transactions={store.generation} chunks={len(served)} "
+          f"removed={len(removed)} time={seconds:.1f}s")
+    print(f"snapshot files left: {files}")
+    print("consistent")
+
+
+if __name__ == "__main__":
+    main()
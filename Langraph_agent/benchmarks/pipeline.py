@@ -0,0 +1,89 @@
+"""Offline micro-benchmarks for ingestion, indexing and retrieval with fake models.
+
+Ingestion chunks and embeds synthetic documents through RetrievalAgent with
+FakeEmbeddings (optionally with simulated API latency). Indexing and search
+run at each corpus size on clustered random vectors and Zipf-distributed
+chunk texts, so large corpora do not wait on embedding.
+
+Usage:
+    python -m benchmarks.pipeline --sizes 10000 100000 1000000 --embedding-latency-ms 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.bm25 import synthetic_chunks
+from benchmarks.index_recall import clustered_vectors
+
+
+def percentiles(latencies) -> str:
+    return " ".join(f"p{p}={np.percentile(latencies, p):.2f}ms" for p in (50, 95, 99))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--documents", type=int, default=200, help="Synthetic documents for the ingestion run")
+    parser.add_argument("--document-words", type=int, default=3000)
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--index-type", default="flat")
+    args = parser.parse_args()
+
+    # Settings are read at import time, so configure the fake models first
+    os.environ.update(
+        MODEL_PROVIDER="fake",
+        FAKE_EMBEDDING_DIMENSION=str(args.dimension),
+        FAKE_EMBEDDING_LATENCY_MS=str(args.embedding_latency_ms),
+        INDEX_TYPE=args.index_type,
+        EMBEDDING_CACHE_ENABLED="false",
+    )
+    from src.agents.retrieval import RetrievalAgent
+    from src.core.fake_models import FakeEmbeddings
+
+    embeddings = FakeEmbeddings(args.dimension, args.embedding_latency_ms / 1000)
+    rng = np.random.default_rng(42)
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        agent = RetrievalAgent(Path(storage_dir) / "ingest", embeddings=embeddings)
+        documents = [
+            (text, f"doc-{n}.txt", None)
+            for n, text in enumerate(synthetic_chunks(args.documents, args.document_words, 50_000, rng))
+        ]
+        start = time.perf_counter()
+        chunk_ids = asyncio.run(agent.add_documents(documents))
+        seconds = time.perf_counter() - start
+        chunks = sum(len(ids) for ids in chunk_ids)
+        print(f"ingestion: {args.documents} documents, {chunks} chunks in {seconds:.2f}s "
+              f"({chunks / seconds:.0f} chunks/s, chunk+embed+index+snapshot)")
+
+        for size in args.sizes:
+            agent = RetrievalAgent(Path(storage_dir) / f"n{size}", embeddings=embeddings)
+            texts = list(synthetic_chunks(size, 150, 200_000, rng))
+            vectors = clustered_vectors(size, args.dimension, 256, rng)
+            records = [(text, "synthetic.txt", None, 0) for text in texts]
+
+            start = time.perf_counter()
+            agent._commit_vectors(vectors, records)
+            index_seconds = time.perf_counter() - start
+            print(f"\nchunks={size}: index+snapshot {index_seconds:.2f}s ({size / index_seconds:.0f} chunks/s)")
+
+            queries = [" ".join(text.split()[:6]) for text in texts[:args.queries]]
+            for mode in ("vector", "lexical", "hybrid"):
+                latencies = []
+                for query in queries:
+                    state = {"query": query, "retrieval_mode": mode, "top_k": None, "score_threshold": None}
+                    start = time.perf_counter()
+                    agent(state)
+                    latencies.append(1000 * (time.perf_counter() - start))
+                print(f"  retrieve {mode:<8} {percentiles(latencies)}")
+
+
+if __name__ == "__main__":
+    main()
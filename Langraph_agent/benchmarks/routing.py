@@ -0,0 +1,111 @@
+"""Latency and LLM tokens on mixed traffic with and without query routing.
+
+Questions go through ConversationalWorkflow with fake models: a share of
+small talk, short factual questions and longer analytical ones, asked of an
+empty collection and then of an indexed one. The simple model is simulated
+with a lower latency than the main one. The answer cache is turned off, so
+only routing saves model calls.
+
+Usage:
+    python -m benchmarks.routing --questions 400 --llm-latency-ms 800 --simple-llm-latency-ms 250
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from benchmarks.bm25 import synthetic_chunks
+
+SMALL_TALK = ["hi", "Hello there!", "thanks", "Thank you so much", "ok thanks", "bye"]
+SIMPLE = ["What is {w}?", "Who wrote about {w}?", "When was {w} introduced?", "How many {w} are listed?"]
+FULL = [
+    "Explain how {w} relates to the other topics and why it matters",
+    "Compare {w} with the alternatives discussed in the documents",
+    "Summarize everything the documents say about {w}, including open questions",
+]
+
+
+def traffic(args: argparse.Namespace, vocabulary: List[str], rng: np.random.Generator) -> List[str]:
+    """Distinct questions mixing small talk, simple and full questions in the given shares."""
+    questions = []
+    for n in range(args.questions):
+        draw = rng.random()
+        if draw < args.small_talk_share:
+            questions.append(SMALL_TALK[n % len(SMALL_TALK)])
+            continue
+        templates = SIMPLE if draw < args.small_talk_share + args.simple_share else FULL
+        questions.append(templates[n % len(templates)].format(w=f"{vocabulary[n % len(vocabulary)]} {n}"))
+    return questions
+
+
+async def run(args: argparse.Namespace, questions: List[str], texts: List[str]) -> None:
+    from prometheus_client import REGISTRY
+    from src.config.settings import get_settings
+    from src.core.document_manager import DocumentManager
+    from src.core.fake_models import FakeChatModel
+    from src.core.workflow import ConversationalWorkflow
+
+    def prompt_tokens() -> float:
+        return REGISTRY.get_sample_value("rag_llm_tokens_total", {"kind": "prompt"}) or 0.0
+
+    for routing in (False, True):
+        get_settings().QUERY_ROUTING_ENABLED = routing
+        with tempfile.TemporaryDirectory() as storage_dir:
+            manager = DocumentManager(str(Path(storage_dir)))
+            workflow = ConversationalWorkflow(
+                manager,
+                llm=FakeChatModel(latency_seconds=args.llm_latency_ms / 1000),
+                simple_llm=FakeChatModel(latency_seconds=args.simple_llm_latency_ms / 1000)
+            )
+            for corpus in ("empty", "indexed"):
+                if corpus == "indexed":
+                    stored = [
+                        await manager.store_document(f"doc-{n}.txt", text.encode("utf-8"), {})
+                        for n, text in enumerate(texts)
+                    ]
+                    await manager.index_documents(stored)
+                tokens = prompt_tokens()
+                pending = iter(questions)
+                latencies: List[float] = []
+
+                async def worker() -> None:
+                    for question in pending:
+                        start = time.perf_counter()
+                        await workflow.aexecute(question)
+                        latencies.append(1000 * (time.perf_counter() - start))
+
+                await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+                print(f"routing={'on' if routing else 'off'} corpus={corpus}: "
+                      f"mean={np.mean(latencies):.0f}ms p50={np.percentile(latencies, 50):.0f}ms "
+                      f"p95={np.percentile(latencies, 95):.0f}ms "
+                      f"prompt tokens/question={(prompt_tokens() - tokens) / len(questions):.0f}")
+            workflow.close()
+            manager.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--small-talk-share", type=float, default=0.15)
+    parser.add_argument("--simple-share", type=float, default=0.45)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--simple-llm-latency-ms", type=float, default=250.0)
+    args = parser.parse_args()
+
+    # Settings are read at import time, so configure the fake models first
+    os.environ.update(MODEL_PROVIDER="fake", ANSWER_CACHE_ENABLED="false", EMBEDDING_CACHE_PERSIST="false")
+    rng = np.random.default_rng(42)
+    texts = list(synthetic_chunks(args.documents, 2000, 50_000, rng))
+    vocabulary = sorted({word for text in texts[:5] for word in text.split()})
+    asyncio.run(run(args, traffic(args, vocabulary, rng), texts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Vector search latency across shard counts and query batch sizes.
+
+Part one searches the index directly with 2-D query matrices of each batch
+size. Part two sends concurrent single queries through the SearchBatcher,
+as /ask requests do, and reports how many were coalesced per index call.
+
+Usage:
+    python -m benchmarks.sharded_search --vectors 200000 --shards 1 2 4 8 --batch-sizes 1 8 32
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from benchmarks.index_recall import clustered_vectors
+from src.config.settings import Settings
+from src.core.index_backends import INDEX_TYPES, create_backend
+from src.core.search_batcher import SearchBatcher
+
+
+def build(vectors: np.ndarray, settings: Settings):
+    """Index the vectors under sequential ids."""
+    backend = create_backend(settings.INDEX_TYPE, vectors.shape[1], settings)
+    backend.add(vectors, np.arange(len(vectors), dtype=np.int64))
+    return backend
+
+
+def batched_latency(backend, queries: np.ndarray, batch_size: int, k: int) -> float:
+    """Milliseconds per query when searching `batch_size` queries per call."""
+    start = time.perf_counter()
+    for first in range(0, len(queries), batch_size):
+        backend.search(queries[first:first + batch_size], k)
+    return 1000 * (time.perf_counter() - start) / len(queries)
+
+
+async def coalesced(backend, queries: np.ndarray, k: int, concurrency: int, max_batch: int):
+    """Run queries from `concurrency` concurrent clients through a batcher; return (queries/s, mean batch)."""
+    def search(matrix: np.ndarray, fetch: int):
+        _, ids = backend.search(matrix, fetch)
+        return [[(int(i), 0.0) for i in row] for row in ids]
+
+    batcher = SearchBatcher(search, max_batch=max_batch)
+    pending = iter(queries)
+
+    async def client():
+        for query in pending:
+            await batcher.search(query, k)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    return len(queries) / seconds, batcher.queries / batcher.batches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--index-type", default="flat", choices=INDEX_TYPES)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    vectors = clustered_vectors(args.vectors, args.dimension, 256, rng)
+    queries = clustered_vectors(args.queries, args.dimension, 256, rng)
+
+    print(f"{'shards':>6} " + " ".join(f"{'batch ' + str(b) + ' ms/q':>14}" for b in args.batch_sizes)
+          + f" {'coalesced q/s':>14} {'mean batch':>10} {'uncoalesced q/s':>16}")
+    for shards in args.shards:
+        settings = Settings(GOOGLE_API_KEY="unused", INDEX_TYPE=args.index_type, INDEX_SHARDS=shards,
+                            INDEX_TRAIN_MIN_VECTORS=0, IVF_NLIST=256)
+        backend = build(vectors, settings)
+        latencies = [batched_latency(backend, queries, batch, args.k) for batch in args.batch_sizes]
+        throughput, mean_batch = asyncio.run(coalesced(backend, queries, args.k, args.concurrency, 64))
+        baseline, _ = asyncio.run(coalesced(backend, queries, args.k, args.concurrency, 1))
+        print(f"{shards:>6} " + " ".join(f"{ms:>14.3f}" for ms in latencies)
+              + f" {throughput:>14.0f} {mean_batch:>10.1f} {baseline:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Memory per chunk, recall and latency of each index encoding, with and without re-scoring.
+
+Builds a vector store per INDEX_ENCODING on clustered random vectors and
+synthetic chunk texts, reopens it as a serving worker would, and reports the
+index's resident bytes per chunk, the docstore's Python heap per chunk (next
+to the per-row tuples older versions kept) and recall@k against exact search.
+
+Usage:
+    python -m benchmarks.vector_memory --chunks 1000000 --dimension 768 --encodings float32 fp16 int8
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.index_recall import clustered_vectors
+
+
+class _NoEmbeddings:
+    """Stand-in for the embedding model; vectors are supplied directly."""
+
+
+def heap_bytes(build) -> int:
+    """Python heap allocated by `build()` and still held by its result."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=200_000)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--encodings", nargs="+", default=["float32", "fp16", "int8"])
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    os.environ.update(MODEL_PROVIDER="fake", INDEX_TYPE=args.index_type, INDEX_TRAIN_MIN_VECTORS="10000")
+    import faiss
+    from src.config.settings import get_settings
+    from src.core.docstore import DocStore
+    from src.core.vector_store import VectorStore
+
+    settings = get_settings()
+    rng = np.random.default_rng(42)
+    vectors = clustered_vectors(args.chunks, args.dimension, 256, rng)
+    queries = clustered_vectors(args.queries, args.dimension, 256, rng)
+    records = [(f"chunk {n} text", f"document-{n // 40}.pdf", n % 40, 1000 * (n % 40)) for n in range(args.chunks)]
+    exact = faiss.IndexFlatL2(args.dimension)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+
+    # What older versions held per chunk: a (source, page, offset) tuple parsed from JSON
+    lines = [json.dumps([source, page, offset]) for _, source, page, offset in records]
+    legacy = heap_bytes(lambda: [tuple(json.loads(line)) for line in lines])
+    print(f"chunks={args.chunks} dimension={args.dimension} index={args.index_type}")
+    print(f"row metadata as Python tuples (before): {legacy / args.chunks:.0f} B/chunk")
+
+    for encoding in args.encodings:
+        settings.INDEX_ENCODING = encoding
+        settings.INDEX_RESCORE_FACTOR = args.rescore_factor
+        with tempfile.TemporaryDirectory() as storage_dir:
+            store = VectorStore(_NoEmbeddings(), storage_dir)
+            start = time.perf_counter()
+            with store.transaction() as writer:
+                writer.add_vectors(vectors, records)
+            build_seconds = time.perf_counter() - start
+
+            reader = VectorStore(_NoEmbeddings(), storage_dir)
+            manifest = reader._read_manifest()
+
+            def load_docstore() -> DocStore:
+                documents = DocStore(reader.keep_vectors)
+                documents.load(reader.storage_dir, manifest)
+                return documents
+
+            docstore = heap_bytes(load_docstore)
+            vectors_file = os.path.join(storage_dir, DocStore.VECTORS_FILE)
+            on_disk = os.path.getsize(vectors_file) if os.path.exists(vectors_file) else 0
+            print(f"\n{encoding}: build {build_seconds:.1f}s, index {reader.index.memory_bytes() / args.chunks:.0f} B/chunk, "
+                  f"docstore heap {docstore / args.chunks:.1f} B/chunk, full vectors on disk {on_disk / args.chunks:.0f} B/chunk")
+            for factor in ([0] if reader.index.exact else sorted({0, args.rescore_factor})):
+                settings.INDEX_RESCORE_FACTOR = factor
+                latencies, found = [], []
+                for query in queries:
+                    start = time.perf_counter()
+                    hits = reader.search(query, args.k)
+                    latencies.append(1000 * (time.perf_counter() - start))
+                    found.append([i for i, _ in hits])
+                recall = np.mean([len(set(t) & set(f)) / args.k for t, f in zip(truth, found)])
+                label = f"re-scoring x{factor}" if factor else "no re-scoring"
+                print(f"  {label:<16} recall@{args.k}={recall:.3f} p50={np.percentile(latencies, 50):.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,4 +2,7 @@ from typing import Dict, Any, Protocol
 
 class Agent(Protocol):
     def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+    async def ainvoke(self, state: Dict[str, Any]) -> Dict[str, Any]:
         ...
\ No newline at end of file
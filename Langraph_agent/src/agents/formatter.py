@@ -1,12 +1,18 @@
 from typing import Dict, Any
 from ..models.schema import WorkflowState
+from ..core.telemetry import stage
 
 class FormatterAgent:
     def __call__(self, state: WorkflowState) -> WorkflowState:
         """Format the final response."""
-        try:
-            # Use reasoning_output as the response if available
-            state["response"] = state.get("reasoning_output", "I apologize, but I couldn't process your request.")
-            return state
-        except Exception as e:
-            raise Exception(f"Error in formatter agent: {str(e)}")
\ No newline at end of file
+        with stage("format"):
+            try:
+                # Use reasoning_output as the response if available
+                state["response"] = state.get("reasoning_output", "I apologize, but I couldn't process your request.")
+                return state
+            except Exception as e:
+                raise Exception(f"Error in formatter agent: {str(e)}")
+
+    async def ainvoke(self, state: WorkflowState) -> WorkflowState:
+        """Format the final response (no I/O, so this runs inline)."""
+        return self(state)
\ No newline at end of file
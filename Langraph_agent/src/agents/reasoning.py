@@ -1,19 +1,54 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from functools import lru_cache
+from langchain_core.language_models.chat_models import BaseChatModel
 from ..models.schema import WorkflowState
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import ChatPromptTemplate
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
 from ..config.settings import get_settings
+from ..core.concurrency import get_model_limiter, get_rate_limiter
+from ..core.model_calls import call_with_retries
+from ..core.ranking import estimate_tokens
+from ..core.fake_models import FakeChatModel
+from ..core.telemetry import MODEL_CALL_SECONDS, record_llm_tokens, stage, timed
 
 settings = get_settings()
 
-class ReasoningAgent:
-    def __init__(self):
-        """Initialize the reasoning agent with LLM."""
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=settings.GOOGLE_API_KEY,
-            temperature=0.7
+CHAT_MODEL = "gemini-1.5-flash"
+
+@lru_cache()
+def get_chat_model(model: str = CHAT_MODEL) -> BaseChatModel:
+    """Process-wide chat model client per model name, so every collection shares one client and its pooled connections.
+
+    Retries are left to `call_with_retries`, which knows the rate limits,
+    so the client's own retries are turned off.
+    """
+    if settings.MODEL_PROVIDER == "fake":
+        return FakeChatModel(
+            latency_seconds=settings.FAKE_LLM_LATENCY_MS / 1000,
+            token_latency_seconds=settings.FAKE_LLM_TOKEN_LATENCY_MS / 1000
         )
+    # Imported on first use: the Gemini client library is slow to import
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model=model,
+        google_api_key=settings.GOOGLE_API_KEY,
+        temperature=0.7,
+        max_retries=1,
+        timeout=settings.MODEL_TIMEOUT_SECONDS
+    )
+
+class ReasoningAgent:
+    def __init__(self, llm: Optional[BaseChatModel] = None, simple_llm: Optional[BaseChatModel] = None):
+        """Initialize the reasoning agent with an LLM, by default the one MODEL_PROVIDER selects.
+
+        `simple_llm` answers questions routed as simple, by default the
+        SIMPLE_MODEL client; without either, every question goes to `llm`.
+        """
+        self.llm = llm if llm is not None else get_chat_model()
+        if simple_llm is None and settings.SIMPLE_MODEL:
+            simple_llm = get_chat_model(settings.SIMPLE_MODEL)
+        self.simple_llm = simple_llm
         
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """You are a highly knowledgeable AI assistant that provides detailed, accurate, and contextually appropriate responses. 
@@ -62,6 +97,8 @@ Response Guidelines Based on Question Type:
    - Provide supporting evidence if available
    - No follow-up needed unless specifically requested
 
+Earlier in this conversation: {summary}
+
 Current Context: {context}
 
 Current User: {user}
@@ -76,25 +113,123 @@ Remember to:
 4. Maintain professional tone
 5. Include relevant follow-up suggestions only when appropriate
 6. Make responses personal by acknowledging the user when relevant"""),
+            MessagesPlaceholder("history"),
+            ("user", "{query}")
+        ])
+        # Short factual questions outside a conversation skip the long response guidelines
+        self.simple_prompt = ChatPromptTemplate.from_messages([
+            ("system", "Answer the question briefly and directly using the context below. If the context "
+                       "does not contain the answer, say so.\n\nContext: {context}"),
             ("user", "{query}")
         ])
+        self.summary_prompt = ChatPromptTemplate.from_messages([
+            ("system", "Update the summary of a conversation with the new turns below. Keep names, facts, "
+                       "figures and open questions the user may refer back to. Reply with the summary only, "
+                       "in at most {words} words."),
+            ("user", "Summary so far: {summary}\n\nNew turns:\n{turns}")
+        ])
+
+    def _is_simple(self, state: WorkflowState) -> bool:
+        """Whether the question goes to the smaller model with the short prompt."""
+        return self.simple_llm is not None and state.get("route") == "simple"
+
+    def _build_messages(self, state: WorkflowState):
+        """Fill the prompt template from the workflow state."""
+        # Retrieval already packed the chunks to CONTEXT_TOKEN_BUDGET
+        context = "\n\n".join(state["retrieved_docs"]) if state["retrieved_docs"] else ""
+        if self._is_simple(state):
+            return self.simple_prompt.format_messages(context=context, query=state["query"])
+
+        # In a session, recent turns are replayed as messages and older ones summarized
+        history = []
+        for turn in state.get("history") or []:
+            history.extend([HumanMessage(turn["question"]), AIMessage(turn["answer"])])
+
+        return self.prompt.format_messages(
+            context=context,
+            query=state["query"],
+            user=state.get("user") or "Anonymous",
+            timestamp=settings.get_current_time(),
+            summary=state.get("summary") or "(nothing yet)",
+            history=history
+        )
+
+    async def asummarize(self, summary: Optional[str], turns: List[Dict[str, str]]) -> str:
+        """Fold conversation turns into a rolling summary."""
+        messages = self.summary_prompt.format_messages(
+            words=settings.SESSION_HISTORY_TOKENS // 4,
+            summary=summary or "(none)",
+            turns="\n".join(f"User: {turn['question']}\nAssistant: {turn['answer']}" for turn in turns)
+        )
+
+        async def call():
+            with timed(MODEL_CALL_SECONDS, "llm"):
+                return await self.llm.ainvoke(messages)
+
+        async with get_model_limiter():
+            response = await call_with_retries(
+                call, "llm", sum(estimate_tokens(str(message.content)) for message in messages)
+            )
+        self._record_usage(messages, response)
+        return str(response.content)
+
+    def _record_usage(self, messages, response) -> None:
+        """Count the call's tokens, estimating them when the model reports no usage.
+
+        Generated tokens are also charged to the LLM's tokens-per-minute budget.
+        """
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            prompt, completion = usage["input_tokens"], usage["output_tokens"]
+        else:
+            prompt = sum(estimate_tokens(str(message.content)) for message in messages)
+            completion = estimate_tokens(str(response.content))
+        record_llm_tokens(prompt, completion)
+        get_rate_limiter("llm").debit(completion)
 
     def __call__(self, state: WorkflowState) -> WorkflowState:
         """Process the query and generate a reasoned response."""
-        try:
-            context = "\n".join(state["retrieved_docs"]) if state["retrieved_docs"] else ""
-            
-            messages = self.prompt.format_messages(
-                context=context,
-                query=state["query"],
-                user="srikrishnavansi",
-                timestamp="2025-03-20 14:02:14"
-            )
+        with stage("reason"):
+            try:
+                messages = self._build_messages(state)
+                simple = self._is_simple(state)
+                llm = self.simple_llm if simple else self.llm
             
-            response = self.llm.invoke(messages)
+                with timed(MODEL_CALL_SECONDS, "llm_simple" if simple else "llm"):
+                    response = llm.invoke(messages)
+                self._record_usage(messages, response)
             
-            # Update state
-            state["reasoning_output"] = response.content
-            return state
-        except Exception as e:
-            raise Exception(f"Error in reasoning agent: {str(e)}")
\ No newline at end of file
+                # Update state
+                state["reasoning_output"] = response.content
+                return state
+            except Exception as e:
+                raise Exception(f"Error in reasoning agent: {str(e)}")
+
+    async def ainvoke(self, state: WorkflowState, config: Optional[RunnableConfig] = None) -> WorkflowState:
+        """Generate a reasoned response without blocking the event loop.
+
+        Passing the graph's `config` through lets callers of `astream_events`
+        receive the LLM's tokens as they are generated. Rate-limited and
+        unavailable calls are retried; those fail before the first token,
+        so a retry does not repeat streamed tokens.
+        """
+        with stage("reason"):
+            try:
+                messages = self._build_messages(state)
+                prompt_tokens = sum(estimate_tokens(str(message.content)) for message in messages)
+                simple = self._is_simple(state)
+                llm = self.simple_llm if simple else self.llm
+
+                async def call():
+                    with timed(MODEL_CALL_SECONDS, "llm_simple" if simple else "llm"):
+                        return await llm.ainvoke(messages, config=config)
+
+                async with get_model_limiter():
+                    response = await call_with_retries(call, "llm", prompt_tokens)
+                self._record_usage(messages, response)
+
+                # Update state
+                state["reasoning_output"] = response.content
+                return state
+            except Exception as e:
+                raise Exception(f"Error in reasoning agent: {str(e)}")
\ No newline at end of file
@@ -1,58 +1,352 @@
-from typing import Dict, Any, List, Tuple
+from typing import Any, Callable, List, Optional, Sequence, Tuple
 from ..models.schema import WorkflowState
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from ..config.settings import get_settings
-import faiss
+from ..core.chunking import TextChunker, iter_batches
+from ..core.vector_store import Snapshot, VectorStore
+from ..core.docstore import Record
+from ..core.dedup import Duplicate
+from ..core.search_batcher import Hits, SearchBatcher
+from ..core.bm25 import reciprocal_rank_fusion
+from ..core.ranking import cosine_similarities, maximal_marginal_relevance, pack_context
+from ..core.embedding_cache import CachedEmbeddings, get_embedding_cache
+from ..core.embedding_batcher import BatchedQueryEmbeddings
+from ..core.concurrency import get_model_limiter
+from ..core.model_calls import ResilientEmbeddings
+from ..core.telemetry import TimedEmbeddings, stage
+from ..core.fake_models import FakeEmbeddings
+from functools import lru_cache
+from pathlib import Path
+import asyncio
 import numpy as np
 
 settings = get_settings()
 
-class RetrievalAgent:
-    def __init__(self):
-        """Initialize the retrieval agent with vector store."""
-        self.embeddings = GoogleGenerativeAIEmbeddings(
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+
+
+def format_source(filename: str, page: Optional[int], offset: int) -> str:
+    """Format a chunk's location for display as a source."""
+    if page is not None:
+        return f"{filename} (page {page}, offset {offset})"
+    return f"{filename} (offset {offset})"
+
+
+@lru_cache()
+def get_embeddings():
+    """Process-wide embeddings client, so queries from every collection share batches, the cache,
+    the rate limits and one pool of API connections."""
+    if settings.MODEL_PROVIDER == "fake":
+        client = FakeEmbeddings(settings.FAKE_EMBEDDING_DIMENSION, settings.FAKE_EMBEDDING_LATENCY_MS / 1000)
+    else:
+        # Imported on first use: the Gemini client library is slow to import
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        client = GoogleGenerativeAIEmbeddings(
             model="models/embedding-001",
             google_api_key=settings.GOOGLE_API_KEY
         )
-        self.documents: List[Tuple[str, str]] = []  # List of (content, filename) tuples
-        self.index = None
-
-    async def add_document(self, content: str, filename: str) -> None:
-        """Add a document to the vector store."""
-        # Get embedding for document
-        embedding = self.embeddings.embed_documents([content])[0]
-        
-        # Initialize FAISS index if needed
-        if self.index is None:
-            dimension = len(embedding)
-            self.index = faiss.IndexFlatL2(dimension)
-            
-        # Add to FAISS index
-        self.index.add(np.array([embedding]))
-        self.documents.append((content, filename))
+    embeddings = ResilientEmbeddings(TimedEmbeddings(client))
+    if settings.QUERY_EMBED_BATCH_WINDOW_MS > 0:
+        # The batcher takes a model call slot per batch rather than per query
+        embeddings = BatchedQueryEmbeddings(
+            embeddings,
+            max_batch=settings.QUERY_EMBED_BATCH_SIZE,
+            window_seconds=settings.QUERY_EMBED_BATCH_WINDOW_MS / 1000,
+            limiter=get_model_limiter()
+        )
+    if settings.EMBEDDING_CACHE_ENABLED:
+        embeddings = CachedEmbeddings(embeddings, get_embedding_cache())
+    return embeddings
+
+
+class RetrievalAgent:
+    def __init__(self, storage_dir: Optional[Path] = None, embeddings: Optional[Any] = None):
+        """Initialize the retrieval agent with the vector store persisted in `storage_dir`.
+
+        `embeddings` replaces the process-wide client from `get_embeddings`, e.g. with a FakeEmbeddings.
+        """
+        self.embeddings = embeddings if embeddings is not None else get_embeddings()
+        self.chunker = TextChunker(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+        # Index and (content, filename, page, offset) records, restored from disk
+        self.vector_store = VectorStore(
+            embeddings=self.embeddings,
+            storage_dir=storage_dir or Path(settings.STORAGE_DIR) / "vectors"
+        )
+        # Concurrent async queries share one 2-D index search
+        self.search_batcher = SearchBatcher(
+            self.vector_store.search_batch,
+            max_batch=settings.SEARCH_BATCH_MAX,
+            window_seconds=settings.SEARCH_BATCH_WINDOW_MS / 1000
+        )
+
+    async def add_document(
+        self,
+        content: str,
+        filename: str,
+        page_offsets: Optional[List[int]] = None
+    ) -> List[int]:
+        """Chunk a document and add it to the vector store, returning its chunk ids."""
+        return (await self.add_documents([(content, filename, page_offsets)]))[0]
+
+    async def add_documents(
+        self,
+        documents: Sequence[Tuple[str, str, Optional[List[int]]]],
+        progress: Optional[Callable[[int, int], None]] = None,
+        deduplicate: Optional[Callable[[List[str]], List[Optional[Duplicate]]]] = None
+    ) -> List[List[int]]:
+        """Chunk several documents, embed them in shared batches and index them at once.
+
+        `documents` holds (content, filename, page_offsets) tuples. Batches may
+        span files, up to INGESTION_EMBED_CONCURRENCY of them are embedded
+        concurrently, and all vectors go to the index in one bulk add.
+        `progress` is called with (embedded chunks, total chunks) after each batch.
+        `deduplicate` maps the chunk texts to the chunks they duplicate, if
+        any; those are neither embedded nor indexed again.
+        Returns the chunk ids of each document's chunks, in order.
+        """
+        all_records: List[Record] = []
+        counts = []
+        for content, filename, page_offsets in documents:
+            chunks = self.chunker.split(content, page_offsets)
+            before = len(all_records)
+            all_records.extend((chunk.text, filename, chunk.page, chunk.start) for chunk in chunks)
+            counts.append(len(all_records) - before)
+        if not all_records:
+            return [[] for _ in counts]
+
+        matches: List[Optional[Duplicate]] = [None] * len(all_records)
+        if deduplicate is not None:
+            matches = await asyncio.to_thread(deduplicate, [text for text, _, _, _ in all_records])
+        positions = [position for position, match in enumerate(matches) if match is None]
+        records = [all_records[position] for position in positions]
+
+        embedded = 0
+        semaphore = asyncio.Semaphore(settings.INGESTION_EMBED_CONCURRENCY)
+        # One float32 matrix for all chunks, filled in place as batches return
+        vectors: Optional[np.ndarray] = None
+
+        async def embed(start: int, batch: List[Record]) -> None:
+            nonlocal embedded, vectors
+            # Get embeddings for the whole batch in one call
+            async with semaphore, get_model_limiter():
+                batch_vectors = await self.embeddings.aembed_documents([text for text, _, _, _ in batch])
+            if vectors is None:
+                vectors = np.empty((len(records), len(batch_vectors[0])), dtype=np.float32)
+            vectors[start:start + len(batch)] = batch_vectors
+            embedded += len(batch)
+            if progress is not None:
+                progress(embedded, len(records))
+
+        ids: List[Optional[int]] = [None] * len(all_records)
+        if records:
+            size = settings.EMBEDDING_BATCH_SIZE
+            await asyncio.gather(*(
+                embed(n * size, batch) for n, batch in enumerate(iter_batches(records, size))
+            ))
+
+            # Publish a new snapshot generation so other workers and restarts see the documents
+            committed = await asyncio.to_thread(self._commit_vectors, vectors, records)
+            for position, chunk_id in zip(positions, committed):
+                ids[position] = chunk_id
+        # Duplicates resolve to the chunk already holding their content
+        for position, match in enumerate(matches):
+            if match is not None:
+                ids[position] = match.chunk_id if match.chunk_id is not None else ids[match.position]
+
+        chunk_ids, start = [], 0
+        for count in counts:
+            chunk_ids.append(ids[start:start + count])
+            start += count
+        return chunk_ids
+
+    def _commit_vectors(self, vectors: np.ndarray, records: List[Record]) -> List[int]:
+        """Add embedded chunks in a vector store transaction, returning their chunk ids."""
+        with self.vector_store.transaction() as writer:
+            return writer.add_vectors(vectors, records)
+
+    def _commit_removal(self, chunk_ids: Sequence[int]) -> None:
+        """Remove chunks in a vector store transaction."""
+        with self.vector_store.transaction() as writer:
+            writer.remove(chunk_ids)
+
+    async def remove_chunks(self, chunk_ids: Sequence[int]) -> None:
+        """Remove chunks from the vector store and snapshot the change."""
+        await asyncio.to_thread(self._commit_removal, chunk_ids)
+
+    async def _aembed_query(self, query: str):
+        """Embed a query, holding a model call slot unless the query batcher takes one per batch."""
+        if settings.QUERY_EMBED_BATCH_WINDOW_MS > 0:
+            return await self.embeddings.aembed_query(query)
+        async with get_model_limiter():
+            return await self.embeddings.aembed_query(query)
+
+    def _no_results(self, state: WorkflowState) -> WorkflowState:
+        """Return the state with empty retrieval results."""
+        state["retrieved_docs"] = []
+        state["source_names"] = []
+        state["retrieved_ids"] = []
+        return state
+
+    def _mode(self, state: WorkflowState) -> str:
+        """Retrieval mode requested for this query, or the configured default."""
+        mode = state.get("retrieval_mode") or settings.RETRIEVAL_MODE
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unsupported retrieval mode: {mode}. Expected one of {RETRIEVAL_MODES}")
+        return mode
+
+    def _dense_k(self, mode: str, k: int) -> int:
+        """Number of vector search results needed to return k chunks under a retrieval mode."""
+        return max(k, settings.HYBRID_CANDIDATES) if mode == "hybrid" else k
+
+    def _fetch_k(self, state: WorkflowState, query_embedding) -> int:
+        """Number of candidates to retrieve before re-ranking trims them to top_k."""
+        top_k = state.get("top_k") or settings.TOP_K
+        if query_embedding is not None and settings.MMR_ENABLED:
+            return max(top_k, settings.MMR_FETCH_K)
+        return top_k
+
+    def _search(
+        self,
+        snapshot: Snapshot,
+        query: str,
+        query_embedding,
+        mode: str,
+        k: int,
+        dense: Optional[Hits] = None
+    ) -> List[int]:
+        """Return the ids of the best k chunks for the query under a retrieval mode.
+
+        `dense` holds vector search results already fetched by the search batcher.
+        """
+        if mode == "lexical":
+            return [i for i, _ in self.vector_store.lexical_search(query, k, snapshot)]
+
+        candidates = self._dense_k(mode, k)
+        if dense is None:
+            dense = self.vector_store.search(query_embedding, candidates, snapshot)
+        dense = [i for i, _ in dense]
+        if mode == "vector":
+            return dense
+
+        # Keyword matches catch exact identifiers that embeddings blur
+        lexical = [i for i, _ in self.vector_store.lexical_search(query, candidates, snapshot)]
+        return reciprocal_rank_fusion([dense, lexical], settings.RRF_K)[:k]
+
+    def _rerank(
+        self,
+        snapshot: Snapshot,
+        ids: List[int],
+        query_embedding,
+        top_k: int,
+        threshold: Optional[float]
+    ) -> List[int]:
+        """Drop candidates below the similarity threshold and diversify the rest with MMR."""
+        vectors = self.vector_store.reconstruct(ids, snapshot)
+        if threshold is not None:
+            keep = cosine_similarities(query_embedding, vectors) >= threshold
+            ids, vectors = [i for i, k in zip(ids, keep) if k], vectors[keep]
+        if settings.MMR_ENABLED and len(ids) > top_k:
+            return [ids[j] for j in maximal_marginal_relevance(query_embedding, vectors, top_k, settings.MMR_LAMBDA)]
+        return ids[:top_k]
+
+    def _retrieve(
+        self,
+        state: WorkflowState,
+        snapshot: Snapshot,
+        query_embedding,
+        dense: Optional[Hits] = None
+    ) -> WorkflowState:
+        """Search the indexes of one snapshot for the query and update the state."""
+        top_k = state.get("top_k") or settings.TOP_K
+        threshold = state.get("score_threshold")
+        if threshold is None:
+            threshold = settings.SCORE_THRESHOLD
+
+        fetch = self._fetch_k(state, query_embedding)
+        ids = self._search(snapshot, state["query"], query_embedding, self._mode(state), fetch, dense)
+        # Similarity filtering and MMR need embeddings, so keyword-only retrieval skips them
+        if query_embedding is not None and ids:
+            ids = self._rerank(snapshot, ids, query_embedding, top_k, threshold)
+        return self._fill(state, snapshot, ids, query_embedding)
+
+    def _reusable_ids(self, state: WorkflowState, snapshot: Snapshot, query_embedding) -> Optional[List[int]]:
+        """The previous session turn's chunks, if this follow-up is close enough to that question to reuse them."""
+        previous = state.get("previous_query_embedding")
+        if not settings.SESSION_CONTEXT_REUSE or previous is None or not state.get("previous_ids"):
+            return None
+        similarity = cosine_similarities(query_embedding, np.asarray([previous], dtype=np.float32))[0]
+        if similarity < settings.SESSION_REUSE_SIMILARITY:
+            return None
+        documents = snapshot.documents
+        # Chunks deleted since the previous turn are dropped
+        ids = [i for i in state["previous_ids"] if i < len(documents) and i not in documents.deleted]
+        return ids or None
+
+    def _fill(self, state: WorkflowState, snapshot: Snapshot, ids: List[int], query_embedding) -> WorkflowState:
+        """Put the chunks with the given ids, packed to the context budget, into the state."""
+        hits = [snapshot.documents[i] for i in ids]
+
+        # Keep only the chunks that fit the prompt's context budget, so sources match the prompt
+        packed = pack_context([content for content, _, _, _ in hits], settings.CONTEXT_TOKEN_BUDGET)
+        ids, hits = [ids[j] for j, _ in packed], [hits[j] for j, _ in packed]
+
+        # Get relevant chunks and their locations
+        retrieved_docs = [content for _, content in packed]
+        source_names = [format_source(filename, page, offset) for _, filename, page, offset in hits]
+
+        # Update state
+        state["retrieved_docs"] = retrieved_docs
+        state["source_names"] = source_names
+        state["retrieved_ids"] = ids
+        state["query_embedding"] = query_embedding
+
+        return state
 
     def __call__(self, state: WorkflowState) -> WorkflowState:
         """Process the query and retrieve relevant documents."""
-        try:
-            if not self.index:
-                state["retrieved_docs"] = []
-                state["source_names"] = []
-                return state
-
-            # Get query embedding
-            query_embedding = self.embeddings.embed_query(state["query"])
-            
-            # Search in FAISS
-            D, I = self.index.search(np.array([query_embedding]), k=1)
-            
-            # Get relevant documents and their names
-            retrieved_docs = [self.documents[i][0] for i in I[0]]
-            source_names = [self.documents[i][1] for i in I[0]]
-            
-            # Update state
-            state["retrieved_docs"] = retrieved_docs
-            state["source_names"] = source_names
-            
-            return state
-        except Exception as e:
-            raise Exception(f"Error in retrieval agent: {str(e)}")
\ No newline at end of file
+        with stage("retrieve"):
+            try:
+                self.vector_store.refresh()
+                # Every stage reads this generation, even if another one is swapped in meanwhile
+                snapshot = self.vector_store.snapshot()
+                if not snapshot.documents.live_count:
+                    return self._no_results(state)
+
+                # Get query embedding; keyword-only retrieval does not need one
+                query_embedding = None
+                if self._mode(state) != "lexical":
+                    query_embedding = self.embeddings.embed_query(state["query"])
+
+                return self._retrieve(state, snapshot, query_embedding)
+            except Exception as e:
+                raise Exception(f"Error in retrieval agent: {str(e)}")
+
+    async def ainvoke(self, state: WorkflowState) -> WorkflowState:
+        """Retrieve relevant documents without blocking the event loop."""
+        with stage("retrieve"):
+            try:
+                # Pick up index generations published by other workers
+                await asyncio.to_thread(self.vector_store.refresh)
+                # Every stage reads this generation, even if another one is swapped in meanwhile
+                snapshot = self.vector_store.snapshot()
+                if not snapshot.documents.live_count:
+                    return self._no_results(state)
+
+                # Get query embedding; keyword-only retrieval does not need one
+                query_embedding, dense = None, None
+                mode = self._mode(state)
+                if mode != "lexical":
+                    query_embedding = await self._aembed_query(state["query"])
+                    # A session follow-up about the same thing reuses the previous turn's chunks
+                    reused = self._reusable_ids(state, snapshot, query_embedding)
+                    if reused is not None:
+                        state = await asyncio.to_thread(self._fill, state, snapshot, reused, query_embedding)
+                        state["metadata"] = {**(state["metadata"] or {}), "context_reused": True}
+                        return state
+                    dense = await self.search_batcher.search(
+                        query_embedding, self._dense_k(mode, self._fetch_k(state, query_embedding)), snapshot
+                    )
+
+                # FAISS and numpy release the GIL, so large searches run in a worker thread
+                return await asyncio.to_thread(self._retrieve, state, snapshot, query_embedding, dense)
+            except Exception as e:
+                raise Exception(f"Error in retrieval agent: {str(e)}")
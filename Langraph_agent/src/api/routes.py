@@ -1,60 +1,370 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, status
-from typing import Dict, Any
-from ..models.schema import QueryRequest, QueryResponse
-from ..core.workflow import ConversationalWorkflow
-import PyPDF2
-import io
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, status
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, AsyncIterator, List, Optional
+from pathlib import Path
+from ..models.schema import QueryRequest, QueryResponse, IngestionJob, ImportRequest
+from ..core.collection_registry import DEFAULT_COLLECTION, CollectionRegistry
+from ..core.document_manager import DuplicateDocumentError
+from ..core.extraction import SUPPORTED_EXTENSIONS, ExtractionLimitError, check_upload_size
+from ..core.jobs import IngestionQueue
+from ..core import telemetry
+from ..core.concurrency import ModelRateLimitError
+from ..core.embedding_batcher import BatchedQueryEmbeddings
+from ..config.settings import get_settings
+from datetime import datetime
+import asyncio
+import json
+import math
+
+settings = get_settings()
 
 router = APIRouter(prefix="/api/v1", tags=["conversation"])
-workflow = ConversationalWorkflow()
+
+def get_collections(request: Request) -> CollectionRegistry:
+    """The collection registry the application lifespan created."""
+    return request.app.state.collections
+
+def get_ingestion_queue(request: Request) -> IngestionQueue:
+    """The ingestion queue the application lifespan created."""
+    return request.app.state.ingestion_queue
+
+def _rate_limit_error(error: BaseException) -> Optional[ModelRateLimitError]:
+    """The model rate limit error behind a failure, through the agents' and workflow's wrapping."""
+    while error is not None:
+        if isinstance(error, ModelRateLimitError):
+            return error
+        error = error.__cause__ or error.__context__
+    return None
+
+def _rate_limited(error: ModelRateLimitError) -> HTTPException:
+    """A 429 telling the client when to retry."""
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=f"Model rate limit exceeded: {str(error)}",
+        headers={"Retry-After": str(math.ceil(error.retry_after))}
+    )
+
+def _check_collection(collections: CollectionRegistry, name: str, create: bool = False) -> None:
+    """Reject invalid collection names (400) and, unless creating, unknown collections (404)."""
+    try:
+        exists = collections.exists(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not create and not exists:
+        raise HTTPException(status_code=404, detail=f"Collection {name} not found")
 
 @router.post(
     "/documents/upload",
     status_code=status.HTTP_200_OK,
 )
 async def upload_document(
-    file: UploadFile = File(...)
-) -> Dict[str, str]:
-    """Upload and process a document."""
+    file: UploadFile = File(...),
+    collection: str = DEFAULT_COLLECTION,
+    collections: CollectionRegistry = Depends(get_collections)
+) -> Dict[str, Any]:
+    """Upload and process a document into a collection, creating it if needed."""
     try:
-        # Read PDF content
-        if file.filename.endswith('.pdf'):
-            content = await file.read()
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
-            
-            # Extract text from PDF
-            text_content = ""
-            for page in pdf_reader.pages:
-                text_content += page.extract_text()
-
-            # Add to workflow
-            await workflow.add_document(text_content, file.filename)
-            
-            return {"message": "Document processed successfully"}
+        if file.filename.rsplit('.', 1)[-1].lower() in SUPPORTED_EXTENSIONS:
+            if file.size is not None:
+                check_upload_size(file.size)
+            _check_collection(collections, collection, create=True)
+
+            # Store, extract and index the document; its chunks are tracked for deletion
+            async with collections.acquire(collection, create=True) as target:
+                duplicate_of = None
+                try:
+                    document_id = await target.document_manager.process_document(file, {})
+                except DuplicateDocumentError as e:
+                    # The content is already indexed, so nothing was embedded again
+                    document_id, duplicate_of = e.document_id, e.duplicate_of
+                document = await asyncio.to_thread(target.document_manager.get_document, document_id)
+
+            return {
+                "message": "Document processed successfully" if duplicate_of is None
+                else f"Document duplicates {duplicate_of}",
+                "document_id": document_id,
+                "chunks": document["chunk_count"],
+                "duplicate_of": duplicate_of
+            }
         else:
             raise HTTPException(
                 status_code=400,
-                detail="Only PDF files are supported"
+                detail=f"Supported file types: {', '.join(SUPPORTED_EXTENSIONS)}"
             )
 
+    except HTTPException:
+        raise
+    except ExtractionLimitError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
     except Exception as e:
+        limited = _rate_limit_error(e)
+        if limited is not None:
+            raise _rate_limited(limited)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to process document: {str(e)}"
         )
 
+@router.get("/health")
+async def health(
+    request: Request,
+    collections: CollectionRegistry = Depends(get_collections)
+) -> Dict[str, Any]:
+    """Report whether the default collection's index is ready to answer questions.
+
+    Readiness comes from the registry's state; the probe never loads the
+    index or the models. Returns 503 while the index is loading (with
+    PRELOAD_DEFAULT_COLLECTION) or after its last load failed. An index that
+    is not loaded yet is ready: the first request loads it.
+    """
+    index = collections.state(DEFAULT_COLLECTION)
+    if index["state"] == "loading":
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Index not ready: loading")
+    if index["state"] == "failed":
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Index not ready: {index['error']}"
+        )
+    index["ready"] = True
+    return {
+        "status": "healthy",
+        "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+        "index": index,
+        "loaded_collections": collections.stats(),
+        "startup": getattr(request.app.state, "startup", None)
+    }
+
+def update_index_metrics(collections: CollectionRegistry) -> None:
+    """Refresh the index gauges from the loaded collections before a metrics scrape."""
+    telemetry.INDEX_CHUNKS.clear()
+    telemetry.INDEX_GENERATION.clear()
+    for name, collection in collections.loaded():
+        vector_store = collection.workflow.retrieval_agent.vector_store
+        telemetry.INDEX_CHUNKS.labels(name).set(len(vector_store))
+        telemetry.INDEX_GENERATION.labels(name).set(vector_store.generation or 0)
+
+    if not collections.loaded():
+        return  # Nothing has used the models yet; do not build their clients for a scrape
+    from ..agents.retrieval import get_embeddings
+    batcher = get_embeddings()
+    while batcher is not None and not isinstance(batcher, BatchedQueryEmbeddings):
+        batcher = getattr(batcher, "embeddings", None)  # Look through the cache and timing wrappers
+    if batcher is not None:
+        stats = batcher.stats()
+        telemetry.QUERY_EMBED_BATCH_SIZE.set(stats["mean_batch_size"])
+        telemetry.QUERY_EMBED_WAIT_SECONDS.set(stats["mean_wait_ms"] / 1000)
+
+@router.get("/collections")
+async def list_collections(
+    collections: CollectionRegistry = Depends(get_collections)
+) -> Dict[str, Any]:
+    """List collections and which of them are loaded in memory."""
+    return {"collections": collections.names(), "loaded": collections.stats()}
+
+@router.get("/documents")
+async def list_documents(
+    skip: int = 0,
+    limit: int = 10,
+    collection: str = DEFAULT_COLLECTION,
+    collections: CollectionRegistry = Depends(get_collections)
+) -> Dict[str, Any]:
+    """List stored documents with pagination."""
+    _check_collection(collections, collection)
+    async with collections.acquire(collection) as target:
+        return await asyncio.to_thread(target.document_manager.list_documents, skip=skip, limit=limit)
+
+@router.delete("/documents/{document_id}")
+async def delete_document(
+    document_id: str,
+    collection: str = DEFAULT_COLLECTION,
+    collections: CollectionRegistry = Depends(get_collections)
+) -> Dict[str, Any]:
+    """Delete a document and remove its chunks from the index."""
+    _check_collection(collections, collection)
+    async with collections.acquire(collection) as target:
+        deleted = await target.document_manager.delete_document(document_id)
+    if not deleted:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Document {document_id} not found"
+        )
+    return {"message": "Document deleted successfully", "document_id": document_id}
+
+@router.post(
+    "/documents/batch",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=IngestionJob
+)
+async def upload_documents_batch(
+    files: List[UploadFile] = File(...),
+    collection: str = DEFAULT_COLLECTION,
+    collections: CollectionRegistry = Depends(get_collections),
+    ingestion_queue: IngestionQueue = Depends(get_ingestion_queue)
+) -> IngestionJob:
+    """Queue several documents (PDF, DOCX, TXT or zip archives of them) for ingestion."""
+    _check_collection(collections, collection, create=True)
+    if len(files) > settings.MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.MAX_BATCH_FILES} files can be uploaded per batch"
+        )
+
+    uploads = []
+    for file in files:
+        if file.size is not None:
+            try:
+                check_upload_size(file.size)
+            except ExtractionLimitError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"{file.filename}: {str(e)}"
+                )
+        uploads.append((file.filename, await file.read()))
+
+    return ingestion_queue.submit(collection, uploads=uploads)
+
+@router.post(
+    "/documents/import",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=IngestionJob
+)
+async def import_directory(
+    request: ImportRequest,
+    collections: CollectionRegistry = Depends(get_collections),
+    ingestion_queue: IngestionQueue = Depends(get_ingestion_queue)
+) -> IngestionJob:
+    """Queue every supported file in a server directory under IMPORT_ROOT for ingestion."""
+    _check_collection(collections, request.collection, create=True)
+    if not settings.IMPORT_ROOT:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Directory import is disabled; set IMPORT_ROOT to enable it"
+        )
+
+    root = Path(settings.IMPORT_ROOT).resolve()
+    directory = (root / request.path).resolve()
+    if not directory.is_relative_to(root) or not directory.is_dir():
+        raise HTTPException(
+            status_code=400,
+            detail=f"{request.path} is not a directory under the import root"
+        )
+
+    return ingestion_queue.submit(request.collection, directory=directory)
+
+@router.get(
+    "/documents/jobs/{job_id}",
+    response_model=IngestionJob
+)
+async def get_ingestion_job(
+    job_id: str,
+    ingestion_queue: IngestionQueue = Depends(get_ingestion_queue)
+) -> IngestionJob:
+    """Report the progress of a batch ingestion job."""
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Ingestion job {job_id} not found"
+        )
+    return job
+
+@router.delete("/sessions/{session_id}")
+async def delete_session(
+    session_id: str,
+    collection: str = DEFAULT_COLLECTION,
+    collections: CollectionRegistry = Depends(get_collections)
+) -> Dict[str, Any]:
+    """Forget a conversation session's history."""
+    _check_collection(collections, collection)
+    async with collections.acquire(collection) as target:
+        deleted = await target.workflow.delete_session(session_id)
+    if not deleted:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Session {session_id} not found"
+        )
+    return {"message": "Session deleted successfully", "session_id": session_id}
+
 @router.post(
     "/ask",
     response_model=QueryResponse
 )
-async def ask_question(request: QueryRequest) -> QueryResponse:
-    """Process a question."""
+async def ask_question(
+    request: QueryRequest,
+    collections: CollectionRegistry = Depends(get_collections)
+) -> QueryResponse:
+    """Process a question against one collection."""
+    _check_collection(collections, request.collection)
     try:
-        result = workflow.execute(request.query)
+        async with collections.acquire(request.collection) as target:
+            result = await target.workflow.aexecute(request.query, **_query_options(request))
         return QueryResponse(**result["response"])
 
     except Exception as e:
+        limited = _rate_limit_error(e)
+        if limited is not None:
+            raise _rate_limited(limited)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to process query: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+def _query_options(request: QueryRequest) -> Dict[str, Any]:
+    """Per-request workflow options taken from a query."""
+    return {
+        "mode": request.mode,
+        "top_k": request.top_k,
+        "score_threshold": request.score_threshold,
+        "user": request.user,
+        "session_id": request.session_id
+    }
+
+def _sse_event(event: str, data: Any) -> str:
+    """Encode one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post(
+    "/ask/stream",
+    response_class=StreamingResponse
+)
+async def ask_question_stream(
+    request: QueryRequest,
+    collections: CollectionRegistry = Depends(get_collections)
+) -> StreamingResponse:
+    """Process a question, streaming the answer as Server-Sent Events.
+
+    Emits a `sources` event once retrieval completes, `token` events as the
+    answer is generated, then a final `answer` event with the formatted
+    response. Failures after the stream has started are sent as `error`.
+    """
+    _check_collection(collections, request.collection)
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async with collections.acquire(request.collection) as target:
+                async for event, data in target.workflow.astream(request.query, **_query_options(request)):
+                    yield _sse_event(event, data)
+        except Exception as e:
+            limited = _rate_limit_error(e)
+            if limited is not None:
+                yield _sse_event("error", {
+                    "message": f"Model rate limit exceeded: {str(limited)}",
+                    "status": status.HTTP_429_TOO_MANY_REQUESTS,
+                    "retry_after": math.ceil(limited.retry_after)
+                })
+            else:
+                yield _sse_event("error", {"message": f"Failed to process query: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -4,12 +4,139 @@ import os
 from datetime import datetime, timezone
 from typing import Optional
 
+MODEL_PROVIDERS = ("google", "fake")
+DEDUP_MODES = ("off", "skip", "link")
+
 class Settings(BaseSettings):
-    GOOGLE_API_KEY: str
+    GOOGLE_API_KEY: str = ""
     ENVIRONMENT: str = "development"
     HOST: str = "0.0.0.0"
     PORT: int = 8000
 
+    # Model backends: "google" (Gemini) or "fake" (deterministic offline stand-ins for benchmarks)
+    MODEL_PROVIDER: str = "google"
+    FAKE_EMBEDDING_DIMENSION: int = 768
+    FAKE_EMBEDDING_LATENCY_MS: float = 0.0  # Per embedding call
+    FAKE_LLM_LATENCY_MS: float = 0.0  # Before the first token
+    FAKE_LLM_TOKEN_LATENCY_MS: float = 0.0  # Per generated token
+
+    # Document chunking and embedding
+    CHUNK_SIZE: int = 1000
+    CHUNK_OVERLAP: int = 200
+    EMBEDDING_BATCH_SIZE: int = 100
+
+    # Content-hash embedding cache (in-memory LRU over SQLite in STORAGE_DIR)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_SIZE: int = 10000
+    EMBEDDING_CACHE_PERSIST: bool = True
+    # Concurrent query embeddings sent as one model call; a window of 0 embeds each query on its own
+    QUERY_EMBED_BATCH_SIZE: int = 32
+    QUERY_EMBED_BATCH_WINDOW_MS: float = 5.0
+
+    # Document text extraction (runs in a process pool)
+    MAX_UPLOAD_BYTES: int = 50 * 1024 * 1024
+    MAX_PDF_PAGES: int = 2000
+    PDF_PAGES_PER_TASK: int = 50
+    EXTRACTION_WORKERS: int = 0  # 0 means one per CPU
+
+    # Batch ingestion jobs
+    INGESTION_WORKERS: int = 2
+    INGESTION_EMBED_CONCURRENCY: int = 4
+    INGESTION_JOB_HISTORY: int = 100
+    MAX_BATCH_FILES: int = 1000
+    IMPORT_ROOT: str = ""  # Server directory that /documents/import may read from; empty disables it
+
+    # Duplicate uploads: "off", "skip" (keep only the first copy) or "link" (record the copy, sharing the first copy's chunks)
+    DEDUP_MODE: str = "off"
+    NEAR_DUPLICATE_THRESHOLD: float = 0.9  # Estimated Jaccard similarity of word 5-grams above which a chunk is not indexed again
+    MINHASH_PERMUTATIONS: int = 64
+    MINHASH_BANDS: int = 8
+
+    # Semantic answer cache in front of the reasoning LLM
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIZE: int = 1000
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_SIMILARITY: float = 0.95
+
+    # Query routing: canned replies to small talk, no retrieval for an empty index, SIMPLE_MODEL for short factual questions
+    QUERY_ROUTING_ENABLED: bool = True
+    SIMPLE_MODEL: str = ""  # Smaller Gemini model, e.g. "gemini-1.5-flash-8b"; empty answers every question with the main model
+    SIMPLE_QUERY_MAX_WORDS: int = 12
+
+    # Conversation sessions: requests with a session_id keep their history in STORAGE_DIR
+    SESSION_HISTORY_TOKENS: int = 1000  # Recent turns sent verbatim; older turns are folded into a summary
+    SESSION_CONTEXT_REUSE: bool = True  # Reuse the previous turn's chunks for a similar follow-up
+    SESSION_REUSE_SIMILARITY: float = 0.85  # Cosine similarity to the previous question needed for reuse
+    SESSION_TTL_HOURS: float = 24.0  # Idle sessions are deleted after this long
+
+    # Emit OpenTelemetry spans for workflow nodes (needs opentelemetry-api plus an SDK/exporter)
+    OTEL_ENABLED: bool = False
+
+    # Maximum concurrent outbound embedding/LLM calls per worker
+    MAX_CONCURRENT_MODEL_CALLS: int = 16
+
+    # Model API budgets per worker (0 disables a limit), retries with jittered backoff, and hedging
+    LLM_REQUESTS_PER_MINUTE: int = 0
+    LLM_TOKENS_PER_MINUTE: int = 0
+    EMBEDDING_REQUESTS_PER_MINUTE: int = 0
+    EMBEDDING_TOKENS_PER_MINUTE: int = 0
+    MODEL_RATE_LIMIT_MAX_WAIT_SECONDS: float = 30.0  # Calls that would queue longer fail with 429
+    MODEL_MAX_RETRIES: int = 4  # For rate-limited (429), unavailable (5xx) and timed-out calls
+    MODEL_RETRY_BASE_DELAY_MS: float = 500.0
+    MODEL_RETRY_MAX_DELAY_MS: float = 20000.0
+    MODEL_TIMEOUT_SECONDS: float = 60.0
+    QUERY_EMBED_HEDGE_DELAY_MS: float = 0.0  # Duplicate query embedding calls slower than this; 0 disables
+
+    # Persistent storage for documents and vector index snapshots
+    STORAGE_DIR: str = "document_storage"
+    INDEX_MMAP: bool = True
+    # How often workers check for an index generation published by another worker
+    INDEX_REFRESH_INTERVAL_SECONDS: float = 1.0
+    # Writes append vectors as delta segments; compact them into the base index once they exceed this share of it
+    INDEX_DELTA_MAX_FRACTION: float = 0.1
+    # Also compact once deleted chunks still in the index exceed this share of all chunks
+    INDEX_COMPACT_DELETED_FRACTION: float = 0.2
+
+    # Collections (tenants) kept loaded in memory; idle ones are evicted least recently used first
+    MAX_LOADED_COLLECTIONS: int = 32
+    COLLECTION_MEMORY_LIMIT_MB: int = 4096
+    PRELOAD_DEFAULT_COLLECTION: bool = False  # Load it (and the model clients) in the background at startup
+
+    # Vector index type: "flat", "ivf_flat", "hnsw" or "ivf_pq"
+    INDEX_TYPE: str = "flat"
+    # Vectors in flat, IVF-Flat and HNSW indexes: "float32", "fp16" or "int8" (scalar quantization)
+    INDEX_ENCODING: str = "float32"
+    # Quantized indexes (incl. ivf_pq) fetch k times this many candidates and re-rank them by
+    # full-precision vectors kept on disk; 0 disables re-scoring and stores no extra vectors
+    INDEX_RESCORE_FACTOR: int = 4
+    INDEX_TRAIN_MIN_VECTORS: int = 10000
+    IVF_NLIST: int = 1024
+    IVF_NPROBE: int = 16
+    HNSW_M: int = 32
+    HNSW_EF_CONSTRUCTION: int = 200
+    HNSW_EF_SEARCH: int = 64
+    PQ_M: int = 64
+    PQ_NBITS: int = 8
+    # Vector search parallelism: shards searched concurrently, and concurrent queries batched into one search
+    INDEX_SHARDS: int = 1
+    SEARCH_BATCH_MAX: int = 64
+    SEARCH_BATCH_WINDOW_MS: float = 0.0
+
+    # Retrieval: "vector", "lexical" (BM25) or "hybrid" (reciprocal rank fusion of both)
+    RETRIEVAL_MODE: str = "hybrid"
+    HYBRID_CANDIDATES: int = 20  # Results taken from each ranking before fusion
+    RRF_K: int = 60
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+
+    # Chunks passed to the reasoning LLM
+    TOP_K: int = 4
+    SCORE_THRESHOLD: Optional[float] = None  # Minimum cosine similarity to the query
+    MMR_ENABLED: bool = True
+    MMR_FETCH_K: int = 20  # Candidates re-ranked by maximal marginal relevance
+    MMR_LAMBDA: float = 0.5  # 1.0 ranks purely by relevance, 0.0 purely by diversity
+    CONTEXT_TOKEN_BUDGET: int = 3000  # Approximate tokens of retrieved context per prompt
+
     def get_current_time(self) -> str:
         return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
 
@@ -23,6 +150,10 @@ class Settings(BaseSettings):
 @lru_cache()
 def get_settings() -> Settings:
     settings = Settings()
-    if not settings.is_api_key_valid:
+    if settings.MODEL_PROVIDER not in MODEL_PROVIDERS:
+        raise ValueError(f"Unsupported MODEL_PROVIDER: {settings.MODEL_PROVIDER}. Expected one of {MODEL_PROVIDERS}")
+    if settings.DEDUP_MODE not in DEDUP_MODES:
+        raise ValueError(f"Unsupported DEDUP_MODE: {settings.DEDUP_MODE}. Expected one of {DEDUP_MODES}")
+    if settings.MODEL_PROVIDER == "google" and not settings.is_api_key_valid:
         raise ValueError("GOOGLE_API_KEY is not set or invalid. Please set a valid API key in your .env file.")
     return settings
\ No newline at end of file
@@ -0,0 +1,122 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .embedding_cache import normalize_text
+
+
+# Who the answer was written for and the chunks it was generated from
+Scope = Tuple[Optional[str], Tuple[int, ...]]
+
+
+class _Entry(NamedTuple):
+    vector: np.ndarray  # Unit-length query embedding
+    scope: Scope
+    answer: str
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """Caches generated answers by query embedding, retrieved chunk set and user.
+
+    A lookup hits when the same normalized question was answered from the
+    same chunks, or when a cached question over the same chunks has cosine
+    similarity to the new query at or above `similarity_threshold`. Answers
+    may address the user by name, so they are only reused for the same
+    `user` (None for anonymous questions). Entries
+    expire after `ttl_seconds` and the least recently used are evicted.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_scope: Dict[Scope, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(
+        self, query: str, query_vector: Any, doc_ids: Sequence[int], user: Optional[str] = None
+    ) -> Optional[str]:
+        """Return a cached answer for this query, retrieved chunk set and user, if any."""
+        scope = (user, tuple(doc_ids))
+        with self._lock:
+            key = self._key(query, scope)
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(key, entry):
+                self._entries.move_to_end(key)
+                return entry.answer
+
+            # Nearest cached question over the same chunks, for the same user
+            candidates = [
+                k for k in list(self._by_scope.get(scope, ()))
+                if self._fresh(k, self._entries[k])
+            ]
+            if query_vector is None or not candidates:
+                return None
+            vector = self._unit(query_vector)
+            similarities = np.stack([self._entries[k].vector for k in candidates]) @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+            self._entries.move_to_end(candidates[best])
+            return self._entries[candidates[best]].answer
+
+    def store(
+        self, query: str, query_vector: Any, doc_ids: Sequence[int], answer: str, user: Optional[str] = None
+    ) -> None:
+        """Cache an answer generated for this query, retrieved chunk set and user."""
+        if query_vector is None:
+            return
+        scope = (user, tuple(doc_ids))
+        with self._lock:
+            key = self._key(query, scope)
+            self._discard(key)
+            self._entries[key] = _Entry(self._unit(query_vector), scope, answer, time.monotonic())
+            self._by_scope.setdefault(scope, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self) -> None:
+        """Drop every entry, e.g. after the corpus changes."""
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+
+    def _fresh(self, key: str, entry: _Entry) -> bool:
+        """Check an entry's TTL, discarding it if expired."""
+        if time.monotonic() - entry.created_at <= self.ttl_seconds:
+            return True
+        self._discard(key)
+        return False
+
+    def _discard(self, key: str) -> None:
+        """Remove an entry and its scope reference."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_scope.get(entry.scope)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_scope[entry.scope]
+
+    @staticmethod
+    def _key(query: str, scope: Scope) -> str:
+        """Exact-match key for a normalized query in a scope."""
+        payload = f"{normalize_text(query).lower()}\0{scope}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    @staticmethod
+    def _unit(vector: Any) -> np.ndarray:
+        """Return a float32 copy of the vector scaled to unit length."""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,306 @@
+import json
+import math
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Container, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Words plus identifiers such as ERR-404, v1.2.3 or src/core/bm25.py
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-/:][a-z0-9]+)*")
+_SEPARATORS = re.compile(r"[._\-/:]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; compound identifiers are kept whole and also split into parts."""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(_SEPARATORS.split(token))
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[int]:
+    """Merge ranked id lists, scoring each id by the sum of 1 / (k + rank)."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, i in enumerate(ranking, start=1):
+            scores[i] = scores.get(i, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.__getitem__, reverse=True)
+
+
+class BM25Index:
+    """In-memory BM25 inverted index over chunk ids.
+
+    Each term's postings are a pair of growable numpy arrays (int32 chunk
+    ids, uint16 term frequencies), so a query scores whole posting lists
+    with vectorized arithmetic instead of walking Python lists. Chunk ids
+    must be added in increasing order, which keeps postings sorted. Removed
+    chunks are masked out of results; their postings stay until the index
+    is rebuilt, so document frequencies may slightly overcount.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, common_fraction: float = 0.05):
+        self.k1 = k1
+        self.b = b
+        self.common_fraction = common_fraction
+        self.vocabulary: Dict[str, int] = {}
+        self._ids: List[np.ndarray] = []
+        self._tfs: List[np.ndarray] = []
+        self._sizes: List[int] = []
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._removed = np.zeros(0, dtype=bool)
+        self._count = 0  # Highest chunk id + 1
+        self._live = 0
+        self._total_length = 0
+        self._removed_count = 0
+        self._norms = None  # Cached k1 * (1 - b + b * length / avgdl), per chunk
+        self._weights: Dict[int, np.ndarray] = {}  # Cached posting weights of common terms
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._live
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size of the postings, caches and vocabulary."""
+        with self._lock:
+            arrays = self._ids + self._tfs + list(self._weights.values()) + [self._lengths, self._removed]
+            # Memory-mapped postings are left to the page cache; add a dict entry plus a short str per term
+            resident = sum(array.nbytes for array in arrays if not isinstance(array, np.memmap))
+            return resident + 100 * len(self.vocabulary)
+
+    def add(self, ids: Sequence[int], texts: Sequence[str]) -> None:
+        """Index chunk texts under their chunk ids."""
+        counts = [Counter(tokenize(text)) for text in texts]
+        lengths = [sum(count.values()) for count in counts]
+
+        with self._lock:
+            # Group new postings by term so each term's arrays grow once per call
+            batch: Dict[int, Tuple[List[int], List[int]]] = {}
+            for i, count in zip(ids, counts):
+                for term, tf in count.items():
+                    term_id = self.vocabulary.get(term)
+                    if term_id is None:
+                        term_id = self.vocabulary[term] = len(self.vocabulary)
+                    postings = batch.setdefault(term_id, ([], []))
+                    postings[0].append(i)
+                    postings[1].append(tf)
+
+            top = max(ids, default=-1) + 1
+            if top > len(self._lengths):
+                self._lengths = self._grow(self._lengths, top)
+                self._removed = self._grow(self._removed, top)
+            self._count = max(self._count, top)
+            self._lengths[list(ids)] = lengths
+            self._live += len(lengths)
+            self._total_length += sum(lengths)
+
+            while len(self._ids) < len(self.vocabulary):
+                self._ids.append(np.zeros(0, dtype=np.int32))
+                self._tfs.append(np.zeros(0, dtype=np.uint16))
+                self._sizes.append(0)
+            for term_id, (term_ids, tfs) in batch.items():
+                self._append(term_id, term_ids, tfs)
+            self._norms = None
+            self._weights = {}
+
+    def remove(self, ids: Iterable[int]) -> None:
+        """Exclude chunk ids from results."""
+        with self._lock:
+            for i in ids:
+                if i < self._count and not self._removed[i]:
+                    self._removed[i] = True
+                    self._removed_count += 1
+                    self._live -= 1
+                    self._total_length -= int(self._lengths[i])
+            self._norms = None
+            self._weights = {}
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        end: Optional[int] = None,
+        exclude: Optional[Container[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """Return up to k (chunk id, score) pairs, best first, of chunk ids below `end` if given.
+
+        Chunk ids in `exclude` are left out too, without changing the index:
+        a caller's own deletes, which other callers may not see yet.
+
+        The selective query terms define the candidate set. Terms appearing
+        in more than `common_fraction` of chunks (stopwords, boilerplate)
+        only add their score to those candidates, found by binary search in
+        the sorted postings, instead of scoring their whole posting lists.
+        A query made only of common terms uses the rarest as the candidate
+        set, and terms found in over half of all chunks are ignored unless
+        they are the rarest.
+        """
+        with self._lock:
+            term_ids = sorted(
+                {self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary},
+                key=self._sizes.__getitem__
+            )
+            if not term_ids or not self._live:
+                return []
+
+            # Terms in most chunks barely move scores (idf < log 2); keep them only if nothing rarer matched
+            term_ids = term_ids[:1] + [t for t in term_ids[1:] if self._sizes[t] <= self._live / 2]
+
+            limit = max(self._sizes[term_ids[0]], self.common_fraction * self._live)
+            selective = [t for t in term_ids if self._sizes[t] <= limit]
+            candidates = self._candidates([self._ids[t][:self._sizes[t]] for t in selective])
+            scores = np.zeros(len(candidates) + 1, dtype=np.float32)
+            candidate_positions = None
+            for term_id in term_ids:
+                size = self._sizes[term_id]
+                ids = self._ids[term_id][:size]
+                weights = self._term_weights(term_id)
+                if len(selective) == 1 and term_id == selective[0]:
+                    # Candidates are exactly this posting list (minus removed chunks)
+                    scores[:-1] += weights[~self._removed[ids]] if self._removed_count else weights
+                elif len(candidates) * 8 < size:
+                    # Few candidates: binary-search them in the sorted posting list
+                    found = np.minimum(np.searchsorted(ids, candidates), size - 1)
+                    hit = ids[found] == candidates
+                    scores[np.flatnonzero(hit)] += weights[found[hit]]
+                else:
+                    # Many candidates: map the postings onto candidate positions directly.
+                    # Non-candidates land in a spare last slot, avoiding a slow masked copy;
+                    # every other slot receives at most one posting, so fancy-index += is exact.
+                    if candidate_positions is None:
+                        candidate_positions = np.full(self._count, len(candidates), dtype=np.int32)
+                        candidate_positions[candidates] = np.arange(len(candidates), dtype=np.int32)
+                    scores[candidate_positions[ids]] += weights
+
+        scores = scores[:-1]
+        if end is not None and len(candidates) and candidates[-1] >= end:
+            # Chunks added after the caller's snapshot
+            keep = candidates < end
+            candidates, scores = candidates[keep], scores[keep]
+        fetch = k
+        while True:
+            top = np.argpartition(-scores, fetch)[:fetch] if len(candidates) > fetch else np.arange(len(candidates))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            hits = [(int(candidates[j]), float(scores[j])) for j in top]
+            if exclude:
+                hits = [hit for hit in hits if hit[0] not in exclude]
+            # Excluded chunks took some of the top places: rank deeper
+            if len(hits) >= k or len(top) == len(candidates):
+                return hits[:k]
+            fetch *= 2
+
+    def _candidates(self, matched: List[np.ndarray]) -> np.ndarray:
+        """Sorted, non-removed chunk ids present in any of the posting lists."""
+        candidates = np.unique(np.concatenate(matched)) if len(matched) > 1 else matched[0]
+        return candidates[~self._removed[candidates]] if self._removed_count else candidates
+
+    def _term_weights(self, term_id: int) -> np.ndarray:
+        """BM25 score contribution of each of a term's postings.
+
+        Weights of common terms are cached until the corpus changes, since
+        recomputing them dominates the cost of stopword-heavy queries.
+        """
+        weights = self._weights.get(term_id)
+        if weights is not None:
+            return weights
+
+        size = self._sizes[term_id]
+        tfs = self._tfs[term_id][:size].astype(np.float32)
+        idf = math.log(1 + (self._live - size + 0.5) / (size + 0.5))
+        weights = idf * (self.k1 + 1) * tfs / (tfs + self._get_norms()[self._ids[term_id][:size]])
+        if size > self.common_fraction * self._live:
+            self._weights[term_id] = weights
+        return weights
+
+    ARRAYS = ("offsets", "ids", "tfs", "lengths", "removed", "params")
+
+    def save(self, path: Path) -> None:
+        """Write the index to directory `path` as flattened (CSR) postings, one .npy file per array."""
+        with self._lock:
+            offsets = np.zeros(len(self._sizes) + 1, dtype=np.int64)
+            np.cumsum(self._sizes, out=offsets[1:])
+            terms = sorted(self.vocabulary, key=self.vocabulary.__getitem__)
+            arrays = {
+                "offsets": offsets,
+                "ids": self._concat(self._ids, np.int32),
+                "tfs": self._concat(self._tfs, np.uint16),
+                "lengths": self._lengths[:self._count],
+                "removed": self._removed[:self._count],
+                "params": np.array([self.k1, self.b]),
+            }
+            path.mkdir(parents=True, exist_ok=True)
+            with open(path / "terms.json", "w", encoding="utf-8") as f:
+                json.dump(terms, f)
+            for name, array in arrays.items():
+                np.save(path / f"{name}.npy", array)
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "BM25Index":
+        """Read an index written by `save`, memory-mapping the postings if requested.
+
+        Mapped postings are read-only and shared with other processes that
+        load the same files; a term's postings are copied on its next append.
+        """
+        if path.is_file():
+            # Snapshots from before per-array files: a single .npz archive
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in cls.ARRAYS}
+                terms = json.loads(data["terms"].tobytes().decode("utf-8"))
+        else:
+            arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None) for name in cls.ARRAYS}
+            with open(path / "terms.json", encoding="utf-8") as f:
+                terms = json.load(f)
+
+        k1, b = arrays["params"].tolist()
+        index = cls(k1, b)
+        offsets, ids, tfs = np.asarray(arrays["offsets"]), arrays["ids"], arrays["tfs"]
+        index._lengths = np.array(arrays["lengths"])
+        index._removed = np.array(arrays["removed"])
+        index.vocabulary = {term: i for i, term in enumerate(terms)}
+        # Views into the flat arrays
+        index._ids = [ids[offsets[i]:offsets[i + 1]] for i in range(len(terms))]
+        index._tfs = [tfs[offsets[i]:offsets[i + 1]] for i in range(len(terms))]
+        index._sizes = np.diff(offsets).tolist()
+        index._count = len(index._lengths)
+        index._removed_count = int(index._removed.sum())
+        index._live = index._count - index._removed_count
+        index._total_length = int(index._lengths[~index._removed].sum())
+        return index
+
+    def _append(self, term_id: int, ids: List[int], tfs: List[int]) -> None:
+        """Append postings to a term, doubling its arrays when full."""
+        size = self._sizes[term_id]
+        needed = size + len(ids)
+        if needed > len(self._ids[term_id]):
+            capacity = max(needed, 2 * len(self._ids[term_id]), 4)
+            self._ids[term_id] = self._grow(self._ids[term_id][:size], capacity)
+            self._tfs[term_id] = self._grow(self._tfs[term_id][:size], capacity)
+        self._ids[term_id][size:needed] = ids
+        self._tfs[term_id][size:needed] = np.minimum(tfs, np.iinfo(np.uint16).max)
+        self._sizes[term_id] = needed
+
+    def _get_norms(self) -> np.ndarray:
+        """Per-chunk BM25 length normalization, recomputed after the corpus changes."""
+        if self._norms is None:
+            average = self._total_length / self._live
+            lengths = self._lengths[:self._count].astype(np.float32)
+            self._norms = self.k1 * (1 - self.b + self.b * lengths / average)
+        return self._norms
+
+    def _concat(self, arrays: List[np.ndarray], dtype) -> np.ndarray:
+        """Concatenate the used part of each term's postings."""
+        if not arrays:
+            return np.zeros(0, dtype=dtype)
+        return np.concatenate([array[:size] for array, size in zip(arrays, self._sizes)])
+
+    @staticmethod
+    def _grow(array: np.ndarray, size: int) -> np.ndarray:
+        """Return a copy of `array` resized to at least `size` elements."""
+        grown = np.zeros(max(size, 2 * len(array)), dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
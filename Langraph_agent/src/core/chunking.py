@@ -0,0 +1,105 @@
+import re
+from bisect import bisect_right
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Sentence ends followed by whitespace, or paragraph breaks.
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int  # Character offset of the chunk in the source document
+    end: int
+    page: Optional[int]  # 1-based page number, if page offsets are known
+
+
+def join_pages(pages: Iterable[str], separator: str = "\n") -> Tuple[str, List[int]]:
+    """Join page texts and return the document with each page's start offset."""
+    parts: List[str] = []
+    page_offsets: List[int] = []
+    position = 0
+    for page in pages:
+        if parts:
+            parts.append(separator)
+            position += len(separator)
+        page_offsets.append(position)
+        parts.append(page)
+        position += len(page)
+    return "".join(parts), page_offsets
+
+
+def iter_batches(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Yield lists of at most `size` items without materializing the input."""
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class TextChunker:
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+        """Initialize the chunker with size and overlap in characters."""
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap must be non-negative and smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split(self, text: str, page_offsets: Optional[List[int]] = None) -> Iterator[Chunk]:
+        """Split text into overlapping chunks on sentence boundaries."""
+        spans = list(self._sentence_spans(text))
+        i = 0
+        while i < len(spans):
+            chunk_start = spans[i][0]
+            j = i
+            while j + 1 < len(spans) and spans[j + 1][1] - chunk_start <= self.chunk_size:
+                j += 1
+            chunk_end = spans[j][1]
+            yield Chunk(
+                text=text[chunk_start:chunk_end],
+                start=chunk_start,
+                end=chunk_end,
+                page=bisect_right(page_offsets, chunk_start) if page_offsets else None,
+            )
+            if j + 1 >= len(spans):
+                break
+
+            # Step back over trailing sentences that fit in the overlap window
+            k = j + 1
+            while k - 1 > i and chunk_end - spans[k - 1][0] <= self.chunk_overlap:
+                k -= 1
+            i = k
+
+    def _sentence_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield (start, end) offsets of sentences, hard-splitting oversized ones."""
+        start = 0
+        for match in _SENTENCE_BOUNDARY.finditer(text):
+            if match.start() > start:
+                yield from self._split_long(text, start, match.start())
+            start = match.end()
+        if start < len(text):
+            yield from self._split_long(text, start, len(text))
+
+    def _split_long(self, text: str, start: int, end: int) -> Iterator[Tuple[int, int]]:
+        """Split a span longer than chunk_size at whitespace where possible, dropping blank spans."""
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        while end - start > self.chunk_size:
+            cut = text.rfind(" ", start + 1, start + self.chunk_size)
+            if cut <= start:
+                cut = start + self.chunk_size
+            yield start, cut
+            start = cut
+            while start < end and text[start].isspace():
+                start += 1
+        if end > start:
+            yield start, end
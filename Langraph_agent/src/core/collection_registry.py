@@ -0,0 +1,186 @@
+import asyncio
+import re
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from ..config.settings import get_settings
+from .document_manager import DocumentManager
+
+settings = get_settings()
+
+DEFAULT_COLLECTION = "default"
+COLLECTION_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class CollectionNotFoundError(KeyError):
+    """Raised when a collection is read before any document was added to it."""
+
+
+class Collection:
+    """One tenant's documents, index and workflow, stored in its own directory."""
+
+    def __init__(self, name: str, storage_dir: Path):
+        self.name = name
+        self.storage_dir = storage_dir
+        # The workflow pulls in LangGraph and the model clients, so it is imported on first load
+        from .workflow import ConversationalWorkflow
+
+        self.document_manager = DocumentManager(str(storage_dir))
+        self.workflow = ConversationalWorkflow(self.document_manager)
+        self.active = 0  # Requests and jobs currently using the collection
+        self._memory_bytes: Optional[int] = None
+        self.document_manager.add_listener(self._on_corpus_change)
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size, re-measured after the corpus changes."""
+        if self._memory_bytes is None:
+            self._memory_bytes = self.workflow.retrieval_agent.vector_store.memory_bytes()
+        return self._memory_bytes
+
+    def close(self) -> None:
+        """Release the collection's open files."""
+        self.workflow.close()
+        self.document_manager.close()
+
+    def _on_corpus_change(self, action: str, document_id: str) -> None:
+        self._memory_bytes = None
+
+
+class CollectionRegistry:
+    """Loads collections on first use and evicts the least recently used.
+
+    Collections are evicted while more than `max_loaded` are resident or
+    their combined estimated memory exceeds `memory_limit_bytes`. Collections
+    in use by a request or ingestion job are never evicted, so the limits
+    can be exceeded temporarily. Evicted collections are reloaded from disk
+    on their next use; every change is already persisted, so nothing is lost.
+    """
+
+    def __init__(self, storage_dir: Path, memory_limit_bytes: int, max_loaded: int):
+        self.storage_dir = storage_dir
+        self.memory_limit_bytes = memory_limit_bytes
+        self.max_loaded = max_loaded
+        self._loaded: "OrderedDict[str, Collection]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._load_errors: Dict[str, str] = {}  # Why the last load of a collection failed
+
+    def path(self, name: str) -> Path:
+        """Storage directory of a collection.
+
+        The default collection uses the storage root, so data written before
+        collections existed stays where it was.
+        """
+        if not COLLECTION_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid collection name: {name!r}. Use 1-64 letters, digits, '_' or '-'")
+        if name == DEFAULT_COLLECTION:
+            return self.storage_dir
+        return self.storage_dir / "collections" / name
+
+    def exists(self, name: str) -> bool:
+        """Whether a collection has been created; the default collection always exists."""
+        if self.path(name) == self.storage_dir:
+            return True
+        return name in self._loaded or (self.path(name) / "documents.sqlite").exists()
+
+    def names(self) -> List[str]:
+        """Names of all collections on disk or in memory."""
+        names = set(self._loaded)
+        if (self.storage_dir / "documents.sqlite").exists():
+            names.add(DEFAULT_COLLECTION)
+        root = self.storage_dir / "collections"
+        if root.is_dir():
+            names.update(path.name for path in root.iterdir() if (path / "documents.sqlite").exists())
+        return sorted(names)
+
+    def loaded(self) -> List[Tuple[str, Collection]]:
+        """The collections currently in memory, least recently used first."""
+        return list(self._loaded.items())
+
+    def state(self, name: str) -> Dict[str, Any]:
+        """Whether a collection is "loaded", "loading", "failed" or "not_loaded", without loading it."""
+        collection = self._loaded.get(name)
+        if collection is not None:
+            vector_store = collection.workflow.retrieval_agent.vector_store
+            return {"state": "loaded", "chunks": len(vector_store), "generation": vector_store.generation}
+        if name in self._loading:
+            return {"state": "loading"}
+        if name in self._load_errors:
+            return {"state": "failed", "error": self._load_errors[name]}
+        return {"state": "not_loaded"}
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Residency and estimated memory of each loaded collection, least recently used first."""
+        return [
+            {"name": name, "active": collection.active, "memory_bytes": collection.memory_bytes()}
+            for name, collection in self._loaded.items()
+        ]
+
+    def close(self) -> None:
+        """Unload every collection, releasing its open files."""
+        while self._loaded:
+            _, collection = self._loaded.popitem()
+            collection.close()
+
+    @asynccontextmanager
+    async def acquire(self, name: str, create: bool = False) -> AsyncIterator[Collection]:
+        """Use a collection, loading it if needed and protecting it from eviction meanwhile.
+
+        Unless `create` is set, a collection that does not exist yet raises
+        CollectionNotFoundError instead of being created empty.
+        """
+        if not create and not self.exists(name):
+            raise CollectionNotFoundError(name)
+        collection = await self._get(name)
+        collection.active += 1
+        try:
+            yield collection
+        finally:
+            collection.active -= 1
+            self._evict()
+
+    async def _get(self, name: str) -> Collection:
+        """Return a loaded collection, loading it once even under concurrent first use."""
+        collection = self._loaded.get(name)
+        if collection is not None:
+            self._loaded.move_to_end(name)
+            return collection
+
+        pending = self._loading.get(name)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        path = self.path(name)
+        pending = self._loading[name] = asyncio.get_running_loop().create_future()
+        try:
+            # Opening the catalogue and reading index snapshots is blocking I/O
+            collection = await asyncio.to_thread(Collection, name, path)
+        except Exception as e:
+            self._load_errors[name] = str(e)
+            pending.set_exception(e)
+            pending.exception()  # Mark retrieved when nobody else is waiting
+            raise
+        finally:
+            del self._loading[name]
+
+        self._loaded[name] = collection
+        self._load_errors.pop(name, None)
+        pending.set_result(collection)
+        return collection
+
+    def _evict(self) -> None:
+        """Unload idle collections, least recently used first, until within the limits."""
+        def over_limits() -> bool:
+            return len(self._loaded) > self.max_loaded or (
+                sum(collection.memory_bytes() for collection in self._loaded.values()) > self.memory_limit_bytes
+            )
+
+        for name in list(self._loaded):
+            if not over_limits():
+                return
+            collection = self._loaded[name]
+            if collection.active:
+                continue
+            del self._loaded[name]
+            collection.close()
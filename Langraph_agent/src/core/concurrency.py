@@ -0,0 +1,120 @@
+import asyncio
+import time
+from functools import lru_cache
+
+from ..config.settings import get_settings
+
+
+class ModelRateLimitError(Exception):
+    """Raised when a model's rate limit cannot be absorbed by queueing or retries.
+
+    `retry_after` is the suggested wait in seconds before trying again.
+    """
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ModelCallLimiter:
+    """Bounds the number of in-flight outbound model calls.
+
+    Use as `async with limiter:` around embedding and LLM requests so a burst
+    of queries queues locally instead of flooding the model API.
+    """
+
+    def __init__(self, limit: int):
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+        self.limit = limit
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def __aenter__(self) -> "ModelCallLimiter":
+        await self._semaphore.acquire()
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+@lru_cache()
+def get_model_limiter() -> ModelCallLimiter:
+    """Process-wide limiter shared by all agents."""
+    return ModelCallLimiter(get_settings().MAX_CONCURRENT_MODEL_CALLS)
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, holding at most one minute's worth.
+
+    Reservations may overdraw the bucket; the debt is repaid by the refill,
+    so callers that reserve while it is overdrawn wait in arrival order.
+    """
+
+    def __init__(self, per_minute: float):
+        if per_minute <= 0:
+            raise ValueError("per_minute must be positive")
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available."""
+        self._refill()
+        # A single call larger than the bucket is let through once the bucket is full
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def take(self, amount: float) -> None:
+        """Take `amount` units, overdrawing the bucket if needed."""
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budgets for one model.
+
+    `acquire` waits until both budgets allow the call. Waits longer than
+    `max_wait_seconds` raise ModelRateLimitError right away rather than
+    queueing the caller for minutes. Limits of 0 are not enforced.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0, max_wait_seconds: float = 30.0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_wait_seconds = max_wait_seconds
+
+    async def acquire(self, tokens: int = 0) -> float:
+        """Wait for budget for one call of about `tokens` tokens, returning the time waited."""
+        wanted = [(bucket, amount) for bucket, amount in ((self.requests, 1), (self.tokens, tokens)) if bucket]
+        wait = max((bucket.wait_time(amount) for bucket, amount in wanted), default=0.0)
+        if wait > self.max_wait_seconds:
+            raise ModelRateLimitError(f"Model rate limit reached; retry in {wait:.0f}s", retry_after=wait)
+        for bucket, amount in wanted:
+            bucket.take(amount)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def debit(self, tokens: int) -> None:
+        """Charge tokens only known after the call, such as generated ones."""
+        if self.tokens is not None and tokens > 0:
+            self.tokens.take(tokens)
+
+
+@lru_cache()
+def get_rate_limiter(model: str) -> RateLimiter:
+    """Process-wide rate limiter for "llm" or "embedding" calls."""
+    settings = get_settings()
+    if model == "llm":
+        requests, tokens = settings.LLM_REQUESTS_PER_MINUTE, settings.LLM_TOKENS_PER_MINUTE
+    else:
+        requests, tokens = settings.EMBEDDING_REQUESTS_PER_MINUTE, settings.EMBEDDING_TOKENS_PER_MINUTE
+    return RateLimiter(requests, tokens, settings.MODEL_RATE_LIMIT_MAX_WAIT_SECONDS)
@@ -0,0 +1,119 @@
+import hashlib
+import zlib
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .bm25 import tokenize
+
+SHINGLE_WORDS = 5
+# Largest prime below 2**32: (a * x + b) stays below 2**64 for 32-bit shingle hashes
+MINHASH_PRIME = np.uint64(4294967291)
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 of a file's bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 of extracted text with case and whitespace normalized, matching re-exported copies."""
+    return hashlib.sha256(" ".join(text.lower().split()).encode("utf-8")).hexdigest()
+
+
+class Duplicate(NamedTuple):
+    """Where a near-duplicate chunk's content is already indexed: an existing chunk id,
+    or the position of an earlier chunk in the same batch."""
+    chunk_id: Optional[int] = None
+    position: Optional[int] = None
+
+
+class MinHasher:
+    """MinHash signatures of word shingles, with LSH band keys.
+
+    The permutations are seeded, so signatures stay comparable across
+    processes and restarts. Two signatures agree in about the Jaccard
+    similarity of the texts' shingle sets; texts agreeing in all rows of
+    any one band become candidate duplicates.
+    """
+
+    def __init__(self, permutations: int = 64, bands: int = 8):
+        if permutations % bands:
+            raise ValueError(f"MINHASH_PERMUTATIONS ({permutations}) must be a multiple of MINHASH_BANDS ({bands})")
+        self.permutations = permutations
+        self.bands = bands
+        self.rows = permutations // bands
+        rng = np.random.default_rng(0x5EED)
+        self._a = rng.integers(1, MINHASH_PRIME, size=(permutations, 1), dtype=np.uint64)
+        self._b = rng.integers(0, MINHASH_PRIME, size=(permutations, 1), dtype=np.uint64)
+
+    @staticmethod
+    def shingles(text: str) -> np.ndarray:
+        """32-bit hashes of the text's distinct word 5-grams (the whole text if shorter)."""
+        tokens = tokenize(text)
+        width = min(SHINGLE_WORDS, len(tokens)) or 1
+        grams = {" ".join(tokens[i:i + width]) for i in range(max(len(tokens) - width + 1, 1))}
+        return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of a text, as uint32 values."""
+        hashes = self.shingles(text)
+        return ((self._a * hashes + self._b) % MINHASH_PRIME).min(axis=1).astype(np.uint32)
+
+    def band_keys(self, signature: np.ndarray) -> List[int]:
+        """One LSH bucket key per band, as non-negative 56-bit integers (SQLite-friendly)."""
+        return [
+            int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=7).digest(), "big")
+            for band in signature.reshape(self.bands, self.rows)
+        ]
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of the texts behind two signatures."""
+        if a.shape != b.shape:
+            return 0.0  # Signed with other MINHASH_PERMUTATIONS; not comparable
+        return float(np.mean(a == b))
+
+
+def best_match(
+    signature: np.ndarray,
+    candidates: Iterable[Tuple[Any, np.ndarray]],
+    threshold: float
+) -> Optional[Any]:
+    """The candidate key whose signature is most similar to `signature`, if at least `threshold`.
+
+    `candidates` yields (key, signature) pairs.
+    """
+    best, best_similarity = None, threshold
+    for key, other in candidates:
+        similarity = MinHasher.similarity(signature, other)
+        if similarity >= best_similarity:
+            best, best_similarity = key, similarity
+    return best
+
+
+def find_batch_duplicates(
+    hasher: MinHasher,
+    signatures: List[np.ndarray],
+    threshold: float,
+    skip: Optional[List[Optional[Duplicate]]] = None
+) -> List[Optional[Duplicate]]:
+    """Match each signature against the earlier, non-duplicate ones of the same batch.
+
+    Entries already set in `skip` (e.g. matched against the index) are kept
+    and not offered as matches for later chunks.
+    """
+    matches = list(skip) if skip is not None else [None] * len(signatures)
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    for position, signature in enumerate(signatures):
+        if matches[position] is not None:
+            continue
+        keys = [(band, key) for band, key in enumerate(hasher.band_keys(signature))]
+        candidates = {other for key in keys for other in buckets.get(key, ())}
+        earlier = best_match(signature, ((other, signatures[other]) for other in sorted(candidates)), threshold)
+        if earlier is not None:
+            matches[position] = Duplicate(position=earlier)
+            continue
+        for key in keys:
+            buckets.setdefault(key, []).append(position)
+    return matches
@@ -0,0 +1,280 @@
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# (text, source, page, offset) for a single stored chunk
+Record = Tuple[str, str, Optional[int], int]
+
+
+class DocStore:
+    """Append-only columnar chunk store.
+
+    Chunk texts are one UTF-8 buffer plus an offsets column. Filenames are
+    dictionary-encoded into an int32 column, next to page (int32, -1 for
+    none) and character offset (int64) columns. With `keep_vectors`, each
+    chunk's full-precision float32 vector is kept too, for re-scoring the
+    results of a quantized index. Committed columns are read through memory
+    maps, so resident memory does not grow with the corpus. New chunks are
+    held in memory until `save`. Deleted chunks keep their row (ids stay
+    stable) and are recorded as tombstones.
+    """
+
+    TEXT_FILE = "texts.bin"
+    OFFSETS_FILE = "offsets.bin"
+    SOURCES_FILE = "sources.bin"
+    PAGES_FILE = "pages.bin"
+    POSITIONS_FILE = "positions.bin"
+    NAMES_FILE = "names.jsonl"
+    VECTORS_FILE = "vectors.bin"
+    DELETED_FILE = "deleted.bin"
+    # Row metadata written by older versions, one JSON line per chunk
+    META_FILE = "meta.jsonl"
+
+    def __init__(self, keep_vectors: bool = False):
+        self.keep_vectors = keep_vectors
+        self._text: Any = b""
+        self._ends = np.zeros(0, dtype=np.int64)
+        self._sources = np.zeros(0, dtype=np.int32)
+        self._pages = np.zeros(0, dtype=np.int32)
+        self._positions = np.zeros(0, dtype=np.int64)
+        self._names: List[str] = []
+        self._name_codes: Dict[str, int] = {}
+        self._vectors: Optional[np.ndarray] = None
+        self._pending: List[Record] = []
+        self._pending_vectors: List[np.ndarray] = []
+        # Rows of the vectors file that pending vectors follow, and rows with a vector overall
+        self._vector_start = 0
+        self._vector_rows = 0
+        self.deleted: Set[int] = set()
+        self._pending_deleted: List[int] = []
+        self._state = {
+            "count": 0, "text_bytes": 0, "deleted_count": 0,
+            "columns": 0, "names": 0, "names_bytes": 0, "vectors": 0, "dimension": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._ends) + len(self._pending)
+
+    def __getitem__(self, i: int) -> Record:
+        committed = len(self._ends)
+        if i < 0 or i >= len(self):
+            raise IndexError(f"Chunk {i} not found")
+        if i >= committed:
+            return self._pending[i - committed]
+        start = int(self._ends[i - 1]) if i else 0
+        text = self._text[start:int(self._ends[i])].decode("utf-8")
+        page = int(self._pages[i])
+        return text, self._names[self._sources[i]], page if page >= 0 else None, int(self._positions[i])
+
+    @property
+    def has_vectors(self) -> bool:
+        """Whether every chunk's full-precision vector is stored."""
+        return self.keep_vectors and self._vector_rows == len(self)
+
+    def vectors(self, ids: Iterable[int]) -> np.ndarray:
+        """Full-precision vectors of chunks, one row per id; requires `has_vectors`."""
+        ids = np.asarray(list(ids), dtype=np.int64)
+        stored = self._vector_start
+        if not len(ids):
+            return np.zeros((0, self._state["dimension"]), dtype=np.float32)
+        if ids.max() < stored:
+            return np.asarray(self._vectors[ids])
+        pending = np.concatenate(self._pending_vectors)
+        return np.stack([self._vectors[i] if i < stored else pending[i - stored] for i in ids])
+
+    def backfill_vectors(self, vectors: np.ndarray) -> None:
+        """Provide the vectors of all committed chunks, completing the column of a store saved without it.
+
+        Call before adding chunks; the next `save` rewrites the vectors file.
+        """
+        self._pending_vectors = [np.asarray(vectors, dtype=np.float32)]
+        self._vector_start = 0
+        self._vector_rows = len(vectors)
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size: metadata columns plus unsaved chunks.
+
+        Committed text and vectors are memory-mapped and left to the page cache.
+        """
+        return (
+            16 * len(self)
+            + sum(len(text) for text, _, _, _ in self._pending)
+            + sum(vectors.nbytes for vectors in self._pending_vectors)
+        )
+
+    def append(self, record: Record) -> None:
+        """Add a chunk record."""
+        self.extend([record])
+
+    def extend(self, records: Iterable[Record], vectors: Optional[np.ndarray] = None) -> None:
+        """Add several chunk records, with their float32 vectors when `keep_vectors` is set."""
+        records = list(records)
+        if self.has_vectors and vectors is not None:
+            self._pending_vectors.append(np.asarray(vectors, dtype=np.float32))
+            self._vector_rows += len(records)
+        self._pending.extend(records)
+
+    def delete(self, ids: Iterable[int]) -> None:
+        """Tombstone chunk ids."""
+        for i in ids:
+            if i not in self.deleted:
+                self.deleted.add(i)
+                self._pending_deleted.append(i)
+
+    @property
+    def live_count(self) -> int:
+        """Number of chunks that have not been deleted."""
+        return len(self) - len(self.deleted)
+
+    def save(self, directory: Path) -> Dict[str, int]:
+        """Append pending chunks to disk and return the committed state.
+
+        Files are truncated back to the last committed sizes first, so bytes
+        left behind by an interrupted save are discarded. The returned state
+        must be recorded by the caller (atomically) to commit the write.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        state = self._state
+        committed = len(self._ends)
+        text_bytes = state["text_bytes"]
+        texts, ends = [], []
+        sources, pages, positions = [], [], []
+        for text, source, page, offset in self._pending:
+            encoded = text.encode("utf-8")
+            texts.append(encoded)
+            text_bytes += len(encoded)
+            ends.append(text_bytes)
+            code = self._name_codes.get(source)
+            if code is None:
+                code = self._name_codes[source] = len(self._names)
+                self._names.append(source)
+            sources.append(code)
+            pages.append(-1 if page is None else page)
+            positions.append(offset)
+        names_data = "".join(json.dumps(name) + "\n" for name in self._names[state["names"]:]).encode("utf-8")
+
+        # Columns lag the row count only right after loading a snapshot with row metadata in META_FILE
+        first = state["columns"]
+        self._append(directory / self.TEXT_FILE, state["text_bytes"], b"".join(texts))
+        self._append(directory / self.OFFSETS_FILE, state["count"] * 8, np.asarray(ends, dtype=np.int64).tobytes())
+        self._append(directory / self.SOURCES_FILE, first * 4, np.concatenate([
+            self._sources[first:committed], np.asarray(sources, dtype=np.int32)
+        ]).astype(np.int32).tobytes())
+        self._append(directory / self.PAGES_FILE, first * 4, np.concatenate([
+            self._pages[first:committed], np.asarray(pages, dtype=np.int32)
+        ]).astype(np.int32).tobytes())
+        self._append(directory / self.POSITIONS_FILE, first * 8, np.concatenate([
+            self._positions[first:committed], np.asarray(positions, dtype=np.int64)
+        ]).astype(np.int64).tobytes())
+        self._append(directory / self.NAMES_FILE, state["names_bytes"], names_data)
+        self._append(
+            directory / self.DELETED_FILE,
+            state["deleted_count"] * 8,
+            np.asarray(self._pending_deleted, dtype=np.int64).tobytes()
+        )
+        count = committed + len(self._pending)
+        vectors, dimension = state["vectors"], state["dimension"]
+        if self.has_vectors and self._pending_vectors:
+            data = np.concatenate(self._pending_vectors)
+            self._append(directory / self.VECTORS_FILE, self._vector_start * data.shape[1] * 4, data.tobytes())
+            vectors, dimension = count, data.shape[1]
+
+        return {
+            "count": count,
+            "text_bytes": text_bytes,
+            "deleted_count": state["deleted_count"] + len(self._pending_deleted),
+            "columns": count,
+            "names": len(self._names),
+            "names_bytes": state["names_bytes"] + len(names_data),
+            "vectors": vectors,
+            "dimension": dimension,
+        }
+
+    def load(self, directory: Path, state: Dict[str, int], previous: Optional["DocStore"] = None) -> None:
+        """Map the committed chunks described by `state` from disk.
+
+        `previous`, a store loaded from an earlier state of the same files,
+        lends its filenames and tombstones, so only what was appended since
+        is read.
+        """
+        count = state["count"]
+        self._text = self._map(directory / self.TEXT_FILE, state["text_bytes"])
+        self._ends = self._column(directory / self.OFFSETS_FILE, np.int64, count)
+        state = dict(state, deleted_count=state.get("deleted_count", 0))
+        if "columns" in state:
+            self._sources = self._column(directory / self.SOURCES_FILE, np.int32, count)
+            self._pages = self._column(directory / self.PAGES_FILE, np.int32, count)
+            self._positions = self._column(directory / self.POSITIONS_FILE, np.int64, count)
+            names, names_bytes = [], 0
+            if previous is not None and previous._state["names_bytes"] <= state["names_bytes"]:
+                names, names_bytes = previous._names[:previous._state["names"]], previous._state["names_bytes"]
+            with open(directory / self.NAMES_FILE, "rb") as f:
+                f.seek(names_bytes)
+                tail = f.read(state["names_bytes"] - names_bytes)
+            self._names = names + [json.loads(line) for line in tail.splitlines()]
+        else:
+            # Older snapshots: encode the row metadata into columns, written out by the next save
+            self._names = []
+            codes: Dict[str, int] = {}
+            sources, pages, positions = [], [], []
+            with open(directory / self.META_FILE, "rb") as f:
+                for line in f.read(state["meta_bytes"]).splitlines():
+                    source, page, offset = json.loads(line)
+                    if source not in codes:
+                        codes[source] = len(self._names)
+                        self._names.append(source)
+                    sources.append(codes[source])
+                    pages.append(-1 if page is None else page)
+                    positions.append(offset)
+            self._sources = np.asarray(sources, dtype=np.int32)
+            self._pages = np.asarray(pages, dtype=np.int32)
+            self._positions = np.asarray(positions, dtype=np.int64)
+            state.update(columns=0, names=0, names_bytes=0)
+        self._name_codes = {name: code for code, name in enumerate(self._names)}
+
+        vectors, dimension = state.get("vectors", 0), state.get("dimension", 0)
+        self._vectors = (
+            np.memmap(directory / self.VECTORS_FILE, dtype=np.float32, mode="r", shape=(vectors, dimension))
+            if vectors and dimension else None
+        )
+        deleted, known = set(), 0
+        if previous is not None and not previous._pending_deleted and previous._state["deleted_count"] <= state["deleted_count"]:
+            deleted, known = set(previous.deleted), previous._state["deleted_count"]
+        if state["deleted_count"] > known:
+            deleted.update(np.fromfile(
+                directory / self.DELETED_FILE, dtype=np.int64, count=state["deleted_count"] - known, offset=known * 8
+            ).tolist())
+        self.deleted = deleted
+        self._pending = []
+        self._pending_vectors = []
+        self._vector_start = self._vector_rows = vectors
+        self._pending_deleted = []
+        self._state = dict(state, vectors=vectors, dimension=dimension)
+
+    @staticmethod
+    def _column(path: Path, dtype: Any, count: int) -> np.ndarray:
+        """Memory-map the first `count` values of a column file read-only."""
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+    @staticmethod
+    def _append(path: Path, committed_size: int, data: bytes) -> None:
+        """Truncate a file to its committed size, append data and fsync."""
+        with open(path, "ab") as f:
+            f.truncate(committed_size)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _map(path: Path, size: int) -> Any:
+        """Memory-map the first `size` bytes of a file read-only."""
+        if size == 0:
+            return b""
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
@@ -1,145 +1,581 @@
+import asyncio
 import os
 import uuid
 import json
-from typing import Dict, List, Optional, Any
+import sqlite3
+import threading
+import numpy as np
+from typing import Callable, Dict, List, Optional, Any, Protocol, Sequence, Tuple
 from pathlib import Path
 from datetime import datetime
 from fastapi import UploadFile
-import PyPDF2
-import docx
+from ..config.settings import get_settings
+from .chunking import join_pages
+from .extraction import ExtractionLimitError, extract_document
+from .dedup import Duplicate, MinHasher, best_match, content_hash, find_batch_duplicates, text_hash
+from .telemetry import DUPLICATES
+
+settings = get_settings()
+
+# (document_id, content, filename, page_offsets) ready to be indexed
+StoredDocument = Tuple[str, str, str, List[int]]
+
+class DuplicateDocumentError(ValueError):
+    """Raised when an upload duplicates a stored document.
+
+    `document_id` is the id the upload is known by: the original's when
+    duplicates are skipped, or the new linked entry's when they are linked.
+    """
+
+    def __init__(self, document_id: str, duplicate_of: str):
+        super().__init__(f"Duplicate of document {duplicate_of}")
+        self.document_id = document_id
+        self.duplicate_of = duplicate_of
+
+class DocumentIndex(Protocol):
+    """Vector index kept in sync with the documents a DocumentManager stores."""
+
+    async def add_documents(
+        self,
+        documents: Sequence[Tuple[str, str, Optional[List[int]]]],
+        progress: Optional[Callable[[int, int], None]] = None,
+        deduplicate: Optional[Callable[[List[str]], List[Optional[Duplicate]]]] = None
+    ) -> List[List[int]]:
+        ...
+
+    async def remove_chunks(self, chunk_ids: Sequence[int]) -> None:
+        ...
 
 class DocumentManager:
-    def __init__(self, storage_dir: str = "document_storage"):
-        self.storage_dir = Path(storage_dir)
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS documents (
+            document_id TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            file_type TEXT NOT NULL,
+            upload_time TEXT NOT NULL,
+            metadata TEXT NOT NULL,
+            page_offsets TEXT NOT NULL DEFAULT '[]',
+            chunk_count INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS documents_upload_time ON documents (upload_time);
+        CREATE TABLE IF NOT EXISTS chunks (
+            chunk_id INTEGER PRIMARY KEY,
+            document_id TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS chunks_document_id ON chunks (document_id);
+        -- Chunks a document shares with another document that owns them (near-duplicates)
+        CREATE TABLE IF NOT EXISTS chunk_refs (
+            chunk_id INTEGER NOT NULL,
+            document_id TEXT NOT NULL,
+            PRIMARY KEY (chunk_id, document_id)
+        );
+        CREATE INDEX IF NOT EXISTS chunk_refs_document_id ON chunk_refs (document_id);
+        -- MinHash signatures of indexed chunks, with their LSH band buckets
+        CREATE TABLE IF NOT EXISTS chunk_signatures (
+            chunk_id INTEGER PRIMARY KEY,
+            signature BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS lsh_buckets (
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            chunk_id INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS lsh_buckets_key ON lsh_buckets (band, bucket);
+        CREATE INDEX IF NOT EXISTS lsh_buckets_chunk_id ON lsh_buckets (chunk_id);
+    """
+    # Columns added after the first release, created on open if missing
+    COLUMNS = {
+        "content_hash": "TEXT",  # SHA-256 of the uploaded file
+        "text_hash": "TEXT",  # SHA-256 of the normalized extracted text
+        "duplicate_of": "TEXT",  # Document whose chunks a linked duplicate shares
+    }
+
+    def __init__(self, storage_dir: Optional[str] = None, vector_index: Optional[DocumentIndex] = None):
+        self.storage_dir = Path(storage_dir or settings.STORAGE_DIR)
         self.docs_dir = self.storage_dir / "documents"
+        # Per-document metadata files written by older versions
         self.metadata_dir = self.storage_dir / "metadata"
+        # Vector index snapshots live alongside the documents they were built from
+        self.vectors_dir = self.storage_dir / "vectors"
         self.docs_dir.mkdir(parents=True, exist_ok=True)
-        self.metadata_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.storage_dir / "documents.sqlite"
         self.index_file = self.storage_dir / "document_index.json"
-        self._load_index()
+        self.vector_index = vector_index
+        # Callbacks invoked as listener(action, document_id) after the corpus changes
+        self.listeners: List[Callable[[str, str], None]] = []
+        self._lock = threading.Lock()
+        self.hasher = MinHasher(settings.MINHASH_PERMUTATIONS, settings.MINHASH_BANDS)
+        self._open_store()
+
+    def add_listener(self, listener: Callable[[str, str], None]) -> None:
+        """Register a callback for "add" and "delete" events."""
+        self.listeners.append(listener)
+
+    def set_vector_index(self, vector_index: DocumentIndex) -> None:
+        """Keep a vector index in sync as documents are added and deleted."""
+        self.vector_index = vector_index
+
+    def _notify(self, action: str, document_id: str) -> None:
+        """Notify listeners that a document was added or deleted."""
+        for listener in self.listeners:
+            listener(action, document_id)
+
+    def _open_store(self):
+        """Open the SQLite document store, migrating a legacy JSON index if present."""
+        self.db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self.SCHEMA)
+        columns = {row["name"] for row in self.db.execute("PRAGMA table_info(documents)")}
+        for column, column_type in self.COLUMNS.items():
+            if column not in columns:
+                self.db.execute(f"ALTER TABLE documents ADD COLUMN {column} {column_type}")
+        self.db.execute("CREATE INDEX IF NOT EXISTS documents_content_hash ON documents (content_hash)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS documents_text_hash ON documents (text_hash)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS documents_duplicate_of ON documents (duplicate_of)")
+        self.db.commit()
 
-    def _load_index(self):
-        """Load or create document index."""
         if self.index_file.exists():
             with open(self.index_file, 'r') as f:
-                self.index = json.load(f)
-        else:
-            self.index = {}
-            self._save_index()
-
-    def _save_index(self):
-        """Save document index."""
-        with open(self.index_file, 'w') as f:
-            json.dump(self.index, f, indent=2)
+                legacy = json.load(f)
+            with self._lock, self.db:
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO documents (document_id, title, file_type, upload_time, metadata) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (doc["document_id"], doc["title"], doc["file_type"], doc["upload_time"], json.dumps(doc["metadata"]))
+                        for doc in legacy.values()
+                    ]
+                )
+            self.index_file.rename(self.index_file.with_suffix(".json.migrated"))
 
     async def process_document(self, file: UploadFile, metadata: Dict[str, Any]) -> str:
-        """Process and store an uploaded document."""
+        """Process, store and index an uploaded document.
+
+        Raises DuplicateDocumentError if it duplicates a stored document.
+        """
+        content = await file.read()
+        stored = await self.store_document(file.filename, content, metadata)
+        await self.index_documents([stored])
+        return stored[0]
+
+    async def store_document(self, filename: str, content: bytes, metadata: Dict[str, Any]) -> StoredDocument:
+        """Save a document and its extracted text, without indexing it yet.
+
+        Unless DEDUP_MODE is "off", an upload with the same bytes or the same
+        normalized text as a stored document raises DuplicateDocumentError,
+        after recording a linked entry in "link" mode. Catalogue and file
+        writes run in worker threads, off the event loop.
+        """
         document_id = str(uuid.uuid4())
-        file_extension = file.filename.split('.')[-1].lower()
-        
+        file_extension = filename.split('.')[-1].lower()
+        metadata = dict(metadata, original_filename=filename, file_type=file_extension)
+        file_hash = await asyncio.to_thread(content_hash, content)
+
+        # Identical bytes are caught before paying for extraction
+        if settings.DEDUP_MODE != "off":
+            duplicate = await asyncio.to_thread(self._check_duplicate, document_id, file_hash, None, metadata)
+            if duplicate is not None:
+                raise duplicate
+
         # Save original file
         file_path = self.docs_dir / f"{document_id}.{file_extension}"
-        content = await file.read()
-        
-        with open(file_path, "wb") as f:
-            f.write(content)
+        await asyncio.to_thread(self._write_atomic, file_path, content)
 
         # Extract text based on file type
         try:
-            text_content = await self._extract_text(file_path, file_extension)
+            text_content, page_offsets = join_pages(await extract_document(filename, content))
         except Exception as e:
             # Clean up on failure
-            file_path.unlink(missing_ok=True)
+            await asyncio.to_thread(file_path.unlink, missing_ok=True)
+            if isinstance(e, ExtractionLimitError):
+                raise
             raise ValueError(f"Failed to extract text: {str(e)}")
 
-        # Save extracted text
+        duplicate = await asyncio.to_thread(
+            self._record_document, document_id, file_path, text_content, page_offsets, file_hash, metadata
+        )
+        if duplicate is not None:
+            raise duplicate
+
+        return document_id, text_content, filename, page_offsets
+
+    def _check_duplicate(
+        self,
+        document_id: str,
+        file_hash: str,
+        extracted_hash: Optional[str],
+        metadata: Dict[str, Any]
+    ) -> Optional[DuplicateDocumentError]:
+        """Run `_record_duplicate` in a transaction of its own."""
+        with self._lock, self.db:
+            return self._record_duplicate(document_id, file_hash, extracted_hash, metadata)
+
+    def _record_document(
+        self,
+        document_id: str,
+        file_path: Path,
+        text_content: str,
+        page_offsets: List[int],
+        file_hash: str,
+        metadata: Dict[str, Any]
+    ) -> Optional[DuplicateDocumentError]:
+        """Save a stored document's extracted text and insert its row.
+
+        If it turns out to duplicate a stored document, its files are removed
+        again and the duplicate error is returned instead.
+        """
         text_path = self.docs_dir / f"{document_id}.txt"
-        with open(text_path, "w", encoding="utf-8") as f:
-            f.write(text_content)
-
-        # Save metadata
-        metadata.update({
-            "original_filename": file.filename,
-            "upload_time": datetime.utcnow().isoformat(),
-            "file_type": file_extension,
-        })
-        
-        metadata_path = self.metadata_dir / f"{document_id}.json"
-        with open(metadata_path, "w") as f:
-            json.dump(metadata, f, indent=2)
-
-        # Update index
-        self.index[document_id] = {
-            "document_id": document_id,
-            "title": metadata.get("title", file.filename),
-            "file_type": file_extension,
-            "upload_time": metadata["upload_time"],
-            "metadata": metadata
-        }
-        self._save_index()
-
-        return document_id
-
-    async def _extract_text(self, file_path: Path, file_extension: str) -> str:
-        """Extract text from different file types."""
-        if file_extension == 'pdf':
-            return self._extract_from_pdf(file_path)
-        elif file_extension in ['doc', 'docx']:
-            return self._extract_from_word(file_path)
-        elif file_extension == 'txt':
-            return file_path.read_text(encoding='utf-8')
+        self._write_atomic(text_path, text_content.encode("utf-8"))
+        # Text-less documents (e.g. scanned PDFs) are only matched by their bytes
+        extracted_hash = text_hash(text_content) if text_content.strip() else None
+
+        # A single-row insert, committed atomically with the duplicate check
+        with self._lock, self.db:
+            duplicate = None
+            if settings.DEDUP_MODE != "off":
+                duplicate = self._record_duplicate(document_id, file_hash, extracted_hash, metadata)
+            if duplicate is None:
+                self._insert_document(
+                    document_id, metadata, file_hash=file_hash, extracted_hash=extracted_hash, page_offsets=page_offsets
+                )
+        if duplicate is not None:
+            file_path.unlink(missing_ok=True)
+            text_path.unlink(missing_ok=True)
+        return duplicate
+
+    def _insert_document(
+        self,
+        document_id: str,
+        metadata: Dict[str, Any],
+        file_hash: Optional[str] = None,
+        extracted_hash: Optional[str] = None,
+        page_offsets: Optional[List[int]] = None,
+        duplicate_of: Optional[str] = None,
+        chunk_count: int = 0
+    ) -> None:
+        """Insert a documents row; call holding the lock, inside a transaction."""
+        metadata = dict(metadata, upload_time=datetime.utcnow().isoformat())
+        self.db.execute(
+            "INSERT INTO documents (document_id, title, file_type, upload_time, metadata, page_offsets, "
+            "chunk_count, content_hash, text_hash, duplicate_of) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                document_id,
+                metadata.get("title", metadata["original_filename"]),
+                metadata["file_type"],
+                metadata["upload_time"],
+                json.dumps(metadata),
+                json.dumps(page_offsets or []),
+                chunk_count,
+                file_hash,
+                extracted_hash,
+                duplicate_of,
+            )
+        )
+
+    def _record_duplicate(
+        self,
+        document_id: str,
+        file_hash: str,
+        extracted_hash: Optional[str],
+        metadata: Dict[str, Any]
+    ) -> Optional[DuplicateDocumentError]:
+        """Find a stored document with the same bytes or text and, in "link" mode, record the
+        upload as a duplicate of it. Call holding the lock, inside a transaction."""
+        row = self.db.execute(
+            "SELECT document_id, page_offsets, chunk_count FROM documents "
+            "WHERE duplicate_of IS NULL AND (content_hash = ? OR text_hash = ?) "
+            "ORDER BY upload_time LIMIT 1",
+            (file_hash, extracted_hash)
+        ).fetchone()
+        if row is None:
+            return None
+        DUPLICATES.labels(kind="document").inc()
+        original = row["document_id"]
+        if settings.DEDUP_MODE == "skip":
+            return DuplicateDocumentError(original, original)
+        self._insert_document(
+            document_id, metadata, file_hash=file_hash, extracted_hash=extracted_hash,
+            page_offsets=json.loads(row["page_offsets"]), duplicate_of=original, chunk_count=row["chunk_count"]
+        )
+        return DuplicateDocumentError(document_id, original)
+
+    async def index_documents(
+        self,
+        documents: List[StoredDocument],
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> List[int]:
+        """Add stored documents to the vector index in one batch and record their chunks.
+
+        Documents whose indexing fails are deleted again so the store and
+        the index never disagree. The catalogue is updated in a worker
+        thread. Unless DEDUP_MODE is "off", chunks that
+        near-duplicate an indexed chunk (or an earlier one of the batch) are
+        not embedded again; the document shares the existing chunk instead.
+        Returns the chunk count per document.
+        """
+        if self.vector_index is None:
+            counts = [0] * len(documents)
         else:
-            # For unsupported file types, raise an error
-            raise ValueError(f"Unsupported file type: {file_extension}")
-
-    def _extract_from_pdf(self, file_path: Path) -> str:
-        """Extract text from PDF files."""
-        text = []
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text.append(page.extract_text())
-        return "\n".join(text)
-
-    def _extract_from_word(self, file_path: Path) -> str:
-        """Extract text from Word documents."""
-        doc = docx.Document(file_path)
-        return "\n".join([paragraph.text for paragraph in doc.paragraphs])
+            matches: List[Optional[Duplicate]] = []
+            signatures: List[np.ndarray] = []
+
+            def deduplicate(texts: List[str]) -> List[Optional[Duplicate]]:
+                signatures[:] = [self.hasher.signature(text) for text in texts]
+                matches[:] = self._match_chunks(signatures)
+                return matches
+
+            try:
+                chunk_ids = await self.vector_index.add_documents(
+                    [(content, filename, page_offsets) for _, content, filename, page_offsets in documents],
+                    progress,
+                    deduplicate if settings.DEDUP_MODE != "off" else None
+                )
+            except Exception:
+                deleted = await asyncio.to_thread(self._rollback, [document_id for document_id, _, _, _ in documents])
+                for document_id in deleted:
+                    self._notify("delete", document_id)
+                raise
+
+            # The first document holding a newly indexed chunk owns it; the rest reference it
+            flat_ids = [chunk_id for ids in chunk_ids for chunk_id in ids]
+            new_ids = {flat_ids[position] for position, match in enumerate(matches) if match is None} \
+                if matches else set(flat_ids)
+            owners: Dict[int, str] = {}
+            refs = set()
+            for (document_id, _, _, _), ids in zip(documents, chunk_ids):
+                for chunk_id in ids:
+                    if chunk_id in new_ids and chunk_id not in owners:
+                        owners[chunk_id] = document_id
+                    elif owners.get(chunk_id) != document_id:
+                        refs.add((chunk_id, document_id))
+            indexed = [
+                (flat_ids[position], signature)
+                for position, (signature, match) in enumerate(zip(signatures, matches)) if match is None
+            ]
+            DUPLICATES.labels(kind="chunk").inc(len(flat_ids) - len(new_ids))
+
+            def record_chunks() -> None:
+                with self._lock, self.db:
+                    self.db.executemany("INSERT INTO chunks (chunk_id, document_id) VALUES (?, ?)", owners.items())
+                    self.db.executemany("INSERT OR IGNORE INTO chunk_refs (chunk_id, document_id) VALUES (?, ?)", refs)
+                    self.db.executemany(
+                        "INSERT OR REPLACE INTO chunk_signatures (chunk_id, signature) VALUES (?, ?)",
+                        [(chunk_id, signature.tobytes()) for chunk_id, signature in indexed]
+                    )
+                    self.db.executemany(
+                        "INSERT INTO lsh_buckets (band, bucket, chunk_id) VALUES (?, ?, ?)",
+                        [
+                            (band, key, chunk_id)
+                            for chunk_id, signature in indexed
+                            for band, key in enumerate(self.hasher.band_keys(signature))
+                        ]
+                    )
+                    # Linked duplicates share the chunks, and the count, of the document they duplicate
+                    self.db.executemany(
+                        "UPDATE documents SET chunk_count = ? WHERE document_id = ? OR duplicate_of = ?",
+                        [
+                            (len(ids), document_id, document_id)
+                            for (document_id, _, _, _), ids in zip(documents, chunk_ids)
+                        ]
+                    )
+
+            await asyncio.to_thread(record_chunks)
+            counts = [len(ids) for ids in chunk_ids]
+
+        for document_id, _, _, _ in documents:
+            self._notify("add", document_id)
+        return counts
+
+    def _match_chunks(self, signatures: List[np.ndarray]) -> List[Optional[Duplicate]]:
+        """Find, for each chunk signature, an indexed or earlier chunk it near-duplicates."""
+        threshold = settings.NEAR_DUPLICATE_THRESHOLD
+        matches: List[Optional[Duplicate]] = []
+        with self._lock:
+            for signature in signatures:
+                keys = self.hasher.band_keys(signature)
+                rows = self.db.execute(
+                    "SELECT DISTINCT s.chunk_id, s.signature FROM lsh_buckets b "
+                    "JOIN chunk_signatures s ON s.chunk_id = b.chunk_id WHERE "
+                    + " OR ".join(["(b.band = ? AND b.bucket = ?)"] * len(keys)),
+                    [value for band, key in enumerate(keys) for value in (band, key)]
+                ).fetchall()
+                chunk_id = best_match(
+                    signature,
+                    ((row[0], np.frombuffer(row[1], dtype=np.uint32)) for row in rows),
+                    threshold
+                )
+                matches.append(Duplicate(chunk_id=chunk_id) if chunk_id is not None else None)
+        return find_batch_duplicates(self.hasher, signatures, threshold, matches)
 
     def get_document_text(self, document_id: str) -> str:
-        """Get extracted text for a document."""
+        """Get extracted text for a document; linked duplicates read the original's."""
         text_path = self.docs_dir / f"{document_id}.txt"
         if not text_path.exists():
+            document = self.get_document(document_id)
+            if document is not None and document["duplicate_of"]:
+                return self.get_document_text(document["duplicate_of"])
             raise ValueError(f"Document {document_id} not found")
         return text_path.read_text(encoding='utf-8')
 
+    def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Get the index entry for a document."""
+        with self._lock:
+            row = self.db.execute(
+                "SELECT * FROM documents WHERE document_id = ?", (document_id,)
+            ).fetchone()
+        return self._row_to_document(row) if row else None
+
     def get_document_metadata(self, document_id: str) -> Dict[str, Any]:
         """Get metadata for a document."""
-        return self.index.get(document_id, {}).get("metadata", {})
+        document = self.get_document(document_id)
+        return document["metadata"] if document else {}
 
     def list_documents(self, skip: int = 0, limit: int = 10) -> Dict[str, Any]:
         """List all documents with pagination."""
-        documents = list(self.index.values())
-        total = len(documents)
+        with self._lock:
+            total = self.db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            rows = self.db.execute(
+                "SELECT * FROM documents ORDER BY upload_time, document_id LIMIT ? OFFSET ?",
+                (limit, skip)
+            ).fetchall()
         return {
             "total": total,
-            "documents": documents[skip:skip + limit]
+            "documents": [self._row_to_document(row) for row in rows]
         }
 
-    def delete_document(self, document_id: str) -> bool:
-        """Delete a document and its metadata."""
-        if document_id not in self.index:
+    def _rollback(self, document_ids: List[str]) -> List[str]:
+        """Delete documents whose indexing failed, with the duplicates linked to them; return the deleted ids.
+
+        None of them has chunks yet, so unlike `delete_document` nothing is
+        handed over: a linked duplicate must not take the place of an
+        original that was never indexed.
+        """
+        placeholders = ",".join("?" * len(document_ids))
+        with self._lock, self.db:
+            rows = self.db.execute(
+                f"SELECT document_id, file_type FROM documents "
+                f"WHERE document_id IN ({placeholders}) OR duplicate_of IN ({placeholders})",
+                document_ids + document_ids
+            ).fetchall()
+            self.db.executemany("DELETE FROM documents WHERE document_id = ?", [(row[0],) for row in rows])
+
+        for document_id, file_type in rows:
+            (self.docs_dir / f"{document_id}.{file_type}").unlink(missing_ok=True)
+            (self.docs_dir / f"{document_id}.txt").unlink(missing_ok=True)
+            (self.metadata_dir / f"{document_id}.json").unlink(missing_ok=True)
+        return [row[0] for row in rows]
+
+    async def delete_document(self, document_id: str) -> bool:
+        """Delete a document, its metadata and its vectors.
+
+        Chunks other documents still share are handed over rather than
+        removed: to the oldest linked duplicate, which also takes over the
+        files, or else to a document referencing the chunk. Catalogue and
+        file changes run in worker threads, off the event loop.
+        """
+        document = await asyncio.to_thread(self.get_document, document_id)
+        if document is None:
             return False
 
-        # Get file extension from metadata
-        file_extension = self.index[document_id]["file_type"]
+        heir, chunk_ids = await asyncio.to_thread(self._hand_over, document)
+        if chunk_ids and self.vector_index is not None:
+            await self.vector_index.remove_chunks(chunk_ids)
+        await asyncio.to_thread(self._forget, document, heir, chunk_ids)
+
+        self._notify("delete", document_id)
+        return True
+
+    def _hand_over(self, document: Dict[str, Any]) -> Tuple[Optional[str], List[int]]:
+        """Give a document's shared chunks to their next owners before it is deleted.
+
+        Returns the linked duplicate taking the document's place, if any, and
+        the chunks left to remove from the index.
+        """
+        document_id = document["document_id"]
+        with self._lock, self.db:
+            heir = self.db.execute(
+                "SELECT document_id FROM documents WHERE duplicate_of = ? ORDER BY upload_time LIMIT 1",
+                (document_id,)
+            ).fetchone()
+            if heir is not None:
+                heir = heir[0]
+                self.db.execute("UPDATE chunks SET document_id = ? WHERE document_id = ?", (heir, document_id))
+                self.db.execute(
+                    "UPDATE OR IGNORE chunk_refs SET document_id = ? WHERE document_id = ?", (heir, document_id)
+                )
+                self.db.execute(
+                    "UPDATE documents SET duplicate_of = ? WHERE duplicate_of = ?", (heir, document_id)
+                )
+                self.db.execute(
+                    "UPDATE documents SET duplicate_of = NULL, file_type = ? WHERE document_id = ?",
+                    (document["file_type"], heir)
+                )
+                return heir, []
 
-        # Remove files
-        (self.docs_dir / f"{document_id}.{file_extension}").unlink(missing_ok=True)
-        (self.docs_dir / f"{document_id}.txt").unlink(missing_ok=True)
+            for chunk_id, referrer in self.db.execute(
+                "SELECT r.chunk_id, MIN(r.document_id) FROM chunks c "
+                "JOIN chunk_refs r ON r.chunk_id = c.chunk_id AND r.document_id != c.document_id "
+                "WHERE c.document_id = ? GROUP BY r.chunk_id",
+                (document_id,)
+            ).fetchall():
+                self.db.execute("UPDATE chunks SET document_id = ? WHERE chunk_id = ?", (referrer, chunk_id))
+                self.db.execute(
+                    "DELETE FROM chunk_refs WHERE chunk_id = ? AND document_id = ?", (chunk_id, referrer)
+                )
+            return None, [
+                row[0] for row in self.db.execute(
+                    "SELECT chunk_id FROM chunks WHERE document_id = ?", (document_id,)
+                )
+            ]
+
+    def _forget(self, document: Dict[str, Any], heir: Optional[str], chunk_ids: List[int]) -> None:
+        """Delete a document's rows, and its files unless `heir` takes them over."""
+        document_id = document["document_id"]
+        with self._lock, self.db:
+            self.db.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,))
+            self.db.execute("DELETE FROM chunk_refs WHERE document_id = ?", (document_id,))
+            self.db.executemany("DELETE FROM chunk_signatures WHERE chunk_id = ?", [(i,) for i in chunk_ids])
+            self.db.executemany("DELETE FROM lsh_buckets WHERE chunk_id = ?", [(i,) for i in chunk_ids])
+            self.db.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+
+        # Remove files, or hand them to the duplicate taking the document's place
+        original = self.docs_dir / f"{document_id}.{document['file_type']}"
+        text = self.docs_dir / f"{document_id}.txt"
+        if heir is not None:
+            if original.exists():
+                os.replace(original, self.docs_dir / f"{heir}.{document['file_type']}")
+            if text.exists():
+                os.replace(text, self.docs_dir / f"{heir}.txt")
+        else:
+            original.unlink(missing_ok=True)
+            text.unlink(missing_ok=True)
         (self.metadata_dir / f"{document_id}.json").unlink(missing_ok=True)
 
-        # Update index
-        del self.index[document_id]
-        self._save_index()
-        return True
\ No newline at end of file
+    def close(self) -> None:
+        """Close the document catalogue."""
+        self.db.close()
+
+    @staticmethod
+    def _row_to_document(row: sqlite3.Row) -> Dict[str, Any]:
+        """Shape a documents row like the entries of the former JSON index."""
+        return {
+            "document_id": row["document_id"],
+            "title": row["title"],
+            "file_type": row["file_type"],
+            "upload_time": row["upload_time"],
+            "chunk_count": row["chunk_count"],
+            "duplicate_of": row["duplicate_of"],
+            "metadata": json.loads(row["metadata"])
+        }
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        """Write a file via a temporary file and rename, so readers never see partial data."""
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
@@ -0,0 +1,114 @@
+import asyncio
+import inspect
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+class BatchedQueryEmbeddings:
+    """Wraps an embeddings client so concurrent async queries share one model call.
+
+    `aembed_query` calls are collected for up to `window_seconds` after the
+    first one, or until `max_batch` are waiting, then embedded together with
+    one `aembed_documents` request whose results resolve each caller. Other
+    methods pass straight through. Clients that distinguish query and
+    document embeddings (Gemini's `task_type`) are asked for query
+    embeddings, so batched vectors match `embed_query`.
+    """
+
+    def __init__(
+        self,
+        embeddings: Any,
+        max_batch: int = 32,
+        window_seconds: float = 0.005,
+        limiter: Optional[Any] = None
+    ):
+        if max_batch <= 0:
+            raise ValueError("max_batch must be positive")
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.max_batch = max_batch
+        self.window_seconds = window_seconds
+        self.limiter = limiter
+        client = embeddings
+        while hasattr(client, "embeddings"):
+            client = client.embeddings  # Look through wrappers to the model client
+        accepts_task_type = "task_type" in inspect.signature(client.aembed_documents).parameters
+        self._query_options = {"task_type": "RETRIEVAL_QUERY"} if accepts_task_type else {}
+        self._pending: List[Tuple[str, float, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._dispatches: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.queries = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def embed_documents(self, texts: List[str]) -> List[Any]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> Any:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[Any]:
+        return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> Any:
+        """Embed a query in the next shared batch."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, time.perf_counter(), future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._flush)
+        return await future
+
+    def stats(self) -> Dict[str, float]:
+        """Batch fill (queries per batch over `max_batch`) and time queries spent waiting for a batch."""
+        batches = max(self.batches, 1)
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": self.queries / batches,
+            "mean_batch_fill": self.queries / (batches * self.max_batch),
+            "mean_wait_ms": 1000 * self.total_wait_seconds / max(self.queries, 1),
+            "max_wait_ms": 1000 * self.max_wait_seconds,
+        }
+
+    def _flush(self) -> None:
+        """Send the waiting queries as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            # Several batches may be in flight; keep a reference until each finishes
+            task = asyncio.get_running_loop().create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, float, asyncio.Future]]) -> None:
+        """Embed a batch and resolve each query's future."""
+        now = time.perf_counter()
+        waits = [now - enqueued for _, enqueued, _ in batch]
+        self.batches += 1
+        self.queries += len(batch)
+        self.total_wait_seconds += sum(waits)
+        self.max_wait_seconds = max(self.max_wait_seconds, *waits)
+
+        texts = [text for text, _, _ in batch]
+        try:
+            if self.limiter is not None:
+                async with self.limiter:
+                    vectors = await self.embeddings.aembed_documents(texts, **self._query_options)
+            else:
+                vectors = await self.embeddings.aembed_documents(texts, **self._query_options)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(np.asarray(vector, dtype=np.float32))
@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from ..config.settings import get_settings
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different copies share a cache key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(text: str, model: str, kind: str) -> str:
+    """SHA-256 of the model, embedding kind and normalized text."""
+    payload = f"{model}\0{kind}\0{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: an in-memory LRU in front of SQLite.
+
+    Vectors are stored as raw float32 blobs keyed by content hash, so
+    repeated chunks and queries never reach the embedding model twice.
+    The tiers have separate locks, so an LRU lookup never waits on a
+    SQLite read or commit in another thread.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_items: int = 10000):
+        self.max_items = max_items
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._db.commit()
+
+    @property
+    def persistent(self) -> bool:
+        """Whether there is a SQLite tier behind the LRU."""
+        return self._db is not None
+
+    def get_many(self, keys: Iterable[str], memory_only: bool = False) -> Dict[str, np.ndarray]:
+        """Return cached vectors for whichever keys are present, in memory only if requested."""
+        found: Dict[str, np.ndarray] = {}
+        missing: List[str] = []
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is None:
+                    missing.append(key)
+                else:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+
+        if missing and self._db is not None and not memory_only:
+            loaded: Dict[str, np.ndarray] = {}
+            with self._db_lock:
+                # Stay well under SQLite's bound-parameter limit
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                        batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        loaded[key] = np.frombuffer(blob, dtype=np.float32)
+            with self._lock:
+                for key, vector in loaded.items():
+                    self._remember(key, vector)
+            found.update(loaded)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        """Store vectors in both tiers."""
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for key, vector in items.items()]
+                )
+                self._db.commit()
+
+    async def aget_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Async variant of `get_many`: the LRU is read on the event loop, SQLite in a worker thread."""
+        keys = list(keys)
+        found = self.get_many(keys, memory_only=True)
+        if len(found) < len(keys) and self.persistent:
+            found.update(await asyncio.to_thread(self.get_many, [key for key in keys if key not in found]))
+        return found
+
+    async def aput_many(self, items: Dict[str, np.ndarray]) -> None:
+        """Async variant of `put_many`, writing through to SQLite in a worker thread."""
+        if self.persistent:
+            await asyncio.to_thread(self.put_many, items)
+        else:
+            self.put_many(items)
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        """Insert into the LRU tier, evicting the least recently used entries."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+
+class CachedEmbeddings:
+    """Wraps an embeddings client so only uncached texts reach the model."""
+
+    def __init__(self, embeddings: Any, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+
+    def embed_documents(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed documents, calling the model only for cache misses."""
+        keys, found, missing = self._lookup(texts, "document")
+        if missing:
+            vectors = self.embeddings.embed_documents([texts[i] for i in missing.values()])
+            self._store(keys, found, missing, vectors)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Embed a query, reusing the cached vector for repeated questions."""
+        key = cache_key(text, self.model, "query")
+        found = self.cache.get_many([key])
+        if key not in found:
+            found[key] = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+            self.cache.put_many(found)
+        return found[key]
+
+    async def aembed_documents(self, texts: List[str]) -> List[np.ndarray]:
+        """Async variant of `embed_documents`; SQLite is only touched from worker threads."""
+        keys = self._keys(texts, "document")
+        found = await self.cache.aget_many(set(keys))
+        missing = self._missing(keys, found)
+        if missing:
+            vectors = await self.embeddings.aembed_documents([texts[i] for i in missing.values()])
+            computed = self._computed(missing, vectors)
+            await self.cache.aput_many(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        """Async variant of `embed_query`; SQLite is only touched from worker threads."""
+        key = cache_key(text, self.model, "query")
+        found = await self.cache.aget_many([key])
+        if key not in found:
+            found[key] = np.asarray(await self.embeddings.aembed_query(text), dtype=np.float32)
+            await self.cache.aput_many(found)
+        return found[key]
+
+    def _keys(self, texts: List[str], kind: str) -> List[str]:
+        return [cache_key(text, self.model, kind) for text in texts]
+
+    def _lookup(self, texts: List[str], kind: str):
+        """Return keys per text, cached vectors, and one text index per missing key."""
+        keys = self._keys(texts, kind)
+        found = self.cache.get_many(set(keys))
+        return keys, found, self._missing(keys, found)
+
+    @staticmethod
+    def _missing(keys: List[str], found: Dict[str, np.ndarray]) -> Dict[str, int]:
+        """One text index per key without a cached vector."""
+        missing: Dict[str, int] = {}
+        for i, key in enumerate(keys):
+            if key not in found and key not in missing:
+                missing[key] = i
+        return missing
+
+    @staticmethod
+    def _computed(missing: Dict[str, int], vectors) -> Dict[str, np.ndarray]:
+        return {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, vectors)}
+
+    def _store(self, keys, found, missing, vectors) -> None:
+        """Record freshly computed vectors for the missing keys."""
+        computed = self._computed(missing, vectors)
+        self.cache.put_many(computed)
+        found.update(computed)
+
+
+@lru_cache()
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide embedding cache shared by all retrieval components."""
+    settings = get_settings()
+    path = Path(settings.STORAGE_DIR) / "embedding_cache.sqlite" if settings.EMBEDDING_CACHE_PERSIST else None
+    return EmbeddingCache(path, max_items=settings.EMBEDDING_CACHE_SIZE)
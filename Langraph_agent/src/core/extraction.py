@@ -0,0 +1,100 @@
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List
+
+from ..config.settings import get_settings
+
+settings = get_settings()
+
+SUPPORTED_EXTENSIONS = ("pdf", "docx", "txt")
+
+
+class ExtractionLimitError(ValueError):
+    """Raised when an upload exceeds the configured size or page limits."""
+
+
+@lru_cache()
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """Process pool shared by all extraction calls.
+
+    Workers are spawned rather than forked so they do not inherit the
+    server's threads (event loop, FAISS/OpenMP pools).
+    """
+    return ProcessPoolExecutor(
+        max_workers=settings.EXTRACTION_WORKERS or None,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def check_upload_size(size: int) -> None:
+    """Reject uploads larger than MAX_UPLOAD_BYTES."""
+    if size > settings.MAX_UPLOAD_BYTES:
+        raise ExtractionLimitError(
+            f"File is {size} bytes; the limit is {settings.MAX_UPLOAD_BYTES} bytes"
+        )
+
+
+def _count_pdf_pages(data: bytes) -> int:
+    """Return the number of pages in a PDF."""
+    import PyPDF2  # Imported in the extraction workers only, keeping server startup fast
+
+    return len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+
+
+def _extract_pdf_range(data: bytes, start: int, stop: int) -> List[str]:
+    """Extract the text of pages [start, stop) of a PDF."""
+    import PyPDF2
+
+    pages = PyPDF2.PdfReader(io.BytesIO(data)).pages
+    return [pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _extract_word_text(data: bytes) -> str:
+    """Extract paragraph text from a Word document."""
+    import docx
+
+    document = docx.Document(io.BytesIO(data))
+    return "\n".join(paragraph.text for paragraph in document.paragraphs)
+
+
+async def extract_pdf_pages(data: bytes) -> List[str]:
+    """Extract per-page text from a PDF in the process pool.
+
+    Large PDFs are split into page ranges extracted in parallel; the event
+    loop only awaits the results.
+    """
+    check_upload_size(len(data))
+    loop = asyncio.get_running_loop()
+    pool = get_extraction_pool()
+
+    page_count = await loop.run_in_executor(pool, _count_pdf_pages, data)
+    if page_count > settings.MAX_PDF_PAGES:
+        raise ExtractionLimitError(
+            f"PDF has {page_count} pages; the limit is {settings.MAX_PDF_PAGES} pages"
+        )
+
+    step = settings.PDF_PAGES_PER_TASK
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    results = await asyncio.gather(*(
+        loop.run_in_executor(pool, _extract_pdf_range, data, start, stop)
+        for start, stop in ranges
+    ))
+    return [page for pages in results for page in pages]
+
+
+async def extract_document(filename: str, data: bytes) -> List[str]:
+    """Extract page texts from an uploaded file based on its extension."""
+    extension = filename.rsplit(".", 1)[-1].lower()
+    if extension == "pdf":
+        return await extract_pdf_pages(data)
+
+    check_upload_size(len(data))
+    if extension == "docx":
+        loop = asyncio.get_running_loop()
+        return [await loop.run_in_executor(get_extraction_pool(), _extract_word_text, data)]
+    if extension == "txt":
+        return [data.decode("utf-8")]
+    raise ValueError(f"Unsupported file type: {extension}")
@@ -0,0 +1,118 @@
+import asyncio
+import time
+import zlib
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from .bm25 import tokenize
+from .ranking import estimate_tokens
+
+
+class FakeEmbeddings:
+    """Deterministic offline embeddings with a configurable dimension and latency.
+
+    Each token is hashed to a signed position in the vector (feature
+    hashing), so texts sharing words get similar vectors and retrieval over
+    fake embeddings still behaves like retrieval. `latency_seconds` is added
+    to every call to simulate the network round-trip. `task_type` is
+    accepted, and ignored, like Gemini's.
+    """
+
+    def __init__(self, dimension: int = 768, latency_seconds: float = 0.0):
+        self.dimension = dimension
+        self.latency_seconds = latency_seconds
+        self.model = f"fake-{dimension}"
+
+    def _embed(self, text: str) -> List[float]:
+        hashes = np.array([zlib.crc32(token.encode("utf-8")) for token in tokenize(text)], dtype=np.int64)
+        if not len(hashes):
+            hashes = np.array([zlib.crc32(text.encode("utf-8"))], dtype=np.int64)
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        np.add.at(vector, hashes % self.dimension, np.where(hashes & (1 << 31), 1.0, -1.0))
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str], task_type: Optional[str] = None, **options: Any) -> List[List[float]]:
+        time.sleep(self.latency_seconds)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str, **options: Any) -> List[float]:
+        time.sleep(self.latency_seconds)
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str], task_type: Optional[str] = None, **options: Any) -> List[List[float]]:
+        await asyncio.sleep(self.latency_seconds)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str, **options: Any) -> List[float]:
+        await asyncio.sleep(self.latency_seconds)
+        return self._embed(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic offline chat model that streams a canned answer with simulated latency.
+
+    The answer quotes the start of the prompt's last message, so responses
+    differ per question. Token usage is reported like a real model's.
+    """
+
+    latency_seconds: float = 0.0  # Before the first token
+    token_latency_seconds: float = 0.0  # Per generated token
+    answer_words: int = 40
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _answer(self, messages: List[BaseMessage]) -> List[str]:
+        """Words of the answer, each with its trailing space."""
+        question = str(messages[-1].content) if messages else ""
+        words = f"Offline answer to: {question}".split()[:self.answer_words]
+        return [word + " " for word in words]
+
+    def _message(self, messages: List[BaseMessage], words: List[str]) -> AIMessage:
+        prompt_tokens = sum(estimate_tokens(str(message.content)) for message in messages)
+        return AIMessage(
+            content="".join(words),
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": len(words),
+                "total_tokens": prompt_tokens + len(words),
+            }
+        )
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        words = self._answer(messages)
+        time.sleep(self.latency_seconds + self.token_latency_seconds * len(words))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, words))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        words = self._answer(messages)
+        await asyncio.sleep(self.latency_seconds + self.token_latency_seconds * len(words))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, words))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency_seconds)
+        for word in self._answer(messages):
+            time.sleep(self.token_latency_seconds)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word))
+            if run_manager:
+                run_manager.on_llm_new_token(word, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency_seconds)
+        for word in self._answer(messages):
+            await asyncio.sleep(self.token_latency_seconds)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word))
+            if run_manager:
+                await run_manager.on_llm_new_token(word, chunk=chunk)
+            yield chunk
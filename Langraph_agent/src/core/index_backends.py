@@ -0,0 +1,482 @@
+import heapq
+import itertools
+import time
+import faiss
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+# Index types that must be trained on sample vectors before use
+TRAINABLE_INDEX_TYPES = ("ivf_flat", "ivf_pq")
+
+# Read-only loads map index data in place where this faiss build supports it, so worker processes
+# share one copy in the page cache; older builds only map IVF inverted lists and copy the rest to the heap
+ZERO_COPY_MMAP = hasattr(faiss, "IO_FLAG_MMAP_IFC")
+MMAP_FLAG = faiss.IO_FLAG_MMAP_IFC if ZERO_COPY_MMAP else faiss.IO_FLAG_MMAP
+# Heap bytes per stored vector that are never mapped: the id, and IndexIDMap2's reverse id map entry
+ID_BYTES = 48
+
+# How flat, IVF-Flat and HNSW indexes store vectors: as is, or scalar-quantized per dimension
+INDEX_ENCODINGS = {
+    "float32": None,
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,  # Learns each dimension's range, so needs training
+}
+
+
+def scalar_quantizer(settings) -> Optional[int]:
+    """The FAISS scalar quantizer type for INDEX_ENCODING, or None for float32."""
+    if settings.INDEX_ENCODING not in INDEX_ENCODINGS:
+        raise ValueError(
+            f"Unsupported index encoding: {settings.INDEX_ENCODING}. Expected one of {tuple(INDEX_ENCODINGS)}"
+        )
+    return INDEX_ENCODINGS[settings.INDEX_ENCODING]
+
+
+def needs_training(index_type: str, settings) -> bool:
+    """Whether an index of this type and encoding must be trained before use."""
+    return index_type in TRAINABLE_INDEX_TYPES or (
+        index_type != "ivf_pq" and scalar_quantizer(settings) == faiss.ScalarQuantizer.QT_8bit
+    )
+
+
+def create_index(index_type: str, dimension: int, settings) -> faiss.Index:
+    """Build an empty FAISS index of the configured type and encoding that accepts explicit ids.
+
+    IVF indexes store ids natively; flat and HNSW indexes are wrapped in an
+    IndexIDMap2 so chunk ids stay stable when vectors are removed. IVF-PQ
+    compresses vectors itself and ignores INDEX_ENCODING.
+    """
+    qtype = scalar_quantizer(settings)
+    if index_type == "flat":
+        if qtype is None:
+            return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+        return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dimension, qtype, faiss.METRIC_L2))
+    if index_type == "ivf_flat":
+        quantizer = faiss.IndexFlatL2(dimension)
+        if qtype is None:
+            return _with_direct_map(faiss.IndexIVFFlat(quantizer, dimension, settings.IVF_NLIST))
+        return _with_direct_map(
+            faiss.IndexIVFScalarQuantizer(quantizer, dimension, settings.IVF_NLIST, qtype, faiss.METRIC_L2)
+        )
+    if index_type == "hnsw":
+        if qtype is None:
+            index = faiss.IndexHNSWFlat(dimension, settings.HNSW_M)
+        else:
+            index = faiss.IndexHNSWSQ(dimension, qtype, settings.HNSW_M)
+        index.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+        return faiss.IndexIDMap2(index)
+    if index_type == "ivf_pq":
+        quantizer = faiss.IndexFlatL2(dimension)
+        return _with_direct_map(
+            faiss.IndexIVFPQ(quantizer, dimension, settings.IVF_NLIST, settings.PQ_M, settings.PQ_NBITS)
+        )
+    raise ValueError(f"Unsupported index type: {index_type}. Expected one of {INDEX_TYPES}")
+
+
+def _with_direct_map(index: faiss.Index) -> faiss.Index:
+    """Let an IVF index reconstruct vectors by id (needed for MMR re-ranking)."""
+    if isinstance(index, faiss.IndexIVF) and index.direct_map.type == faiss.DirectMap.NoMap:
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index
+
+
+def _unwrap(index: faiss.Index) -> faiss.Index:
+    """The index behind an IndexIDMap, or the index itself."""
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+
+
+def is_exact(index: faiss.Index) -> bool:
+    """Whether an index stores full-precision vectors, so its distances are exact."""
+    index = _unwrap(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    return isinstance(index, (faiss.IndexFlat, faiss.IndexIVFFlat))
+
+
+def configure_search(index: faiss.Index, settings) -> None:
+    """Apply query-time parameters from settings to an index."""
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = settings.HNSW_EF_SEARCH
+        return
+    try:
+        faiss.extract_index_ivf(index).nprobe = settings.IVF_NPROBE
+    except RuntimeError:
+        pass  # Not an IVF index
+
+
+class FaissBackend:
+    """A FAISS index of a configurable type behind a uniform interface.
+
+    Trainable types (IVF-Flat, IVF-PQ, and any int8-encoded index) start out
+    as a flat staging index and are trained automatically once enough vectors
+    have been added, at which point the staged vectors are moved into the
+    trained index.
+
+    Vectors are added with explicit ids (the chunk ids of the docstore), and
+    search returns those ids.
+    """
+
+    def __init__(self, index_type: str, dimension: int, settings, index: faiss.Index = None):
+        self.index_type = index_type
+        self.dimension = dimension
+        self.settings = settings
+        self.trainable = needs_training(index_type, settings)
+        if index is None:
+            index = (
+                faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+                if self.trainable
+                else create_index(index_type, dimension, settings)
+            )
+        # IVF snapshots from before reconstruction support get their id map built here
+        self.index = _with_direct_map(index)
+        configure_search(self.index, settings)
+        self.mapped = False  # Vectors are memory-mapped and shared with other processes
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    @property
+    def is_staging(self) -> bool:
+        """Whether vectors are held in a flat index awaiting training."""
+        return self.trainable and isinstance(_unwrap(self.index), faiss.IndexFlat)
+
+    @property
+    def exact(self) -> bool:
+        """Whether search distances are exact (no scalar or product quantization)."""
+        return is_exact(self.index)
+
+    @property
+    def supports_remove(self) -> bool:
+        """Whether vectors can be physically removed (HNSW graphs cannot)."""
+        return not (
+            isinstance(self.index, faiss.IndexIDMap)
+            and isinstance(faiss.downcast_index(self.index.index), faiss.IndexHNSW)
+        )
+
+    @property
+    def train_threshold(self) -> int:
+        """Number of vectors required before the target index is trained."""
+        if self.index_type not in TRAINABLE_INDEX_TYPES:
+            return self.settings.INDEX_TRAIN_MIN_VECTORS  # Scalar quantizer ranges only
+        # FAISS needs ~39 points per centroid for stable k-means
+        minimum = 39 * self.settings.IVF_NLIST
+        if self.index_type == "ivf_pq":
+            minimum = max(minimum, 2 ** self.settings.PQ_NBITS)
+        return max(self.settings.INDEX_TRAIN_MIN_VECTORS, minimum)
+
+    def memory_bytes(self) -> int:
+        """Estimate the index's private resident size from its vector count and code size.
+
+        Memory-mapped vectors live in the page cache, shared by every process
+        mapping the same file, so only the id maps count.
+        """
+        if self.mapped:
+            return self.ntotal * ID_BYTES
+        index = _unwrap(self.index)
+        if isinstance(index, faiss.IndexHNSW):
+            # Stored codes plus graph links
+            per_vector = faiss.downcast_index(index.storage).code_size + 4 * 2 * self.settings.HNSW_M
+        else:
+            per_vector = getattr(index, "code_size", 4 * self.dimension)
+        return self.ntotal * (per_vector + ID_BYTES)
+
+    def ids(self) -> np.ndarray:
+        """Ids of the stored vectors; only indexes behind an IndexIDMap (flat, HNSW) list them."""
+        return faiss.vector_to_array(self.index.id_map).astype(np.int64)
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray) -> None:
+        """Add float32 vectors under int64 ids, training the target index once enough exist."""
+        self.index.add_with_ids(vectors, ids)
+        if self.is_staging and self.index.ntotal >= self.train_threshold:
+            self.train()
+
+    def remove(self, ids: np.ndarray) -> bool:
+        """Remove vectors by id; returns False if this index type cannot remove."""
+        if not self.supports_remove:
+            return False
+        self.index.remove_ids(np.asarray(ids, dtype=np.int64))
+        return True
+
+    def train(self) -> None:
+        """Train the configured index on the staged vectors and move them into it."""
+        staged_ids = faiss.vector_to_array(self.index.id_map)
+        staged = faiss.downcast_index(self.index.index).reconstruct_n(0, self.index.ntotal)
+        index = create_index(self.index_type, self.dimension, self.settings)
+
+        # k-means cost grows with sample size; a few hundred points per list is plenty
+        sample_size = min(len(staged), self.settings.IVF_NLIST * 256)
+        sample = staged[np.random.default_rng(0).choice(len(staged), sample_size, replace=False)]
+        index.train(sample)
+        index.add_with_ids(staged, staged_ids)
+
+        configure_search(index, self.settings)
+        self.index = index
+
+    def reconstruct(self, ids: np.ndarray) -> np.ndarray:
+        """Return the stored vectors for ids (approximate for IVF-PQ)."""
+        return self.index.reconstruct_batch(np.asarray(ids, dtype=np.int64))
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (distances, ids) for each query row."""
+        return self.index.search(queries, k)
+
+    FILE_SUFFIX = ".faiss"
+
+    def write(self, path: str) -> None:
+        """Serialize the index to `path`."""
+        faiss.write_index(self.index, path)
+
+    @classmethod
+    def read(cls, path: str, index_type: str, settings, mmap: bool = True) -> "FaissBackend":
+        """Load an index written by `write`, memory-mapping it read-only if requested."""
+        index = faiss.read_index(path, MMAP_FLAG if mmap else 0)
+        mapped = mmap and (ZERO_COPY_MMAP or isinstance(index, faiss.IndexIVF))
+        if not isinstance(index, (faiss.IndexIDMap, faiss.IndexIVF)):
+            # Snapshots from before explicit ids: rows were numbered sequentially
+            vectors = index.reconstruct_n(0, index.ntotal)
+            migrated = create_index("hnsw" if isinstance(index, faiss.IndexHNSW) else "flat", index.d, settings)
+            migrated.add_with_ids(vectors, np.arange(index.ntotal, dtype=np.int64))
+            index, mapped = migrated, False
+        backend = cls(index_type, index.d, settings, index=index)
+        backend.mapped = mapped
+        return backend
+
+
+@lru_cache()
+def get_search_pool(workers: int) -> ThreadPoolExecutor:
+    """Process-wide threads for searching shards; FAISS releases the GIL while searching."""
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="index-shard")
+
+
+class ShardedBackend:
+    """N FaissBackend shards searched in parallel, behind the FaissBackend interface.
+
+    Chunk id i lives in shard i % N. A search runs every shard on a thread
+    pool and merges the per-shard top-k lists with a heap, so single-query
+    latency scales with the shard size rather than the corpus. Shards of
+    trainable types are trained independently once each has enough vectors.
+    Snapshots are a directory holding one index file per shard.
+    """
+
+    FILE_SUFFIX = ""
+
+    def __init__(self, index_type: str, dimension: int, settings, shards: Optional[List[FaissBackend]] = None):
+        self.index_type = index_type
+        self.dimension = dimension
+        self.settings = settings
+        self.shards = shards or [
+            FaissBackend(index_type, dimension, settings) for _ in range(settings.INDEX_SHARDS)
+        ]
+        self._pool = get_search_pool(len(self.shards))
+
+    @property
+    def ntotal(self) -> int:
+        return sum(shard.ntotal for shard in self.shards)
+
+    @property
+    def supports_remove(self) -> bool:
+        return all(shard.supports_remove for shard in self.shards)
+
+    @property
+    def exact(self) -> bool:
+        return all(shard.exact for shard in self.shards)
+
+    def memory_bytes(self) -> int:
+        """Estimate the shards' combined private resident size."""
+        return sum(shard.memory_bytes() for shard in self.shards)
+
+    def ids(self) -> np.ndarray:
+        """Ids of the stored vectors in all shards."""
+        return np.concatenate([shard.ids() for shard in self.shards])
+
+    def _partition(self, ids: np.ndarray) -> List[np.ndarray]:
+        """Positions in `ids` belonging to each shard."""
+        owner = ids % len(self.shards)
+        return [np.flatnonzero(owner == n) for n in range(len(self.shards))]
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray) -> None:
+        """Add float32 vectors under int64 ids, each to the shard owning its id."""
+        for shard, rows in zip(self.shards, self._partition(ids)):
+            if len(rows):
+                shard.add(np.ascontiguousarray(vectors[rows]), ids[rows])
+
+    def remove(self, ids: np.ndarray) -> bool:
+        """Remove vectors by id; returns False if this index type cannot remove."""
+        if not self.supports_remove:
+            return False
+        ids = np.asarray(ids, dtype=np.int64)
+        for shard, rows in zip(self.shards, self._partition(ids)):
+            if len(rows):
+                shard.remove(ids[rows])
+        return True
+
+    def reconstruct(self, ids: np.ndarray) -> np.ndarray:
+        """Return the stored vectors for ids, gathered from their shards."""
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.empty((len(ids), self.dimension), dtype=np.float32)
+        for shard, rows in zip(self.shards, self._partition(ids)):
+            if len(rows):
+                vectors[rows] = shard.reconstruct(ids[rows])
+        return vectors
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Search all shards concurrently and merge them into (distances, ids) for each query row."""
+        return merge_results(list(self._pool.map(lambda shard: shard.search(queries, k), self.shards)), k)
+
+    def write(self, path: str) -> None:
+        """Serialize each shard into directory `path`."""
+        Path(path).mkdir(parents=True, exist_ok=True)
+        for n, shard in enumerate(self.shards):
+            shard.write(str(Path(path) / f"shard-{n}.faiss"))
+
+    @classmethod
+    def read(cls, path: str, index_type: str, settings, mmap: bool = True) -> "ShardedBackend":
+        """Load shards written by `write`; the shard count comes from the snapshot."""
+        files = sorted(Path(path).glob("shard-*.faiss"), key=lambda f: int(f.stem.split("-")[1]))
+        if not files:
+            raise FileNotFoundError(f"No index shards (shard-*.faiss) in {path}")
+        shards = [FaissBackend.read(str(f), index_type, settings, mmap=mmap) for f in files]
+        return cls(index_type, shards[0].dimension, settings, shards=shards)
+
+
+def merge_results(results: List[Tuple[np.ndarray, np.ndarray]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge (distances, ids) search results of disjoint indexes into the overall top k per query row."""
+    rows = len(results[0][0])
+    distances = np.full((rows, k), np.inf, dtype=np.float32)
+    ids = np.full((rows, k), -1, dtype=np.int64)
+    for row in range(rows):
+        # Each index's list is sorted by distance; -1 marks missing results
+        merged = heapq.merge(*(
+            zip(D[row][I[row] >= 0].tolist(), I[row][I[row] >= 0].tolist()) for D, I in results
+        ))
+        for column, (distance, i) in enumerate(itertools.islice(merged, k)):
+            distances[row, column], ids[row, column] = distance, i
+    return distances, ids
+
+
+def create_delta(vectors: np.ndarray, ids: np.ndarray, settings) -> FaissBackend:
+    """An exact flat segment holding vectors added since the base index was last rewritten."""
+    index = faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1]))
+    index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), np.asarray(ids, dtype=np.int64))
+    return FaissBackend("flat", vectors.shape[1], settings, index=index)
+
+
+class SegmentedIndex:
+    """A read-only base index plus small flat delta segments, behind the FaissBackend interface.
+
+    Writers add their vectors as a new delta segment instead of rewriting
+    the base, so a write costs what it adds. Search merges the top k of
+    every segment. Segments are immutable once written and hold disjoint
+    chunk ids. Deleted chunks stay in them until the next compaction, so
+    callers filter them out of results.
+    """
+
+    def __init__(self, base, deltas: List[FaissBackend]):
+        self.base = base
+        self.deltas = deltas
+        self.dimension = base.dimension
+        self._delta_ids = [delta.ids() for delta in deltas]
+
+    @property
+    def ntotal(self) -> int:
+        return self.base.ntotal + sum(delta.ntotal for delta in self.deltas)
+
+    @property
+    def exact(self) -> bool:
+        return self.base.exact  # Deltas are always exact
+
+    @property
+    def supports_remove(self) -> bool:
+        return False
+
+    def memory_bytes(self) -> int:
+        """Estimate the segments' combined private resident size."""
+        return self.base.memory_bytes() + sum(delta.memory_bytes() for delta in self.deltas)
+
+    def reconstruct(self, ids: np.ndarray) -> np.ndarray:
+        """Return the stored vectors for ids, gathered from the segments holding them."""
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.empty((len(ids), self.dimension), dtype=np.float32)
+        in_base = np.ones(len(ids), dtype=bool)
+        for delta, delta_ids in zip(self.deltas, self._delta_ids):
+            rows = np.flatnonzero(np.isin(ids, delta_ids))
+            if len(rows):
+                vectors[rows] = delta.reconstruct(ids[rows])
+                in_base[rows] = False
+        if in_base.any():
+            vectors[in_base] = self.base.reconstruct(ids[in_base])
+        return vectors
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Search every segment and merge them into (distances, ids) for each query row."""
+        if not self.deltas:
+            return self.base.search(queries, k)
+        return merge_results([segment.search(queries, k) for segment in [self.base] + self.deltas], k)
+
+
+def create_backend(index_type: str, dimension: int, settings):
+    """A new, empty index, sharded when INDEX_SHARDS > 1."""
+    if settings.INDEX_SHARDS > 1:
+        return ShardedBackend(index_type, dimension, settings)
+    return FaissBackend(index_type, dimension, settings)
+
+
+def read_backend(path: str, index_type: str, settings, mmap: bool = True):
+    """Load a snapshot written by either backend's `write`."""
+    backend = ShardedBackend if Path(path).is_dir() else FaissBackend
+    return backend.read(path, index_type, settings, mmap=mmap)
+
+
+def recall_at_k(ground_truth: np.ndarray, results: np.ndarray, k: int) -> float:
+    """Fraction of the true top-k neighbours found in the returned top-k."""
+    hits = sum(
+        len(set(truth[:k]) & set(found[:k]))
+        for truth, found in zip(ground_truth, results)
+    )
+    return hits / (len(ground_truth) * k)
+
+
+def benchmark_index_types(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    settings,
+    k: int = 10,
+    index_types: Tuple[str, ...] = INDEX_TYPES
+) -> List[Dict[str, float]]:
+    """Report recall@k against exact search and per-query latency for each index type."""
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, ground_truth = exact.search(queries, k)
+
+    report = []
+    for index_type in index_types:
+        backend = FaissBackend(index_type, vectors.shape[1], settings)
+        start = time.perf_counter()
+        backend.add(vectors, np.arange(len(vectors), dtype=np.int64))
+        if backend.is_staging:
+            backend.train()
+        build_seconds = time.perf_counter() - start
+
+        # Search one query at a time, as the /ask path does
+        results = np.empty((len(queries), k), dtype=np.int64)
+        start = time.perf_counter()
+        for row, query in enumerate(queries):
+            _, found = backend.search(query[None, :], k)
+            results[row] = found[0]
+        search_seconds = time.perf_counter() - start
+
+        report.append({
+            "index_type": index_type,
+            f"recall@{k}": recall_at_k(ground_truth, results, k),
+            "latency_ms": 1000 * search_seconds / len(queries),
+            "build_s": build_seconds,
+        })
+    return report
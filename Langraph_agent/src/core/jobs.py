@@ -0,0 +1,170 @@
+import asyncio
+import io
+import uuid
+import zipfile
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from ..config.settings import get_settings
+from ..models.schema import IngestionJob
+from .collection_registry import CollectionRegistry
+from .document_manager import DuplicateDocumentError
+from .extraction import SUPPORTED_EXTENSIONS, check_upload_size
+
+settings = get_settings()
+
+
+class _Source(NamedTuple):
+    filename: str
+    load: Callable[[], bytes]  # Reads the file's bytes when it is processed
+
+
+def _is_supported(filename: str) -> bool:
+    return filename.rsplit(".", 1)[-1].lower() in SUPPORTED_EXTENSIONS
+
+
+def _expand_upload(filename: str, data: bytes) -> List[_Source]:
+    """Turn an uploaded file, or each supported entry of a zip archive, into sources."""
+    if not filename.lower().endswith(".zip"):
+        return [_Source(filename, lambda: data)]
+
+    archive = zipfile.ZipFile(io.BytesIO(data))
+    sources = []
+    for info in archive.infolist():
+        if info.is_dir() or not _is_supported(info.filename):
+            continue
+        # Guards against zip bombs: sizes come from the archive directory
+        check_upload_size(info.file_size)
+        sources.append(_Source(f"{filename}/{info.filename}", lambda info=info: archive.read(info)))
+    return sources
+
+
+def _expand_directory(root: Path) -> List[_Source]:
+    """List supported files under a directory, read lazily."""
+    return [
+        _Source(str(path.relative_to(root)), path.read_bytes)
+        for path in sorted(root.rglob("*"))
+        if path.is_file() and _is_supported(path.name)
+    ]
+
+
+class IngestionQueue:
+    """In-process queue of batch ingestion jobs served by background workers.
+
+    Each job stores and extracts its files through its collection's
+    document manager, then indexes every document at once, so embedding
+    batches span files and the index receives a single bulk add per job.
+    """
+
+    def __init__(self, collections: CollectionRegistry, workers: int = 2, history: int = 100):
+        self.collections = collections
+        self.workers = workers
+        self.history = history
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def submit(
+        self,
+        collection: str,
+        uploads: Optional[List[Tuple[str, bytes]]] = None,
+        directory: Optional[Path] = None
+    ) -> IngestionJob:
+        """Queue uploaded files (zip archives are expanded) or a directory import."""
+        self._ensure_workers()
+        job = IngestionJob(
+            job_id=str(uuid.uuid4()),
+            collection=collection,
+            status="queued",
+            created_at=datetime.utcnow().isoformat()
+        )
+        self.jobs[job.job_id] = job
+        self._trim_history()
+        self._queue.put_nowait((job, uploads or [], directory))
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        """Return a job by id, if it is still retained."""
+        return self.jobs.get(job_id)
+
+    def _ensure_workers(self) -> None:
+        """Start the worker tasks on the running event loop the first time they are needed."""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        """Stop the workers, abandoning queued jobs and cancelling running ones."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def _trim_history(self) -> None:
+        """Forget the oldest finished jobs beyond the history limit."""
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished_at]
+        for job_id in finished[:max(0, len(self.jobs) - self.history)]:
+            del self.jobs[job_id]
+
+    async def _worker(self) -> None:
+        while True:
+            job, uploads, directory = await self._queue.get()
+            try:
+                await self._run(job, uploads, directory)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: IngestionJob, uploads: List[Tuple[str, bytes]], directory: Optional[Path]) -> None:
+        """Extract, embed and index every file of a job, recording progress."""
+        job.status = "running"
+        try:
+            sources = await asyncio.to_thread(self._expand, uploads, directory)
+            if len(sources) > settings.MAX_BATCH_FILES:
+                raise ValueError(f"Job has {len(sources)} files; the limit is {settings.MAX_BATCH_FILES}")
+            job.total_files = len(sources)
+
+            async with self.collections.acquire(job.collection, create=True) as collection:
+                document_manager = collection.document_manager
+
+                # Bound how many files are held in memory while waiting for the pool
+                semaphore = asyncio.Semaphore(2 * (settings.EXTRACTION_WORKERS or 4))
+
+                async def extract(source: _Source):
+                    async with semaphore:
+                        try:
+                            data = await asyncio.to_thread(source.load)
+                            return await document_manager.store_document(source.filename, data, {})
+                        except DuplicateDocumentError:
+                            job.duplicate_files += 1
+                            return None
+                        except Exception as e:
+                            job.errors.append(f"{source.filename}: {str(e)}")
+                            return None
+                        finally:
+                            job.processed_files += 1
+
+                documents = [doc for doc in await asyncio.gather(*map(extract, sources)) if doc]
+
+                def progress(embedded: int, total: int) -> None:
+                    job.embedded_chunks = embedded
+                    job.total_chunks = total
+
+                counts = await document_manager.index_documents(documents, progress)
+            job.indexed_chunks = sum(counts)
+            job.status = "completed"
+        except Exception as e:
+            job.status = "failed"
+            job.errors.append(str(e))
+        finally:
+            job.finished_at = datetime.utcnow().isoformat()
+
+    @staticmethod
+    def _expand(uploads: List[Tuple[str, bytes]], directory: Optional[Path]) -> List[_Source]:
+        """Resolve a job's inputs into individual sources."""
+        sources = [source for filename, data in uploads for source in _expand_upload(filename, data)]
+        if directory is not None:
+            sources.extend(_expand_directory(directory))
+        return sources
@@ -0,0 +1,167 @@
+import asyncio
+import random
+import re
+from typing import Any, Awaitable, Callable, List, Optional, TypeVar
+
+from ..config.settings import get_settings
+from .concurrency import ModelRateLimitError, get_rate_limiter
+from .ranking import estimate_tokens
+from .telemetry import MODEL_HEDGES, MODEL_RETRIES, RATE_LIMIT_WAIT_SECONDS
+
+settings = get_settings()
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# Exception names used by the Google client libraries across versions
+RATE_LIMIT_ERRORS = {"ResourceExhausted", "TooManyRequests", "GoogleRateLimitError", "ModelRateLimitError"}
+UNAVAILABLE_ERRORS = {"ServiceUnavailable", "DeadlineExceeded", "InternalServerError", "GoogleAPIError"}
+RETRY_DELAY_PATTERN = re.compile(r"retry_?delay\D{0,20}?(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+
+def _chain(error: BaseException) -> List[BaseException]:
+    """The error and the errors it was raised from, outermost first."""
+    chain = []
+    while error is not None and error not in chain:
+        chain.append(error)
+        error = error.__cause__ or error.__context__
+    return chain
+
+
+def _status(error: BaseException) -> Optional[int]:
+    """HTTP status of the first error in the chain that reports one."""
+    for err in _chain(error):
+        code = getattr(err, "code", None)
+        if not isinstance(code, int):
+            code = getattr(err, "status_code", None)
+        if isinstance(code, int) and 100 <= code < 600:
+            return code
+    return None
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether a model call failed because the API's quota was exhausted (HTTP 429)."""
+    return _status(error) == 429 or any(type(err).__name__ in RATE_LIMIT_ERRORS for err in _chain(error))
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a model call failed transiently: rate limited, unavailable or timed out."""
+    if isinstance(error, ModelRateLimitError):
+        return False  # Raised by our own rate limiter after queueing as long as allowed
+    if _status(error) in RETRYABLE_STATUS:
+        return True
+    return any(
+        type(err).__name__ in RATE_LIMIT_ERRORS | UNAVAILABLE_ERRORS
+        or isinstance(err, (asyncio.TimeoutError, TimeoutError, ConnectionError))
+        for err in _chain(error)
+    )
+
+
+def server_retry_delay(error: BaseException) -> Optional[float]:
+    """The retry delay a 429 response suggested, if its message carries one."""
+    match = RETRY_DELAY_PATTERN.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(max, base * 2^attempt)]."""
+    ceiling = min(settings.MODEL_RETRY_MAX_DELAY_MS, settings.MODEL_RETRY_BASE_DELAY_MS * 2 ** attempt)
+    return random.uniform(0, ceiling) / 1000
+
+
+async def call_with_retries(call: Callable[[], Awaitable[T]], model: str, tokens: int = 0) -> T:
+    """Make a model call within the model's rate limits, retrying transient failures.
+
+    Each attempt first waits for request and token budget. Rate-limited,
+    unavailable and timed-out calls are retried up to MODEL_MAX_RETRIES
+    times with jittered exponential backoff, waiting at least as long as
+    a 429 response asks. A rate limit that outlasts the retries is raised
+    as ModelRateLimitError so the API can answer 429 instead of 500.
+    """
+    limiter = get_rate_limiter(model)
+    attempt = 0
+    while True:
+        RATE_LIMIT_WAIT_SECONDS.labels(model).observe(await limiter.acquire(tokens))
+        try:
+            return await call()
+        except Exception as e:
+            if not is_retryable(e) or attempt >= settings.MODEL_MAX_RETRIES:
+                if is_rate_limited(e) and not isinstance(e, ModelRateLimitError):
+                    raise ModelRateLimitError(
+                        f"{model} rate limit exceeded after {attempt} retries: {str(e)}",
+                        retry_after=server_retry_delay(e) or settings.MODEL_RETRY_MAX_DELAY_MS / 1000
+                    ) from e
+                raise
+            delay = max(backoff_delay(attempt), server_retry_delay(e) or 0.0)
+            MODEL_RETRIES.labels(model, "rate_limited" if is_rate_limited(e) else "unavailable").inc()
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+async def hedged(call: Callable[[], Awaitable[T]], delay_seconds: float, model: str) -> T:
+    """Return the first successful result of `call`, sending a second request if the first is slow.
+
+    A duplicate starts when the first request has not finished within
+    `delay_seconds`; whichever succeeds first wins and the other is
+    cancelled. Only suitable for idempotent, cheap calls such as query
+    embeddings. A delay of 0 disables hedging.
+    """
+    if delay_seconds <= 0:
+        return await call()
+    tasks = [asyncio.ensure_future(call())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay_seconds)
+        if not done:
+            MODEL_HEDGES.labels(model).inc()
+            tasks.append(asyncio.ensure_future(call()))
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class ResilientEmbeddings:
+    """Wraps an embeddings client with rate limiting, retries and, for queries, hedging.
+
+    Async calls, which serve all API traffic, go through `call_with_retries`.
+    Query embeddings (`aembed_query`, and batches of queries marked with
+    Gemini's RETRIEVAL_QUERY task type) are hedged after
+    QUERY_EMBED_HEDGE_DELAY_MS. Synchronous calls pass straight through.
+    """
+
+    def __init__(self, embeddings: Any):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.hedge_delay_seconds = settings.QUERY_EMBED_HEDGE_DELAY_MS / 1000
+
+    def embed_documents(self, texts: List[str], **options: Any) -> List[Any]:
+        return self.embeddings.embed_documents(texts, **options)
+
+    def embed_query(self, text: str, **options: Any) -> Any:
+        return self.embeddings.embed_query(text, **options)
+
+    async def aembed_documents(self, texts: List[str], **options: Any) -> List[Any]:
+        tokens = sum(estimate_tokens(text) for text in texts)
+
+        def call() -> Awaitable[List[Any]]:
+            return call_with_retries(lambda: self.embeddings.aembed_documents(texts, **options), "embedding", tokens)
+
+        if options.get("task_type") == "RETRIEVAL_QUERY":
+            return await hedged(call, self.hedge_delay_seconds, "embedding")
+        return await call()
+
+    async def aembed_query(self, text: str, **options: Any) -> Any:
+        def call() -> Awaitable[Any]:
+            return call_with_retries(
+                lambda: self.embeddings.aembed_query(text, **options), "embedding", estimate_tokens(text)
+            )
+
+        return await hedged(call, self.hedge_delay_seconds, "embedding")
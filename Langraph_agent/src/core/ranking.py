@@ -0,0 +1,73 @@
+import math
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# Rough characters per token for English text; Gemini has no local tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of model tokens in a text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def cosine_similarities(query_vector: Sequence[float], vectors: np.ndarray) -> np.ndarray:
+    """Cosine similarity of each row of `vectors` to the query."""
+    query = _unit_rows(np.asarray(query_vector, dtype=np.float32))
+    return _unit_rows(np.asarray(vectors, dtype=np.float32)) @ query
+
+
+def maximal_marginal_relevance(
+    query_vector: Sequence[float],
+    vectors: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5
+) -> List[int]:
+    """Pick k row indices balancing similarity to the query against redundancy.
+
+    Each step selects the row maximizing
+    `lambda_mult * sim(query, row) - (1 - lambda_mult) * max sim(row, selected)`.
+    All pairwise similarities are computed once as matrix products, and the
+    greedy loop only updates a running maximum per row.
+    """
+    vectors = _unit_rows(np.asarray(vectors, dtype=np.float32))
+    relevance = vectors @ _unit_rows(np.asarray(query_vector, dtype=np.float32))
+    pairwise = vectors @ vectors.T
+
+    selected: List[int] = []
+    redundancy = np.zeros(len(vectors), dtype=np.float32)
+    available = np.ones(len(vectors), dtype=bool)
+    for _ in range(min(k, len(vectors))):
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, pairwise[best])
+    return selected
+
+
+def pack_context(texts: Sequence[str], token_budget: int) -> List[Tuple[int, str]]:
+    """Choose which ranked texts fit in the prompt's context budget.
+
+    Texts are taken in rank order and skipped when they would overflow the
+    budget, so a smaller lower-ranked chunk can still fill the remainder.
+    The top-ranked text is always kept, truncated if it alone exceeds the
+    budget. Returns (index, text) pairs in rank order.
+    """
+    chosen, used = [], 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if used + tokens <= token_budget:
+            chosen.append((i, text))
+            used += tokens
+        elif not chosen:
+            chosen.append((i, text[:token_budget * CHARS_PER_TOKEN]))
+            used = token_budget
+    return chosen
@@ -0,0 +1,88 @@
+import re
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+# Whole messages answered with a canned reply; trailing filler words ("hi there", "thanks so much") are ignored
+SMALL_TALK: Dict[str, Tuple[FrozenSet[str], str]] = {
+    "greeting": (
+        frozenset({
+            "hi", "hello", "hey", "hiya", "howdy", "greetings", "yo", "good morning", "good afternoon",
+            "good evening", "hi hi", "hey hey", "hello hello",
+        }),
+        "Hello! Ask me anything about the documents in this collection."
+    ),
+    "thanks": (
+        frozenset({
+            "thanks", "thank you", "thx", "ty", "cheers", "many thanks", "thanks a lot", "thank you very",
+            "much appreciated", "appreciate it", "ok thanks", "okay thanks", "great thanks", "perfect thanks",
+        }),
+        "You're welcome! Let me know if you have any other questions about your documents."
+    ),
+    "farewell": (
+        frozenset({"bye", "goodbye", "bye bye", "see you", "see ya", "good night", "later", "talk later"}),
+        "Goodbye! Come back any time you have questions about your documents."
+    ),
+}
+FILLER_WORDS = frozenset({"there", "again", "so", "much", "all", "everyone", "bot", "assistant", "you", "for", "that", "the", "help"})
+
+NO_DOCUMENTS_ANSWER = (
+    "No documents have been indexed in this collection yet. Upload documents, then ask your question again."
+)
+
+# Openings of questions answerable with a short fact from the context
+FACTUAL_OPENINGS = (
+    ("what",), ("when",), ("where",), ("who",), ("whom",), ("whose",), ("which",),
+    ("how", "many"), ("how", "much"), ("how", "old"), ("how", "long"), ("how", "big"), ("how", "often"),
+    ("is",), ("are",), ("was",), ("were",), ("does",), ("do",), ("did",), ("can",), ("has",), ("have",),
+)
+# Words asking for explanation, comparison or synthesis, which need the full model and prompt
+ANALYTICAL_WORDS = frozenset({
+    "why", "explain", "explains", "compare", "compared", "comparison", "contrast", "difference", "differences",
+    "differ", "versus", "vs", "analyze", "analyse", "analysis", "summarize", "summarise", "summary", "overview",
+    "describe", "discuss", "evaluate", "assess", "pros", "cons", "implications", "impact", "steps", "elaborate",
+    "detail", "details", "detailed", "relationship", "recommend", "should",
+})
+
+
+class Route(NamedTuple):
+    """How a question is answered: "small_talk" (with a canned `answer`), "simple" or "full"."""
+    kind: str
+    answer: Optional[str] = None
+
+
+def classify_query(query: str, simple_max_words: int) -> Route:
+    """Classify a question with local rules, without any model call.
+
+    Greetings, thanks and farewells get a canned answer. Single short
+    factual questions ("what is the invoice total?") are "simple"; anything
+    longer, with several questions or asking for explanation, comparison or
+    synthesis is "full".
+    """
+    words = WORD_PATTERN.findall(query.lower())
+    answer = _small_talk_answer(words)
+    if answer is not None:
+        return Route("small_talk", answer)
+
+    if (
+        0 < len(words) <= simple_max_words
+        and query.count("?") <= 1
+        and any(tuple(words[:len(opening)]) == opening for opening in FACTUAL_OPENINGS)
+        and not ANALYTICAL_WORDS.intersection(words)
+    ):
+        return Route("simple")
+    return Route("full")
+
+
+def _small_talk_answer(words: List[str]) -> Optional[str]:
+    """The canned answer for a message that is only small talk, dropping trailing filler words."""
+    end = len(words)
+    while end:
+        message = " ".join(words[:end])
+        for phrases, answer in SMALL_TALK.values():
+            if message in phrases:
+                return answer
+        if words[end - 1] not in FILLER_WORDS:
+            return None
+        end -= 1
+    return None
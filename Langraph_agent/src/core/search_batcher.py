@@ -0,0 +1,74 @@
+import asyncio
+from typing import Any, Callable, List, Sequence, Tuple
+
+import numpy as np
+
+# (chunk id, distance) pairs for one query
+Hits = List[Tuple[int, float]]
+
+
+class SearchBatcher:
+    """Coalesces concurrent vector searches into one 2-D index search.
+
+    A query arriving while no search is running is dispatched at once
+    (after `window_seconds`, if set); queries arriving while one is running
+    queue up and go out together as the next batch. Under load, batches
+    grow to match the arrival rate without delaying queries when idle.
+    Extra arguments (such as the index snapshot a query reads) are passed
+    through to `search`; only queries with the same arguments share a batch.
+    """
+
+    def __init__(
+        self,
+        search: Callable[..., List[Hits]],
+        max_batch: int = 64,
+        window_seconds: float = 0.0
+    ):
+        if max_batch <= 0:
+            raise ValueError("max_batch must be positive")
+        self._search = search
+        self.max_batch = max_batch
+        self.window_seconds = window_seconds
+        self._pending: List[Tuple[np.ndarray, int, Tuple[Any, ...], asyncio.Future]] = []
+        self._drainer = None
+        self.batches = 0
+        self.queries = 0
+
+    async def search(self, query_vector: Sequence[float], k: int, *args: Any) -> Hits:
+        """Return (chunk id, distance) pairs for one query, searched in a shared batch."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((np.asarray(query_vector, dtype=np.float32), k, args, future))
+        if self._drainer is None:
+            self._drainer = asyncio.create_task(self._drain())
+        return await future
+
+    async def _drain(self) -> None:
+        """Run queued queries in batches until none are left."""
+        try:
+            if self.window_seconds:
+                await asyncio.sleep(self.window_seconds)
+            while self._pending:
+                # The oldest query's arguments pick the batch; others wait for the next one
+                args = self._pending[0][2]
+                batch, rest = [], []
+                for entry in self._pending:
+                    same = len(batch) < self.max_batch and len(entry[2]) == len(args) and all(
+                        a is b for a, b in zip(entry[2], args)
+                    )
+                    (batch if same else rest).append(entry)
+                self._pending[:] = rest
+                k = max(k for _, k, _, _ in batch)
+                try:
+                    results = await asyncio.to_thread(self._search, np.stack([v for v, _, _, _ in batch]), k, *args)
+                except Exception as e:
+                    for _, _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.batches += 1
+                self.queries += len(batch)
+                for (_, query_k, _, future), hits in zip(batch, results):
+                    if not future.done():
+                        future.set_result(hits[:query_k])
+        finally:
+            self._drainer = None
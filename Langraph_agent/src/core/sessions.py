@@ -0,0 +1,123 @@
+import asyncio
+import time
+import weakref
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config.settings import get_settings
+from .ranking import estimate_tokens
+
+settings = get_settings()
+
+Turn = Dict[str, str]  # {"question": ..., "answer": ...}
+
+
+def history_tokens(turns: List[Turn]) -> int:
+    """Approximate prompt tokens taken by conversation turns."""
+    return sum(estimate_tokens(turn["question"]) + estimate_tokens(turn["answer"]) for turn in turns)
+
+
+def split_history(turns: List[Turn], budget: int) -> Tuple[List[Turn], List[Turn]]:
+    """Split turns into (oldest, to summarize; newest, kept verbatim within `budget` tokens).
+
+    The newest turn is always kept, even when it alone exceeds the budget.
+    """
+    kept = list(turns)
+    folded: List[Turn] = []
+    while len(kept) > 1 and history_tokens(kept) > budget:
+        folded.append(kept.pop(0))
+    return folded, kept
+
+
+class SessionStore:
+    """SQLite-backed LangGraph checkpointer holding the state of conversation sessions.
+
+    One database per collection keeps sessions next to the documents they
+    discuss. The connection is opened on the first session request, on the
+    serving event loop. Only each session's latest checkpoint is kept, and
+    sessions idle for longer than SESSION_TTL_HOURS are deleted.
+    """
+
+    DB_FILE = "sessions.sqlite"
+
+    def __init__(self, storage_dir: Optional[Path] = None):
+        self.path = str(storage_dir / self.DB_FILE) if storage_dir is not None else ":memory:"
+        self.saver: Any = None
+        self._conn: Any = None
+        self._opening: Optional[asyncio.Lock] = None
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._next_expiry = 0.0
+
+    async def open(self) -> Any:
+        """Return the checkpointer, connecting on first use."""
+        if self.saver is None:
+            if self._opening is None:
+                self._opening = asyncio.Lock()
+            async with self._opening:
+                if self.saver is None:
+                    import aiosqlite
+                    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+                    conn = await aiosqlite.connect(self.path)
+                    await conn.execute("PRAGMA journal_mode=WAL")
+                    await conn.execute(
+                        "CREATE TABLE IF NOT EXISTS session_activity (thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+                    )
+                    saver = AsyncSqliteSaver(conn)
+                    await saver.setup()
+                    self._conn, self.saver = conn, saver
+        return self.saver
+
+    def lock(self, session_id: str) -> asyncio.Lock:
+        """Lock serializing the turns of one session, so concurrent turns do not drop each other's history."""
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        return lock
+
+    async def prune(self, session_id: str) -> None:
+        """Drop a session's superseded checkpoints and, at most once a minute, expired sessions."""
+        conn = self._conn
+        latest = await (await conn.execute(
+            "SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ''", (session_id,)
+        )).fetchone()
+        if latest and latest[0]:
+            for table in ("checkpoints", "writes"):
+                await conn.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_id < ?", (session_id, latest[0])
+                )
+        now = time.time()
+        await conn.execute(
+            "INSERT INTO session_activity (thread_id, updated_at) VALUES (?, ?) "
+            "ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+            (session_id, now)
+        )
+        if now >= self._next_expiry:
+            self._next_expiry = now + 60
+            expired = await (await conn.execute(
+                "SELECT thread_id FROM session_activity WHERE updated_at < ?",
+                (now - settings.SESSION_TTL_HOURS * 3600,)
+            )).fetchall()
+            for (thread_id,) in expired:
+                await self._delete(thread_id)
+        await conn.commit()
+
+    async def delete(self, session_id: str) -> bool:
+        """Forget a session; returns whether it existed."""
+        await self.open()
+        row = await (await self._conn.execute(
+            "SELECT 1 FROM checkpoints WHERE thread_id = ? LIMIT 1", (session_id,)
+        )).fetchone()
+        await self._delete(session_id)
+        await self._conn.commit()
+        return row is not None
+
+    async def _delete(self, session_id: str) -> None:
+        await self.saver.adelete_thread(session_id)
+        await self._conn.execute("DELETE FROM session_activity WHERE thread_id = ?", (session_id,))
+
+    def close(self) -> None:
+        """Close the database connection."""
+        if self._conn is not None:
+            self._conn.stop()
+            self._conn, self.saver = None, None
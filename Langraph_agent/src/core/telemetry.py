@@ -0,0 +1,100 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, List
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from ..config.settings import get_settings
+
+try:
+    from opentelemetry import trace
+except ImportError:  # OpenTelemetry is optional
+    trace = None
+
+settings = get_settings()
+
+# Millisecond-scale searches up to multi-second LLM calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds", "Time spent in each workflow node", ["stage"], buckets=LATENCY_BUCKETS
+)
+STAGE_ERRORS = Counter("rag_stage_errors_total", "Workflow node failures", ["stage"])
+MODEL_CALL_SECONDS = Histogram(
+    "rag_model_call_duration_seconds", "Latency of embedding and LLM calls", ["call"], buckets=LATENCY_BUCKETS
+)
+MODEL_RETRIES = Counter("rag_model_retries_total", "Model calls retried after a transient failure", ["model", "reason"])
+MODEL_HEDGES = Counter("rag_model_hedged_requests_total", "Duplicate requests sent for slow model calls", ["model"])
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "rag_model_rate_limit_wait_seconds", "Time model calls queued for rate limit budget", ["model"],
+    buckets=LATENCY_BUCKETS
+)
+DUPLICATES = Counter("rag_ingest_duplicates_total", "Uploads and chunks found to duplicate stored content", ["kind"])
+QUERY_ROUTES = Counter("rag_query_routes_total", "Questions by workflow route", ["route"])
+LLM_TOKENS = Counter("rag_llm_tokens_total", "Tokens sent to and generated by the LLM", ["kind"])
+SEARCH_SECONDS = Histogram(
+    "rag_index_search_duration_seconds", "Index search time", ["index"], buckets=LATENCY_BUCKETS
+)
+INDEX_CHUNKS = Gauge("rag_index_chunks", "Live chunks in each loaded collection's index", ["collection"])
+INDEX_GENERATION = Gauge("rag_index_generation", "Snapshot generation served for each loaded collection", ["collection"])
+QUERY_EMBED_BATCH_SIZE = Gauge("rag_query_embedding_batch_size", "Mean questions per batched embedding call")
+QUERY_EMBED_WAIT_SECONDS = Gauge("rag_query_embedding_wait_seconds", "Mean time questions waited for their embedding batch")
+
+_tracer = trace.get_tracer(__name__) if trace is not None and settings.OTEL_ENABLED else None
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a workflow node, count its failures and, with OTEL_ENABLED, wrap it in a span."""
+    start = time.perf_counter()
+    try:
+        if _tracer is not None:
+            with _tracer.start_as_current_span(f"rag.{name}"):
+                yield
+        else:
+            yield
+    except Exception:
+        STAGE_ERRORS.labels(name).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def timed(histogram: Histogram, label: str) -> Iterator[None]:
+    """Observe the duration of a block in a labelled histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(label).observe(time.perf_counter() - start)
+
+
+def record_llm_tokens(prompt_tokens: int, completion_tokens: int) -> None:
+    """Count the tokens of one LLM call."""
+    LLM_TOKENS.labels("prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels("completion").inc(completion_tokens)
+
+
+class TimedEmbeddings:
+    """Wraps an embeddings client to record the latency of every model call."""
+
+    def __init__(self, embeddings: Any):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+
+    def embed_documents(self, texts: List[str], **options: Any) -> List[Any]:
+        with timed(MODEL_CALL_SECONDS, "embed_documents"):
+            return self.embeddings.embed_documents(texts, **options)
+
+    def embed_query(self, text: str, **options: Any) -> Any:
+        with timed(MODEL_CALL_SECONDS, "embed_query"):
+            return self.embeddings.embed_query(text, **options)
+
+    async def aembed_documents(self, texts: List[str], **options: Any) -> List[Any]:
+        with timed(MODEL_CALL_SECONDS, "embed_documents"):
+            return await self.embeddings.aembed_documents(texts, **options)
+
+    async def aembed_query(self, text: str, **options: Any) -> Any:
+        with timed(MODEL_CALL_SECONDS, "embed_query"):
+            return await self.embeddings.aembed_query(text, **options)
@@ -1,45 +1,588 @@
-import faiss
+import fcntl
+import json
+import os
+import re
+import shutil
+import threading
+import time
 import numpy as np
-from typing import List, Dict
-from langchain_google_genai import GoogleGenerativeAI
-from langchain.embeddings import GooglePalmEmbeddings
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, List, Dict, NamedTuple, Optional, Sequence, Tuple
 from ..config.settings import get_settings
+from .chunking import iter_batches
+from .docstore import DocStore, Record
+from .index_backends import FaissBackend, SegmentedIndex, create_backend, create_delta, read_backend
+from .bm25 import BM25Index
+from .telemetry import SEARCH_SECONDS, timed
 
 settings = get_settings()
 
+# Generation-numbered snapshot files: base index-<n>.faiss, delta segments delta-<n>.faiss and lexical-<n>
+SNAPSHOT_FILE_PATTERN = re.compile(r"^(?:index|delta|lexical)-(\d+)(?:\.faiss|\.npz)?$")
+
+
+class Snapshot(NamedTuple):
+    """The index, lexical index and docstore of one generation, which a query reads together."""
+    index: Any
+    lexical: BM25Index
+    documents: DocStore
+
+
 class VectorStore:
-    def __init__(self):
-        self.embeddings = GooglePalmEmbeddings(google_api_key=settings.GOOGLE_API_KEY)
-        self.documents = []
-        self.index = None
+    """Chunk vectors, their BM25 index and texts, persisted as numbered snapshot generations.
+
+    Several processes (uvicorn workers) can share one `storage_dir`. Each
+    memory-maps the committed generation read-only. Changes go through
+    `transaction`, which holds an exclusive lock file and appends them:
+    chunks to the docstore files, their vectors as a small flat delta
+    segment beside the base index, and tombstones for deleted chunks. The
+    manifest, replaced last, publishes the next generation. Once the deltas
+    outgrow INDEX_DELTA_MAX_FRACTION of the base, or deleted chunks still in
+    the index INDEX_COMPACT_DELETED_FRACTION of all chunks, a write compacts
+    everything into a new base and lexical index. Readers notice the new
+    manifest and load only what changed. A query takes one `snapshot` and
+    passes it to every search method, so a swap between its stages never
+    mixes two generations.
+    """
+
+    MANIFEST_FILE = "manifest.json"
+    LOCK_FILE = "writer.lock"
+
+    def __init__(
+        self,
+        embeddings: Optional[Any] = None,
+        storage_dir: Optional[str] = None,
+        mmap: Optional[bool] = None
+    ):
+        """Initialize the store, restoring the last snapshot from `storage_dir` if present.
+
+        `embeddings` defaults to the process-wide client from `get_embeddings`. `mmap` defaults to INDEX_MMAP. A store with a `storage_dir` is changed
+        only within `transaction`.
+        """
+        if embeddings is None:
+            # Imported here: the retrieval agent imports this module
+            from ..agents.retrieval import get_embeddings
+            embeddings = get_embeddings()
+        self.embeddings = embeddings
+        # Lossy indexes are re-scored with full-precision vectors kept next to the chunk texts
+        self.keep_vectors = settings.INDEX_RESCORE_FACTOR > 0 and (
+            settings.INDEX_ENCODING != "float32" or settings.INDEX_TYPE == "ivf_pq"
+        )
+        # Lexical index over the same chunk ids as the vector index; swapped as one with the others
+        self._snapshot = Snapshot(None, BM25Index(settings.BM25_K1, settings.BM25_B), DocStore(self.keep_vectors))
+        self._dirty = False
+        self.mmap = settings.INDEX_MMAP if mmap is None else mmap
+        self.generation: Optional[int] = None  # Committed generation being served
+        # Files the served generation was loaded from, reused by the next load if unchanged
+        self._base: Any = None
+        self._base_file: Optional[str] = None
+        self._deltas: Dict[str, FaissBackend] = {}
+        self._lexical_file: Optional[str] = None
+        # Set on the store a transaction yields: chunks are appended on `save` without loading the index
+        self._writing = False
+        self._added: List[Tuple[np.ndarray, np.ndarray]] = []  # (ids, vectors) to append
+        self._manifest_stat = None
+        self._next_check = 0.0
+        self._swap_lock = threading.Lock()
+        self.storage_dir = Path(storage_dir) if storage_dir else None
+        if self.storage_dir:
+            self.load()
+
+    def __len__(self) -> int:
+        return self.documents.live_count
+
+    def snapshot(self) -> Snapshot:
+        """The generation being served, to read consistently across several calls."""
+        return self._snapshot
+
+    @property
+    def index(self) -> Any:
+        return self._snapshot.index
+
+    @index.setter
+    def index(self, index: Any) -> None:
+        self._snapshot = self._snapshot._replace(index=index)
+
+    @property
+    def lexical(self) -> BM25Index:
+        return self._snapshot.lexical
+
+    @lexical.setter
+    def lexical(self, lexical: BM25Index) -> None:
+        self._snapshot = self._snapshot._replace(lexical=lexical)
+
+    @property
+    def documents(self) -> DocStore:
+        return self._snapshot.documents
+
+    @documents.setter
+    def documents(self, documents: DocStore) -> None:
+        self._snapshot = self._snapshot._replace(documents=documents)
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size of the index, lexical index and docstore."""
+        index_bytes = self.index.memory_bytes() if self.index is not None else 0
+        return index_bytes + self.lexical.memory_bytes() + self.documents.memory_bytes()
 
-    def add_documents(self, texts: List[str]):
+    def add_vectors(self, vectors: np.ndarray, records: Sequence[Record]) -> List[int]:
+        """Add pre-computed embeddings and their chunk records, returning the new chunk ids."""
+        if len(vectors) != len(records):
+            raise ValueError("Number of vectors and records must match")
+        self._check_writable()
+
+        # Chunk ids are docstore row numbers
+        ids = np.arange(len(self.documents), len(self.documents) + len(records), dtype=np.int64)
+        # A no-op for the float32 matrices the ingestion path builds
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self._writing:
+            if self.keep_vectors and not self.documents.has_vectors:
+                index = self._read_index(self._layout(self._read_manifest() or {}))[0]
+                if index is not None and index.exact:
+                    self._backfill_vectors(index)
+            self._added.append((ids, vectors))
+        else:
+            # Initialize FAISS index if needed
+            if self.index is None:
+                self.index = create_backend(settings.INDEX_TYPE, vectors.shape[1], settings)
+            if self.keep_vectors and not self.documents.has_vectors and self.index.exact:
+                self._backfill_vectors(self.index)
+
+            # Add to FAISS index
+            self.index.add(vectors, ids)
+            self.lexical.add(ids.tolist(), [text for text, _, _, _ in records])
+        self.documents.extend(records, vectors)
+        self._dirty = True
+        return ids.tolist()
+
+    def _backfill_vectors(self, index: Any) -> None:
+        """Copy the vectors of a store saved without them from its (still exact) index, enabling re-scoring."""
+        documents = self.documents
+        rows = np.asarray([i for i in range(len(documents)) if i not in documents.deleted], dtype=np.int64)
+        vectors = np.zeros((len(documents), index.dimension), dtype=np.float32)
+        if len(rows):
+            vectors[rows] = index.reconstruct(rows)
+        documents.backfill_vectors(vectors)
+
+    def remove(self, ids: Sequence[int]) -> None:
+        """Remove chunks from the index and tombstone them in the docstore.
+
+        A persisted store only records the tombstones; search filters the
+        chunks out until a compaction drops them from the index. In memory,
+        index types that cannot remove vectors (HNSW) keep them the same way.
+        """
+        self._check_writable()
+        if not len(self.documents) or not ids:
+            return
+        if not self._writing:
+            self.index.remove(np.asarray(ids, dtype=np.int64))
+            self.lexical.remove(ids)
+        self.documents.delete(ids)
+        self._dirty = True
+
+    def _check_writable(self) -> None:
+        if self.storage_dir is not None and not self._writing:
+            raise RuntimeError("Change a persisted vector store within transaction()")
+
+    def add_documents(self, texts: List[str], source: str = ""):
         """Add documents to the vector store."""
         if not texts:
             return
 
-        # Get embeddings for documents
-        embeddings = self.embeddings.embed_documents(texts)
-        
-        # Initialize FAISS index if needed
-        if self.index is None:
-            dimension = len(embeddings[0])
-            self.index = faiss.IndexFlatL2(dimension)
+        for batch in iter_batches(texts, settings.EMBEDDING_BATCH_SIZE):
+            # Get embeddings for the batch
+            vectors = np.asarray(self.embeddings.embed_documents(batch), dtype=np.float32)
+            self.add_vectors(vectors, [(text, source, None, 0) for text in batch])
+
+    def search(
+        self,
+        query_vector: Sequence[float],
+        k: int = 1,
+        snapshot: Optional[Snapshot] = None
+    ) -> List[Tuple[int, float]]:
+        """Return (chunk id, distance) pairs for the nearest chunks."""
+        return self.search_batch(np.array([query_vector], dtype=np.float32), k, snapshot)[0]
 
-        # Add to FAISS index
-        self.index.add(np.array(embeddings))
-        self.documents.extend(texts)
+    def search_batch(
+        self,
+        query_vectors: np.ndarray,
+        k: int = 1,
+        snapshot: Optional[Snapshot] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """Search several queries in one index call, returning (chunk id, distance) pairs per query row."""
+        index, _, documents = snapshot or self._snapshot
+        if index is None or not documents.live_count:
+            return [[] for _ in query_vectors]
+
+        # Over-fetch for re-scoring, and when removed vectors may still be present in the index
+        deleted = documents.deleted
+        rescore = self._rescores(index, documents)
+        candidates = k * settings.INDEX_RESCORE_FACTOR if rescore else k
+        stale = bool(deleted) and not index.supports_remove
+        fetch = min(2 * candidates if stale else candidates, max(index.ntotal, 1))
+        query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+        results: List[List[Tuple[int, float]]] = [[] for _ in query_vectors]
+        rows = np.arange(len(query_vectors))
+        with timed(SEARCH_SECONDS, "vector"):
+            while True:
+                D, I = index.search(query_vectors[rows], fetch)
+                for row, ids, distances in zip(rows, I, D):
+                    results[row] = [
+                        (int(i), float(d)) for i, d in zip(ids, distances) if i >= 0 and i not in deleted
+                    ][:candidates]
+                # Rows that lost too many hits to deleted vectors search again, deeper; a page
+                # that was not full means the index has nothing more to return
+                short = [n for n, row in enumerate(rows) if len(results[row]) < candidates and I[n][-1] >= 0]
+                if not stale or not short or fetch >= index.ntotal:
+                    break
+                rows, fetch = rows[short], min(4 * fetch, index.ntotal)
+        if rescore:
+            results = [self._rescore(documents, query, hits, k) for query, hits in zip(query_vectors, results)]
+        return results
+
+    @staticmethod
+    def _rescores(index: Any, documents: DocStore) -> bool:
+        """Whether results of `index` are re-ranked by the full-precision vectors in `documents`."""
+        return settings.INDEX_RESCORE_FACTOR > 0 and not index.exact and documents.has_vectors
+
+    @staticmethod
+    def _rescore(
+        documents: DocStore,
+        query: np.ndarray,
+        hits: List[Tuple[int, float]],
+        k: int
+    ) -> List[Tuple[int, float]]:
+        """Re-rank approximate hits by exact squared L2 distance, keeping the best k."""
+        if not hits:
+            return hits
+        ids = [i for i, _ in hits]
+        distances = ((documents.vectors(ids) - query) ** 2).sum(axis=1)
+        order = np.argsort(distances, kind="stable")[:k]
+        return [(ids[n], float(distances[n])) for n in order]
+
+    def reconstruct(self, ids: Sequence[int], snapshot: Optional[Snapshot] = None) -> np.ndarray:
+        """Return the vectors of chunks, one row per id; full precision when the docstore keeps them."""
+        index, _, documents = snapshot or self._snapshot
+        if self._rescores(index, documents):
+            return documents.vectors(ids)
+        return index.reconstruct(np.asarray(ids, dtype=np.int64))
+
+    def lexical_search(self, query: str, k: int = 1, snapshot: Optional[Snapshot] = None) -> List[Tuple[int, float]]:
+        """Return (chunk id, BM25 score) pairs for the best keyword matches."""
+        _, lexical, documents = snapshot or self._snapshot
+        with timed(SEARCH_SECONDS, "lexical"):
+            # A reader extends its lexical index in place, so leave out chunks newer than the snapshot,
+            # and chunks it deleted that the index still holds
+            return lexical.search(query, k, end=len(documents), exclude=documents.deleted)
 
     def similarity_search(self, query: str, k: int = 1) -> List[str]:
         """Search for similar documents."""
-        if not self.index:
-            return []
-
         # Get query embedding
         query_embedding = self.embeddings.embed_query(query)
-        
-        # Search in FAISS
-        D, I = self.index.search(np.array([query_embedding]), k)
-        
+
         # Return found documents
-        return [self.documents[i] for i in I[0]]
\ No newline at end of file
+        snapshot = self._snapshot
+        return [snapshot.documents[i][0] for i, _ in self.search(query_embedding, k, snapshot)]
+
+    async def asimilarity_search(self, query: str, k: int = 1) -> List[str]:
+        """Search for similar documents; concurrent calls share one query embedding request."""
+        query_embedding = await self.embeddings.aembed_query(query)
+        snapshot = self._snapshot
+        return [snapshot.documents[i][0] for i, _ in self.search(query_embedding, k, snapshot)]
+
+    @contextmanager
+    def transaction(self) -> Iterator["VectorStore"]:
+        """Yield a writer appending to the latest generation and publish its changes on exit.
+
+        Writers in every process sharing `storage_dir` are serialized by an
+        exclusive lock on LOCK_FILE, and each starts from the newest committed
+        generation, so chunk ids never collide. Readers keep serving the
+        previous generation until the new manifest is in place. Without a
+        `storage_dir` the store itself is modified.
+        """
+        if self.storage_dir is None:
+            yield self
+            return
+
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.storage_dir / self.LOCK_FILE, "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                writer = self._writer()
+                yield writer
+                writer.save()
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+        self.refresh(force=True)
+
+    def _writer(self) -> "VectorStore":
+        """A store for appending to the newest committed generation; call holding the writer lock.
+
+        Only the docstore is loaded, reusing what this store already read.
+        """
+        writer = VectorStore(self.embeddings, mmap=self.mmap)
+        writer.storage_dir = self.storage_dir
+        writer._writing = True
+        manifest = self._read_manifest()
+        if manifest is not None:
+            writer.documents.load(self.storage_dir, manifest, previous=self.documents)
+            writer.generation = manifest.get("generation", 0)
+        return writer
+
+    def save(self) -> None:
+        """Publish a writer's changes to `storage_dir` as the next generation.
+
+        New vectors go to a delta segment, merged with the newest segments
+        while those are no larger, so a write costs about what it adds and
+        there are only logarithmically many segments. Once the deltas exceed
+        INDEX_DELTA_MAX_FRACTION of the base index, or deleted chunks still in
+        the index INDEX_COMPACT_DELETED_FRACTION of all chunks, everything is
+        compacted into a new base and lexical index instead. New files get
+        names unique to the generation and the manifest is replaced last, so
+        a crash mid-save leaves the previous snapshot intact. Files of the
+        previous generation are kept for processes still switching over;
+        older ones are deleted.
+        """
+        if self.storage_dir is None or not self._dirty:
+            return
+
+        previous = self._read_manifest() or {}
+        layout = self._layout(previous)
+        generation = max(previous.get("generation", 0), self.generation or 0) + 1
+
+        state = self.documents.save(self.storage_dir)
+        added = sum(len(ids) for ids, _ in self._added)
+        delta_vectors = sum(delta["vectors"] for delta in layout["deltas"]) + added
+        stale = state["deleted_count"] - layout["purged_deleted"]
+        if layout["index_file"] is None and not delta_vectors:
+            pass  # No vectors yet
+        elif (
+            layout["index_file"] is None
+            or delta_vectors > settings.INDEX_DELTA_MAX_FRACTION * layout["index_vectors"]
+            or stale > settings.INDEX_COMPACT_DELETED_FRACTION * state["count"]
+        ):
+            layout = self._compact(layout, generation)
+        elif added:
+            layout["deltas"] = self._append_delta(layout["deltas"], generation)
+
+        manifest = dict(state, generation=generation, **layout)
+        tmp_path = self.storage_dir / f"{self.MANIFEST_FILE}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.storage_dir / self.MANIFEST_FILE)
+        self._prune(keep=self._files(layout) | self._files(self._layout(previous)))
+
+        self.generation = generation
+        self._added = []
+        self._dirty = False
+
+    @staticmethod
+    def _layout(manifest: Dict[str, Any]) -> Dict[str, Any]:
+        """The index files of a manifest, with defaults for snapshots written before delta segments."""
+        count = manifest.get("count", 0)
+        return {
+            "index_file": manifest.get("index_file"),
+            "index_vectors": manifest.get("index_vectors", count),
+            "deltas": manifest.get("deltas", []),  # {"file", "vectors"}, oldest first
+            "lexical_file": manifest.get("lexical_file"),
+            "lexical_count": manifest.get("lexical_count", count if "lexical_file" in manifest else 0),
+            "purged_deleted": manifest.get("purged_deleted", 0),  # Tombstones no longer in the index
+        }
+
+    @staticmethod
+    def _files(layout: Dict[str, Any]) -> set:
+        return {layout["index_file"], layout["lexical_file"]} | {delta["file"] for delta in layout["deltas"]}
+
+    def _pending_vectors(self, deltas: List[Dict[str, Any]]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Ids and vectors of delta segments plus this writer's additions, without deleted chunks."""
+        ids, vectors = [], []
+        for delta in deltas:
+            segment = FaissBackend.read(str(self.storage_dir / delta["file"]), "flat", settings, mmap=False)
+            ids.append(segment.ids())
+            vectors.append(segment.reconstruct(ids[-1]))
+        ids += [added_ids for added_ids, _ in self._added]
+        vectors += [added for _, added in self._added]
+        if not ids:
+            return np.zeros(0, dtype=np.int64), None
+        ids, vectors = np.concatenate(ids), np.concatenate(vectors)
+        live = ~np.isin(ids, np.fromiter(self.documents.deleted, dtype=np.int64, count=len(self.documents.deleted)))
+        return ids[live], vectors[live]
+
+    def _append_delta(self, deltas: List[Dict[str, Any]], generation: int) -> List[Dict[str, Any]]:
+        """Write this writer's vectors as a delta segment, merged with newer segments no larger than it."""
+        deltas = list(deltas)
+        size, merged = sum(len(ids) for ids, _ in self._added), []
+        while deltas and deltas[-1]["vectors"] <= size:
+            merged.insert(0, deltas.pop())
+            size += merged[0]["vectors"]
+        ids, vectors = self._pending_vectors(merged)
+        if len(ids):
+            delta_file = f"delta-{generation}{FaissBackend.FILE_SUFFIX}"
+            create_delta(vectors, ids, settings).write(str(self.storage_dir / delta_file))
+            deltas.append({"file": delta_file, "vectors": len(ids)})
+        return deltas
+
+    def _compact(self, layout: Dict[str, Any], generation: int) -> Dict[str, Any]:
+        """Write a new base index and lexical index holding every live chunk, and no deltas."""
+        documents = self.documents
+        deleted = np.fromiter(documents.deleted, dtype=np.int64, count=len(documents.deleted))
+        ids, vectors = self._pending_vectors(layout["deltas"])
+        if layout["index_file"] is None:
+            index = create_backend(settings.INDEX_TYPE, vectors.shape[1], settings)
+        else:
+            index = read_backend(
+                str(self.storage_dir / layout["index_file"]), settings.INDEX_TYPE, settings, mmap=False
+            )
+        purged = len(deleted)
+        if index.supports_remove:
+            index.remove(deleted)
+        elif purged - layout["purged_deleted"] > settings.INDEX_COMPACT_DELETED_FRACTION * len(documents):
+            # HNSW cannot remove vectors: rebuild it from the live ones
+            live = index.ids()
+            live = live[~np.isin(live, deleted)]
+            live_vectors = documents.vectors(live) if documents.has_vectors else index.reconstruct(live)
+            index = create_backend(settings.INDEX_TYPE, index.dimension, settings)
+            index.add(np.ascontiguousarray(live_vectors, dtype=np.float32), live)
+        else:
+            purged = layout["purged_deleted"]  # The deleted vectors stay in the index
+        if len(ids):
+            index.add(vectors, ids)
+        index_file = f"index-{generation}{index.FILE_SUFFIX}"
+        index.write(str(self.storage_dir / index_file))
+
+        if layout["lexical_file"] is None:
+            lexical, start = BM25Index(settings.BM25_K1, settings.BM25_B), 0
+        else:
+            lexical = BM25Index.load(self.storage_dir / layout["lexical_file"], mmap=False)
+            start = layout["lexical_count"]
+        chunk_ids = range(start, len(documents))
+        lexical.add(chunk_ids, [documents[i][0] for i in chunk_ids])
+        lexical.remove(documents.deleted)
+        lexical_file = f"lexical-{generation}"
+        lexical.save(self.storage_dir / lexical_file)
+
+        return {
+            "index_file": index_file,
+            "index_vectors": index.ntotal,
+            "deltas": [],
+            "lexical_file": lexical_file,
+            "lexical_count": len(documents),
+            "purged_deleted": purged,
+        }
+
+    def _prune(self, keep: set) -> None:
+        """Delete snapshot files of generations that are no longer kept.
+
+        Processes that still map a deleted file keep reading it; only new
+        loads need the file, and they read the current manifest first.
+        """
+        for path in self.storage_dir.iterdir():
+            if SNAPSHOT_FILE_PATTERN.match(path.name) and path.name not in keep:
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    path.unlink(missing_ok=True)
+
+    def load(self) -> None:
+        """Restore the last committed snapshot, memory-mapping it where possible."""
+        with self._swap_lock:
+            self._load_latest()
+
+    def refresh(self, force: bool = False) -> bool:
+        """Hot-swap to a generation published by another writer, returning whether one was loaded.
+
+        The manifest is checked at most every INDEX_REFRESH_INTERVAL_SECONDS
+        unless `force` is set. Queries already running finish on the
+        generation they started with.
+        """
+        if self.storage_dir is None or (not force and time.monotonic() < self._next_check):
+            return False
+        with self._swap_lock:
+            self._next_check = time.monotonic() + settings.INDEX_REFRESH_INTERVAL_SECONDS
+            if self._stat_manifest() == self._manifest_stat:
+                return False
+            return self._load_latest()
+
+    def _load_latest(self) -> bool:
+        """Load the newest committed generation if it differs from the one being served."""
+        for attempt in range(3):
+            stat = self._stat_manifest()
+            manifest = self._read_manifest()
+            if manifest is None or manifest.get("generation", 0) == self.generation:
+                # Nothing committed yet, or already serving this generation
+                self._manifest_stat = stat
+                return False
+            try:
+                self._snapshot = self._read_snapshot(manifest)
+            except FileNotFoundError:
+                # A writer published two generations meanwhile and pruned this one
+                if attempt == 2:
+                    raise
+                continue
+            self.generation = manifest.get("generation", 0)
+            self._manifest_stat = stat
+            return True
+
+    def _read_index(self, layout: Dict[str, Any]) -> Tuple[Any, Any, Dict[str, FaissBackend]]:
+        """Open a generation's base index and delta segments, reusing those already loaded.
+
+        Returns the combined index (None before the first vectors), the base and the deltas by file.
+        """
+        if layout["index_file"] is None:
+            return None, None, {}
+        base = self._base
+        if layout["index_file"] != self._base_file:
+            base = read_backend(
+                str(self.storage_dir / layout["index_file"]), settings.INDEX_TYPE, settings, mmap=self.mmap
+            )
+        deltas = {
+            delta["file"]: self._deltas.get(delta["file"]) or FaissBackend.read(
+                str(self.storage_dir / delta["file"]), "flat", settings, mmap=self.mmap
+            )
+            for delta in layout["deltas"]
+        }
+        return SegmentedIndex(base, list(deltas.values())), base, deltas
+
+    def _read_snapshot(self, manifest: Dict[str, Any]) -> Snapshot:
+        """Load a committed generation, reading only the files and appended data that are new."""
+        layout = self._layout(manifest)
+        current = self._snapshot
+        documents = DocStore(self.keep_vectors)
+        documents.load(self.storage_dir, manifest, previous=current.documents)
+        index, base, deltas = self._read_index(layout)
+
+        if layout["lexical_file"] == self._lexical_file:
+            # Extend the lexical index being served; its older snapshots leave out the new chunks. Deletes
+            # are not applied to it, as queries on those snapshots still see them: each query leaves out
+            # its own snapshot's deleted chunks instead
+            lexical, start, removed = current.lexical, len(current.documents), set()
+        else:
+            # Not yet shared with any snapshot, and every later one deletes these too
+            lexical = BM25Index.load(self.storage_dir / layout["lexical_file"], mmap=self.mmap)
+            start, removed = layout["lexical_count"], documents.deleted
+        # Changed last, once every file has been read
+        chunk_ids = range(start, len(documents))
+        lexical.add(chunk_ids, [documents[i][0] for i in chunk_ids])
+        lexical.remove(removed)
+
+        self._base, self._base_file, self._deltas = base, layout["index_file"], deltas
+        self._lexical_file = layout["lexical_file"]
+        return Snapshot(index, lexical, documents)
+
+    def _stat_manifest(self) -> Optional[Tuple[int, int]]:
+        """Identify the current manifest file; replacing it changes the inode."""
+        try:
+            stat = os.stat(self.storage_dir / self.MANIFEST_FILE)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        """Read the snapshot manifest, if one has been committed."""
+        path = self.storage_dir / self.MANIFEST_FILE
+        if not path.exists():
+            return None
+        with open(path) as f:
+            return json.load(f)
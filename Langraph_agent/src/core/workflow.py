@@ -1,57 +1,328 @@
-from typing import Dict, Any
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, Callable, List, Optional, Sequence, Tuple
 from langgraph.graph import StateGraph
+from langchain_core.runnables import RunnableLambda
 from ..models.schema import WorkflowState
 from ..agents.retrieval import RetrievalAgent
 from ..agents.reasoning import ReasoningAgent
 from ..agents.formatter import FormatterAgent
+from ..config.settings import get_settings
+from .answer_cache import SemanticAnswerCache
+from .dedup import Duplicate
+from .document_manager import DocumentManager
+from .routing import NO_DOCUMENTS_ANSWER, classify_query
+from .sessions import SessionStore, split_history
+from .telemetry import QUERY_ROUTES, stage
+
+settings = get_settings()
 
 class ConversationalWorkflow:
-    def __init__(self):
-        """Initialize the workflow with all required agents."""
-        self.retrieval_agent = RetrievalAgent()
-        self.reasoning_agent = ReasoningAgent()
+    def __init__(
+        self,
+        document_manager: Optional[DocumentManager] = None,
+        embeddings: Optional[Any] = None,
+        llm: Optional[Any] = None,
+        simple_llm: Optional[Any] = None
+    ):
+        """Initialize the workflow with all required agents.
+
+        With a document manager, the vector index lives in its storage
+        directory and is kept in sync with its documents. `embeddings`, `llm`
+        and `simple_llm` override the models MODEL_PROVIDER and SIMPLE_MODEL select.
+        """
+        self.retrieval_agent = RetrievalAgent(document_manager.vectors_dir if document_manager else None, embeddings)
+        self.reasoning_agent = ReasoningAgent(llm, simple_llm)
         self.formatter_agent = FormatterAgent()
+        self.answer_cache = SemanticAnswerCache(
+            max_entries=settings.ANSWER_CACHE_SIZE,
+            ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+            similarity_threshold=settings.ANSWER_CACHE_SIMILARITY
+        ) if settings.ANSWER_CACHE_ENABLED else None
+        self.sessions = SessionStore(document_manager.storage_dir if document_manager else None)
+        if document_manager is not None:
+            document_manager.set_vector_index(self)
+            document_manager.add_listener(self._on_corpus_change)
         self.workflow = self._create_workflow()
+        self._session_workflow = None
+
+    def _create_workflow(self, checkpointer: Optional[Any] = None) -> StateGraph:
+        """Create the workflow graph.
 
-    def _create_workflow(self) -> StateGraph:
-        """Create the workflow graph."""
+        With a checkpointer, the graph serves conversation sessions: a final
+        `remember` node records the turn, and the state is saved per session.
+        """
         workflow = StateGraph(WorkflowState)
         
-        workflow.add_node("retrieve", lambda x: self.retrieval_agent(x))
-        workflow.add_node("reason", lambda x: self.reasoning_agent(x))
-        workflow.add_node("format", lambda x: self.formatter_agent(x))
+        # Each node runs the agent's sync path under invoke and its async path under ainvoke
+        workflow.add_node("retrieve", RunnableLambda(self.retrieval_agent, afunc=self.retrieval_agent.ainvoke))
+        workflow.add_node("reason", RunnableLambda(self.reasoning_agent, afunc=self.reasoning_agent.ainvoke))
+        workflow.add_node("format", RunnableLambda(self.formatter_agent, afunc=self.formatter_agent.ainvoke))
         
-        workflow.add_edge("retrieve", "reason")
+        workflow.add_node("route", self._route_query)
+        workflow.add_node("check_cache", self._check_cache)
+
+        # Small talk and empty collections need no retrieval, and canned answers no LLM
+        workflow.add_conditional_edges(
+            "route",
+            self._route_after_classify,
+            {"answered": "format", "generate": "reason", "retrieve": "retrieve"}
+        )
+        # Skip the LLM when a cached answer covers this query and chunk set
+        workflow.add_edge("retrieve", "check_cache")
+        workflow.add_conditional_edges(
+            "check_cache",
+            self._route_after_cache,
+            {"hit": "format", "miss": "reason"}
+        )
         workflow.add_edge("reason", "format")
         
-        workflow.set_entry_point("retrieve")
-        workflow.set_finish_point("format")
-        
-        return workflow.compile()
+        workflow.set_entry_point("route")
+        if checkpointer is None:
+            workflow.set_finish_point("format")
+            return workflow.compile()
 
-    async def add_document(self, content: str, filename: str) -> None:
-        """Add a document to the retrieval agent's vector store."""
-        await self.retrieval_agent.add_document(content, filename)
+        workflow.add_node("remember", self._remember_turn)
+        workflow.add_edge("format", "remember")
+        workflow.set_finish_point("remember")
+        return workflow.compile(checkpointer=checkpointer)
 
-    def execute(self, query: str) -> Dict[str, Any]:
-        """Execute the conversation workflow."""
-        try:
-            initial_state: WorkflowState = {
-                "query": query,
-                "retrieved_docs": None,
-                "source_names": None,
-                "reasoning_output": None,
-                "response": None,
-                "metadata": None
-            }
+    async def _remember_turn(self, state: WorkflowState) -> Dict[str, Any]:
+        """Append the turn to the session history, folding the oldest turns into the summary
+        once the history exceeds SESSION_HISTORY_TOKENS."""
+        turn = {"question": state["query"], "answer": state["reasoning_output"] or ""}
+        folded, history = split_history((state.get("history") or []) + [turn], settings.SESSION_HISTORY_TOKENS)
+        summary = state.get("summary")
+        if folded:
+            with stage("summarize"):
+                summary = await self.reasoning_agent.asummarize(summary, folded)
+
+        # Reused chunks stay anchored to the question they were retrieved for; small talk keeps them too
+        keep = (state["metadata"] or {}).get("context_reused") or state.get("route") == "small_talk"
+        return {
+            "history": history,
+            "summary": summary,
+            "previous_query_embedding": state.get("previous_query_embedding") if keep else state["query_embedding"],
+            "previous_ids": state.get("previous_ids") if state.get("route") == "small_talk" else state["retrieved_ids"],
+            "retrieved_docs": None  # Not needed by later turns; keeps the checkpoint small
+        }
+
+    async def _session_graph(self) -> Any:
+        """The checkpointed graph for session requests, built on first use."""
+        if self._session_workflow is None:
+            checkpointer = await self.sessions.open()
+            if self._session_workflow is None:
+                self._session_workflow = self._create_workflow(checkpointer)
+        return self._session_workflow
+
+    @asynccontextmanager
+    async def _graph(self, session_id: Optional[str]) -> AsyncIterator[Tuple[Any, Dict[str, Any]]]:
+        """The graph to run a request on and its run options; a session's turns run one at a time."""
+        if session_id is None:
+            yield self.workflow, {}
+            return
+        graph = await self._session_graph()
+        async with self.sessions.lock(session_id):
+            # Only the final state is checkpointed, not every node's
+            yield graph, {"config": {"configurable": {"thread_id": session_id}}, "durability": "exit"}
+            await self.sessions.prune(session_id)
+
+    async def delete_session(self, session_id: str) -> bool:
+        """Forget a conversation session; returns whether it existed."""
+        return await self.sessions.delete(session_id)
+
+    def close(self) -> None:
+        """Close the session store."""
+        self.sessions.close()
+
+    def _route_query(self, state: WorkflowState) -> Dict[str, Any]:
+        """Classify the question locally and answer what needs neither retrieval nor the LLM.
+
+        Small talk gets a canned answer. With nothing indexed, retrieval is
+        skipped and, outside a conversation, so is the LLM. Short factual
+        questions outside a conversation are marked "simple" for SIMPLE_MODEL.
+        """
+        if not settings.QUERY_ROUTING_ENABLED:
+            return {"route": "full"}
+        with stage("route"):
+            conversational = bool(state.get("history") or state.get("summary"))
+            route = classify_query(state["query"], settings.SIMPLE_QUERY_MAX_WORDS)
+            update: Dict[str, Any] = {"route": route.kind}
+            if route.answer is None:
+                vector_store = self.retrieval_agent.vector_store
+                vector_store.refresh()
+                if not len(vector_store):
+                    update["route"] = "no_documents"
+                elif route.kind == "simple" and conversational:
+                    # A short follow-up may lean on the conversation, which the simple prompt leaves out
+                    update["route"] = "full"
+            if route.answer is not None or update["route"] == "no_documents":
+                update.update(retrieved_docs=[], source_names=[], retrieved_ids=[])
+                if route.answer is not None or not conversational:
+                    update["reasoning_output"] = route.answer or NO_DOCUMENTS_ANSWER
+        QUERY_ROUTES.labels(update["route"]).inc()
+        return update
+
+    def _route_after_classify(self, state: WorkflowState) -> str:
+        """Choose the next node after the route node."""
+        if state["reasoning_output"] is not None:
+            return "answered"
+        return "generate" if state.get("route") == "no_documents" else "retrieve"
+
+    def _check_cache(self, state: WorkflowState) -> WorkflowState:
+        """Fill the reasoning output from the answer cache when possible."""
+        if self.answer_cache is None:
+            return state
+        if state.get("history") or state.get("summary"):
+            # Answers to a follow-up depend on the conversation, not just the question
+            state["metadata"] = {**(state["metadata"] or {}), "conversational": True}
+            return state
+
+        with stage("check_cache"):
+            answer = self.answer_cache.lookup(
+                state["query"], state.get("query_embedding"), state["retrieved_ids"] or [], state.get("user")
+            )
+        if answer is not None:
+            state["reasoning_output"] = answer
+            state["metadata"] = {**(state["metadata"] or {}), "cache_hit": True}
+        return state
 
-            final_state = self.workflow.invoke(initial_state)
+    def _route_after_cache(self, state: WorkflowState) -> str:
+        """Choose the next node after the cache check."""
+        return "hit" if (state["metadata"] or {}).get("cache_hit") else "miss"
 
-            return {
-                "response": {
-                    "answer": final_state["response"],
-                    "sources": final_state["source_names"]
-                }
+    def _remember_answer(self, final_state: WorkflowState) -> None:
+        """Cache a freshly generated answer."""
+        metadata = final_state["metadata"] or {}
+        if self.answer_cache is None or metadata.get("cache_hit") or metadata.get("conversational"):
+            return
+        if final_state["reasoning_output"]:
+            self.answer_cache.store(
+                final_state["query"],
+                final_state.get("query_embedding"),
+                final_state["retrieved_ids"] or [],
+                final_state["reasoning_output"],
+                final_state.get("user")
+            )
+
+    def _on_corpus_change(self, action: str, document_id: str) -> None:
+        """Invalidate cached answers when documents are added or removed."""
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate()
+
+    async def add_document(
+        self,
+        content: str,
+        filename: str,
+        page_offsets: Optional[List[int]] = None
+    ) -> List[int]:
+        """Add a document to the retrieval agent's vector store, returning its chunk ids."""
+        added = await self.retrieval_agent.add_document(content, filename, page_offsets)
+        self._on_corpus_change("add", filename)
+        return added
+
+    async def add_documents(
+        self,
+        documents: Sequence[Tuple[str, str, Optional[List[int]]]],
+        progress: Optional[Callable[[int, int], None]] = None,
+        deduplicate: Optional[Callable[[List[str]], List[Optional[Duplicate]]]] = None
+    ) -> List[List[int]]:
+        """Add several (content, filename, page_offsets) documents in one bulk index update."""
+        chunk_ids = await self.retrieval_agent.add_documents(documents, progress, deduplicate)
+        self._on_corpus_change("add", ",".join(filename for _, filename, _ in documents))
+        return chunk_ids
+
+    async def remove_chunks(self, chunk_ids: Sequence[int]) -> None:
+        """Remove chunks from the retrieval agent's vector store."""
+        await self.retrieval_agent.remove_chunks(chunk_ids)
+        self._on_corpus_change("delete", "")
+
+    def _initial_state(
+        self,
+        query: str,
+        mode: Optional[str] = None,
+        top_k: Optional[int] = None,
+        score_threshold: Optional[float] = None,
+        user: Optional[str] = None,
+        session_id: Optional[str] = None
+    ) -> WorkflowState:
+        """Build the starting state for a query; unset retrieval options fall back to settings.
+
+        Session history is not part of it, so a session's saved history carries over.
+        """
+        return {
+            "query": query,
+            "user": user,
+            "session_id": session_id,
+            "retrieval_mode": mode,
+            "top_k": top_k,
+            "score_threshold": score_threshold,
+            "retrieved_docs": None,
+            "source_names": None,
+            "retrieved_ids": None,
+            "query_embedding": None,
+            "reasoning_output": None,
+            "response": None,
+            "metadata": None,
+            "route": None
+        }
+
+    def _build_response(self, final_state: WorkflowState) -> Dict[str, Any]:
+        """Shape the final state into the API response payload."""
+        return {
+            "response": {
+                "answer": final_state["response"],
+                "sources": final_state["source_names"]
             }
+        }
+
+    def execute(self, query: str, **options: Any) -> Dict[str, Any]:
+        """Execute the conversation workflow; `options` are the keyword arguments of `_initial_state`."""
+        if options.get("session_id") is not None:
+            raise ValueError("Conversation sessions are only supported by aexecute and astream")
+        try:
+            final_state = self.workflow.invoke(self._initial_state(query, **options))
+            self._remember_answer(final_state)
+            return self._build_response(final_state)
+        except Exception as e:
+            raise Exception(f"Workflow execution failed: {str(e)}")
+
+    async def aexecute(self, query: str, **options: Any) -> Dict[str, Any]:
+        """Execute the conversation workflow without blocking the event loop."""
+        try:
+            async with self._graph(options.get("session_id")) as (graph, run):
+                final_state = await graph.ainvoke(self._initial_state(query, **options), **run)
+            self._remember_answer(final_state)
+            return self._build_response(final_state)
+        except Exception as e:
+            raise Exception(f"Workflow execution failed: {str(e)}")
+
+    async def astream(self, query: str, **options: Any) -> AsyncIterator[Tuple[str, Any]]:
+        """Run the workflow, yielding ("sources", ...), ("token", ...) and ("answer", ...) events.
+
+        Sources are emitted as soon as retrieval finishes, then the reasoning
+        LLM's tokens as they are generated, then the formatted final answer.
+        Answers served from the answer cache or routed to a canned answer
+        produce no token events.
+        """
+        try:
+            async with self._graph(options.get("session_id")) as (graph, run):
+                async for event in graph.astream_events(self._initial_state(query, **options), version="v2", **run):
+                    node = event.get("metadata", {}).get("langgraph_node")
+                    kind = event["event"]
+
+                    if kind == "on_chain_end" and event["name"] == "retrieve" and node == "retrieve":
+                        yield "sources", event["data"]["output"]["source_names"]
+                    elif kind == "on_chain_end" and event["name"] == "route" and node == "route":
+                        # Questions that skip retrieval have no sources
+                        if event["data"]["output"].get("source_names") is not None:
+                            yield "sources", event["data"]["output"]["source_names"]
+                    elif kind == "on_chat_model_stream" and node == "reason":
+                        token = event["data"]["chunk"].content
+                        if token:
+                            yield "token", token
+                    elif kind == "on_chain_end" and event["name"] == "format" and node == "format":
+                        final_state = event["data"]["output"]
+                        self._remember_answer(final_state)
+                        yield "answer", self._build_response(final_state)["response"]
         except Exception as e:
-            raise Exception(f"Workflow execution failed: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Workflow execution failed: {str(e)}")
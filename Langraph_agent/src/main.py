@@ -1,12 +1,81 @@
+import time
+
+IMPORT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI, HTTPException, Request, status
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.docs import get_swagger_ui_html
 from .config.settings import get_settings
-from .api.routes import router
+from .api.routes import router, update_index_metrics
+from .core.collection_registry import DEFAULT_COLLECTION, CollectionRegistry
+from .core.extraction import get_extraction_pool
+from .core.jobs import IngestionQueue
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, REGISTRY, generate_latest, multiprocess
+from contextlib import asynccontextmanager
 from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator
+import asyncio
+import logging
+import os
 
 settings = get_settings()
+logger = logging.getLogger("uvicorn.error")
+
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
+async def preload_default_collection(app: FastAPI) -> None:
+    """Load the default collection's index and model clients ahead of the first request."""
+    started = time.perf_counter()
+    try:
+        async with app.state.collections.acquire(DEFAULT_COLLECTION):
+            pass
+    except Exception as e:
+        logger.warning("Preloading the default collection failed: %s", e)
+        return
+    app.state.startup["preload_seconds"] = round(time.perf_counter() - started, 3)
+    logger.info("Default collection preloaded in %.3fs", app.state.startup["preload_seconds"])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Create the collection registry and ingestion queue; collections, their indexes
+    and the model clients are only loaded when first used, unless preloading is enabled."""
+    started = time.perf_counter()
+    collections = CollectionRegistry(
+        Path(settings.STORAGE_DIR),
+        memory_limit_bytes=settings.COLLECTION_MEMORY_LIMIT_MB * 1024 * 1024,
+        max_loaded=settings.MAX_LOADED_COLLECTIONS
+    )
+    app.state.collections = collections
+    app.state.ingestion_queue = IngestionQueue(
+        collections,
+        workers=settings.INGESTION_WORKERS,
+        history=settings.INGESTION_JOB_HISTORY
+    )
+    app.state.startup = {
+        "import_seconds": round(IMPORT_SECONDS, 3),
+        "lifespan_seconds": round(time.perf_counter() - started, 3),
+        "preload_seconds": None
+    }
+    logger.info(
+        "Startup: imports %.3fs, lifespan %.3fs",
+        app.state.startup["import_seconds"], app.state.startup["lifespan_seconds"]
+    )
+
+    preload = None
+    if settings.PRELOAD_DEFAULT_COLLECTION:
+        # In the background, so the server accepts requests (and health probes) meanwhile
+        preload = asyncio.create_task(preload_default_collection(app))
+    try:
+        yield
+    finally:
+        if preload is not None:
+            preload.cancel()
+        await app.state.ingestion_queue.close()
+        collections.close()
+        if get_extraction_pool.cache_info().currsize:
+            get_extraction_pool().shutdown(cancel_futures=True)
 
 # Create FastAPI app
 app = FastAPI(
@@ -28,7 +97,8 @@ app = FastAPI(
     """,
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -49,6 +119,21 @@ async def root():
     """Redirect root to docs."""
     return RedirectResponse(url="/docs")
 
+# Prometheus metrics
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request) -> Response:
+    """Expose workflow, model call and index metrics in Prometheus text format.
+
+    With several workers, set PROMETHEUS_MULTIPROC_DIR so a scrape
+    aggregates every worker instead of whichever one answers.
+    """
+    update_index_metrics(request.app.state.collections)
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
 # Welcome endpoint
 @app.get("/welcome", tags=["general"])
 async def welcome():
@@ -61,6 +146,7 @@ async def welcome():
             "docs": "/docs",
             "redoc": "/redoc",
             "health": "/api/v1/health",
+            "metrics": "/metrics",
             "initialize": "/api/v1/initialize",
             "ask": "/api/v1/ask"
         },
@@ -79,7 +165,8 @@ async def http_exception_handler(request: Request, exc: HTTPException) -> JSONRe
                 "message": str(exc.detail),
                 "type": "http_error"
             }
-        }
+        },
+        headers=exc.headers
     )
 
 @app.exception_handler(Exception)
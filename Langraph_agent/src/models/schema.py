@@ -1,17 +1,54 @@
-from typing import Dict, Any, TypedDict, List, Optional
-from pydantic import BaseModel
+from typing import Dict, Any, Literal, TypedDict, List, Optional
+from pydantic import BaseModel, Field
 
 class WorkflowState(TypedDict):
     query: str
+    user: str | None
+    retrieval_mode: str | None
+    top_k: int | None
+    score_threshold: float | None
     retrieved_docs: list[str] | None
     source_names: list[str] | None
+    retrieved_ids: list[int] | None
+    query_embedding: Any
     reasoning_output: str | None
     response: str | None
     metadata: Dict[str, Any] | None
+    route: str | None  # small_talk, no_documents, simple or full; set by the route node
+    # Conversation sessions only; kept between turns by the checkpointer
+    session_id: str | None
+    history: list[dict] | None  # Recent {"question", "answer"} turns
+    summary: str | None  # Rolling summary of older turns
+    previous_query_embedding: Any
+    previous_ids: list[int] | None
 
 class QueryRequest(BaseModel):
     query: str
+    collection: str = "default"
+    user: Optional[str] = None  # Name the assistant may address in its answer
+    mode: Optional[Literal["vector", "lexical", "hybrid"]] = None  # Defaults to RETRIEVAL_MODE
+    top_k: Optional[int] = Field(None, ge=1, le=100)  # Defaults to TOP_K
+    score_threshold: Optional[float] = Field(None, ge=-1, le=1)  # Defaults to SCORE_THRESHOLD
+    session_id: Optional[str] = Field(None, min_length=1, max_length=128)  # Continues a conversation
 
 class QueryResponse(BaseModel):
     answer: str
-    sources: Optional[List[str]] = None
\ No newline at end of file
+    sources: Optional[List[str]] = None
+
+class IngestionJob(BaseModel):
+    job_id: str
+    collection: str
+    status: str  # queued, running, completed or failed
+    total_files: int = 0
+    processed_files: int = 0
+    duplicate_files: int = 0  # Already stored; skipped or linked per DEDUP_MODE
+    total_chunks: int = 0
+    embedded_chunks: int = 0
+    indexed_chunks: int = 0
+    errors: List[str] = []
+    created_at: str
+    finished_at: Optional[str] = None
+
+class ImportRequest(BaseModel):
+    path: str  # Directory relative to the configured IMPORT_ROOT
+    collection: str = "default"
@@ -0,0 +1,19 @@
+import os
+import tempfile
+
+# Settings are read at import time: use the offline models and keep caches out of the working tree
+os.environ.setdefault("MODEL_PROVIDER", "fake")
+os.environ.setdefault("STORAGE_DIR", tempfile.mkdtemp(prefix="rag-tests-"))
+os.environ.setdefault("EMBEDDING_CACHE_PERSIST", "false")
+
+import pytest
+
+from src.core.document_manager import DocumentManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """A document manager with its own storage directory."""
+    manager = DocumentManager(str(tmp_path))
+    yield manager
+    manager.close()
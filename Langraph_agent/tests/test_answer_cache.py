@@ -0,0 +1,65 @@
+import asyncio
+import re
+
+from src.core.answer_cache import SemanticAnswerCache
+from src.core.fake_models import FakeChatModel, FakeEmbeddings
+from src.core.workflow import ConversationalWorkflow
+
+USER_PATTERN = re.compile(r"Current User: (\S+)")
+
+
+class _AddressingModel(FakeChatModel):
+    """Answers by greeting the user named in the system prompt, counting its calls."""
+
+    calls: int = 0
+
+    def _answer(self, messages):
+        self.calls += 1
+        match = USER_PATTERN.search(str(messages[0].content))
+        return [f"Hello {match.group(1) if match else 'nobody'}, the total is 42."]
+
+
+def test_lookup_hits_only_for_the_same_user():
+    cache = SemanticAnswerCache(similarity_threshold=0.9)
+    cache.store("What is the total?", [1.0, 0.0], [3, 7], "Hello Ann", user="Ann")
+
+    assert cache.lookup("what is the total?", [1.0, 0.0], [3, 7], user="Ann") == "Hello Ann"
+    assert cache.lookup("What is the total?", [1.0, 0.0], [3, 7], user="Bob") is None
+    assert cache.lookup("What is the total?", [1.0, 0.0], [3, 7]) is None
+    # Near-duplicate questions are scoped the same way
+    assert cache.lookup("And the total?", [0.99, 0.1], [3, 7], user="Ann") == "Hello Ann"
+    assert cache.lookup("And the total?", [0.99, 0.1], [3, 7], user="Bob") is None
+
+
+def test_lookup_misses_for_other_chunks():
+    cache = SemanticAnswerCache()
+    cache.store("What is the total?", [1.0, 0.0], [3, 7], "42")
+
+    assert cache.lookup("What is the total?", [1.0, 0.0], [3, 7]) == "42"
+    assert cache.lookup("What is the total?", [1.0, 0.0], [3, 8]) is None
+    cache.invalidate()
+    assert cache.lookup("What is the total?", [1.0, 0.0], [3, 7]) is None
+
+
+def test_users_asking_the_same_question_get_their_own_answer(manager):
+    model = _AddressingModel()
+    workflow = ConversationalWorkflow(manager, embeddings=FakeEmbeddings(64), llm=model, simple_llm=model)
+    question = "Explain why the invoice total changed between the two quarters"
+
+    async def ask():
+        stored = await manager.store_document("invoice.txt", b"The invoice total rose to 42 after the audit. " * 20, {})
+        await manager.index_documents([stored])
+        return [
+            (await workflow.aexecute(question, user=user))["response"]["answer"]
+            for user in ("Ann", "Bob", "Ann")
+        ]
+
+    try:
+        ann, bob, ann_again = asyncio.run(ask())
+    finally:
+        workflow.close()
+    assert "Ann" in ann and "Bob" not in ann
+    assert "Bob" in bob and "Ann" not in bob
+    # Ann's second question is served from the cache
+    assert ann_again == ann
+    assert model.calls == 2
@@ -0,0 +1,118 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.core.concurrency import ModelCallLimiter
+from src.core.embedding_batcher import BatchedQueryEmbeddings
+from src.core.search_batcher import SearchBatcher
+
+
+class _Index:
+    """Records each batch searched; query i's hits are (i * 10 + n, n) for n < k."""
+
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+
+    def search(self, queries, k, *args):
+        self.batches.append((len(queries), k, args))
+        if self.fail:
+            raise RuntimeError("index unavailable")
+        return [[(int(query[0]) * 10 + n, float(n)) for n in range(k)] for query in queries]
+
+
+class _Embeddings:
+    """Embeds a text as [its length]; fails every call if `fail` is set."""
+
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.fail = fail
+
+    async def aembed_documents(self, texts, task_type=None):
+        self.calls.append((list(texts), task_type))
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("quota exceeded")
+        return [[float(len(text))] for text in texts]
+
+
+async def _gather(*calls):
+    return await asyncio.wait_for(asyncio.gather(*calls, return_exceptions=True), timeout=2)
+
+
+def test_search_batcher_shares_one_search_per_window():
+    index = _Index()
+    batcher = SearchBatcher(index.search, max_batch=8, window_seconds=0.01)
+
+    results = asyncio.run(_gather(*(batcher.search([i], k) for i, k in ((1, 2), (2, 3), (3, 1)))))
+    assert results == [[(10, 0.0), (11, 1.0)], [(20, 0.0), (21, 1.0), (22, 2.0)], [(30, 0.0)]]
+    assert index.batches == [(3, 3, ())]
+    assert (batcher.batches, batcher.queries) == (1, 3)
+
+
+def test_search_batcher_splits_at_max_batch_and_by_arguments():
+    index = _Index()
+    batcher = SearchBatcher(index.search, max_batch=2, window_seconds=0.01)
+    old, new = object(), object()
+
+    async def run():
+        return await _gather(*(batcher.search([i], 1, old if i < 5 else new) for i in range(7)))
+
+    assert [hits[0][0] for hits in asyncio.run(run())] == [0, 10, 20, 30, 40, 50, 60]
+    assert [(size, args) for size, _, args in index.batches] == [
+        (2, (old,)), (2, (old,)), (1, (old,)), (2, (new,))
+    ]
+
+
+def test_search_batcher_fails_every_waiter_and_recovers():
+    index = _Index(fail=True)
+    batcher = SearchBatcher(index.search, max_batch=8, window_seconds=0.01)
+
+    results = asyncio.run(_gather(*(batcher.search([i], 1) for i in range(3))))
+    assert len(index.batches) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    index.fail = False
+    assert asyncio.run(batcher.search([4], 1)) == [(40, 0.0)]
+
+
+def test_search_batcher_rejects_empty_batches():
+    with pytest.raises(ValueError):
+        SearchBatcher(_Index().search, max_batch=0)
+
+
+def test_query_embeddings_share_one_call_per_window():
+    client = _Embeddings()
+    embeddings = BatchedQueryEmbeddings(client, max_batch=8, window_seconds=0.01)
+
+    vectors = asyncio.run(_gather(*(embeddings.aembed_query(text) for text in ("a", "bb", "ccc"))))
+    assert [vector.tolist() for vector in vectors] == [[1.0], [2.0], [3.0]]
+    assert all(vector.dtype == np.float32 for vector in vectors)
+    # Asked for query embeddings, as the client tells them apart
+    assert client.calls == [(["a", "bb", "ccc"], "RETRIEVAL_QUERY")]
+    assert embeddings.stats()["mean_batch_size"] == 3
+
+
+def test_full_query_batches_go_out_without_waiting():
+    client = _Embeddings()
+    embeddings = BatchedQueryEmbeddings(client, max_batch=2, window_seconds=60)
+
+    vectors = asyncio.run(_gather(*(embeddings.aembed_query("x" * n) for n in range(1, 5))))
+    assert [vector.tolist() for vector in vectors] == [[1.0], [2.0], [3.0], [4.0]]
+    assert [texts for texts, _ in client.calls] == [["x", "xx"], ["xxx", "xxxx"]]
+    assert embeddings.stats()["mean_batch_fill"] == 1.0
+
+
+def test_query_embedding_errors_reach_every_waiter():
+    client = _Embeddings(fail=True)
+    limiter = ModelCallLimiter(1)
+    embeddings = BatchedQueryEmbeddings(client, max_batch=8, window_seconds=0.01, limiter=limiter)
+
+    results = asyncio.run(_gather(*(embeddings.aembed_query(text) for text in ("a", "b", "c"))))
+    assert len(client.calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert limiter.in_flight == 0
+
+    client.fail = False
+    assert asyncio.run(embeddings.aembed_query("dd")).tolist() == [2.0]
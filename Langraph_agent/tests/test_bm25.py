@@ -0,0 +1,132 @@
+import math
+
+import numpy as np
+import pytest
+
+from src.core.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+
+CORPUS = [
+    "the invoice total is due in march",
+    "error ERR-404 raised by src/core/bm25.py",
+    "the quarterly report covers revenue and the invoice backlog",
+    "revenue grew in the third quarter",
+    "invoice invoice invoice reminder",
+]
+
+
+def _index(texts=CORPUS, **options) -> BM25Index:
+    index = BM25Index(**options)
+    index.add(range(len(texts)), texts)
+    return index
+
+
+def _reference_scores(texts, query, k1=1.2, b=0.75):
+    """Textbook BM25 over the whole corpus."""
+    documents = [tokenize(text) for text in texts]
+    average = sum(map(len, documents)) / len(documents)
+    scores = {}
+    for i, tokens in enumerate(documents):
+        score = 0.0
+        for term in set(tokenize(query)):
+            tf = tokens.count(term)
+            if not tf:
+                continue
+            df = sum(term in other for other in documents)
+            idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+            score += idf * (k1 + 1) * tf / (tf + k1 * (1 - b + b * len(tokens) / average))
+        if score:
+            scores[i] = score
+    return scores
+
+
+def test_tokenize_keeps_identifiers_whole_and_split():
+    assert tokenize("See ERR-404 in v1.2") == ["see", "err-404", "err", "404", "in", "v1.2", "v1", "2"]
+
+
+def test_scores_match_reference_bm25():
+    # common_fraction=1 scores every matched term's full posting list
+    index = _index(common_fraction=1.0)
+    for query in ("revenue march", "quarter report", "err-404", "invoice"):
+        expected = _reference_scores(CORPUS, query)
+        hits = index.search(query, k=len(CORPUS))
+        assert [i for i, _ in hits] == sorted(expected, key=expected.get, reverse=True)
+        assert [score for _, score in hits] == pytest.approx([expected[i] for i, _ in hits], rel=1e-5)
+
+
+def test_ranks_known_documents_first():
+    index = _index()
+    assert index.search("invoice reminder", k=1)[0][0] == 4
+    assert index.search("ERR-404", k=1)[0][0] == 1
+    assert index.search("bm25.py", k=1)[0][0] == 1
+    assert [i for i, _ in index.search("revenue", k=5)] == [3, 2]
+    assert index.search("unknown words", k=5) == []
+    # "invoice" is in over half of the chunks, so only the rarer "revenue" counts
+    assert [i for i, _ in index.search("invoice revenue", k=5)] == [3, 2]
+
+
+def test_common_terms_only_rescore_candidates():
+    # "filler" is in a quarter of the chunks, so it only adds to chunks matching "invoice"
+    texts = [f"{'filler' if n < 50 else 'other'} text number {n}" for n in range(200)]
+    texts += ["filler invoice", "plain invoice"]
+    index = _index(texts)
+    hits = index.search("filler invoice", k=10)
+    assert [i for i, _ in hits] == [200, 201]
+    assert hits[0][1] > hits[1][1]
+
+
+def test_removed_chunks_are_never_returned():
+    texts = [f"the filler text number {n}" for n in range(200)] + ["invoice one", "invoice two", "invoice three"]
+    index = _index(texts)
+    index.remove([200, 202, 5])
+
+    assert len(index) == len(texts) - 3
+    assert [i for i, _ in index.search("invoice", k=10)] == [201]
+    assert 5 not in {i for i, _ in index.search("the filler number 5", k=300)}
+    index.remove([201])
+    assert index.search("invoice", k=10) == []
+
+
+def test_end_leaves_out_later_chunks():
+    index = _index()
+    index.add([5, 6], ["invoice total", "invoice"])
+
+    assert {i for i, _ in index.search("invoice", k=10)} == {0, 2, 4, 5, 6}
+    assert {i for i, _ in index.search("invoice", k=10, end=5)} == {0, 2, 4}
+    assert index.search("invoice", k=10, end=0) == []
+
+
+def test_excluded_chunks_are_left_out_of_the_top_k():
+    texts = [f"invoice number {n}" for n in range(20)] + ["invoice"] * 3
+    index = _index(texts)
+    # The shortest chunks score best; excluding them ranks deeper instead of returning fewer
+    assert {i for i, _ in index.search("invoice", k=3)} == {20, 21, 22}
+    hits = index.search("invoice", k=3, exclude={20, 21, 22, 0})
+    assert len(hits) == 3 and not {i for i, _ in hits} & {20, 21, 22, 0}
+    assert len(index) == len(texts)
+    assert {i for i, _ in index.search("invoice", k=3)} == {20, 21, 22}
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_load_of_save_gives_equal_results(tmp_path, mmap):
+    index = _index()
+    index.remove([2])
+    index.save(tmp_path / "lexical")
+    loaded = BM25Index.load(tmp_path / "lexical", mmap=mmap)
+
+    assert len(loaded) == len(index)
+    for query in ("invoice", "revenue quarter", "err-404 bm25.py", "the"):
+        assert loaded.search(query, k=5) == index.search(query, k=5)
+
+    # Mapped postings are copied on append, leaving the files unchanged
+    for current in (index, loaded):
+        current.add([5], ["invoice revenue"])
+    assert loaded.search("invoice revenue", k=5) == index.search("invoice revenue", k=5)
+    assert np.load(tmp_path / "lexical" / "lengths.npy").shape == (5,)
+
+
+def test_reciprocal_rank_fusion():
+    assert reciprocal_rank_fusion([[1, 2, 3], [3, 1]]) == [1, 3, 2]
+    assert reciprocal_rank_fusion([[7, 8], []]) == [7, 8]
+    assert reciprocal_rank_fusion([]) == []
+    # Ids ranked by both lists beat those ranked higher by only one
+    assert reciprocal_rank_fusion([[1, 2], [2, 3]]) == [2, 1, 3]
@@ -0,0 +1,87 @@
+import pytest
+
+from src.core.chunking import TextChunker, iter_batches, join_pages
+
+SENTENCES = [f"Sentence number {n} is here." for n in range(12)]  # 27 or 28 characters each
+TEXT = " ".join(SENTENCES)
+
+
+def test_rejects_invalid_sizes():
+    with pytest.raises(ValueError):
+        TextChunker(chunk_size=0)
+    with pytest.raises(ValueError):
+        TextChunker(chunk_size=100, chunk_overlap=100)
+
+
+@pytest.mark.parametrize("text", ["", "   ", "\n\n\n", " \t\n "])
+def test_empty_or_blank_text_has_no_chunks(text):
+    assert list(TextChunker(chunk_size=50, chunk_overlap=10).split(text)) == []
+
+
+def test_chunks_hold_whole_sentences_within_the_size():
+    chunks = list(TextChunker(chunk_size=100, chunk_overlap=0).split(TEXT))
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk.text) <= 100
+        assert chunk.text == TEXT[chunk.start:chunk.end]
+        assert chunk.text.startswith("Sentence") and chunk.text.endswith(".")
+    # Without overlap the chunks cover every sentence exactly once
+    assert " ".join(chunk.text for chunk in chunks) == TEXT
+
+
+def test_chunks_overlap_by_trailing_sentences():
+    chunks = list(TextChunker(chunk_size=100, chunk_overlap=60).split(TEXT))
+
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous.start < current.start < previous.end
+        assert previous.end - current.start <= 60
+        # The overlap is whole sentences: the next chunk starts on one of the previous chunk's
+        assert TEXT[current.start:previous.end] in previous.text
+        assert TEXT[current.start:].startswith("Sentence")
+    assert chunks[0].start == 0 and chunks[-1].end == len(TEXT)
+
+
+def test_overlap_never_stalls_on_a_single_sentence():
+    text = "One. " + "x" * 30 + ". Two."
+    chunks = list(TextChunker(chunk_size=20, chunk_overlap=15).split(text))
+
+    starts = [chunk.start for chunk in chunks]
+    assert starts == sorted(set(starts))
+    assert chunks[-1].end == len(text)
+
+
+def test_oversized_sentences_are_split_at_whitespace():
+    text = " ".join(["word"] * 50) + "."
+    chunks = list(TextChunker(chunk_size=32, chunk_overlap=0).split(text))
+
+    assert all(len(chunk.text) <= 32 for chunk in chunks)
+    assert all(not chunk.text.startswith(" ") and not chunk.text.endswith(" ") for chunk in chunks)
+    assert " ".join(chunk.text for chunk in chunks) == text
+    # A word longer than the size is cut where the size ends
+    assert [chunk.text for chunk in TextChunker(chunk_size=4, chunk_overlap=0).split("abcdefghij")] == ["abcd", "efgh", "ij"]
+
+
+def test_join_pages_records_page_starts():
+    text, offsets = join_pages(["first page", "", "third"])
+    assert text == "first page\n\nthird"
+    assert offsets == [0, 11, 12]
+
+
+def test_chunks_map_to_the_page_they_start_on():
+    pages = [" ".join(SENTENCES[:4]), " ".join(SENTENCES[4:8]), " ".join(SENTENCES[8:])]
+    text, offsets = join_pages(pages)
+    chunks = list(TextChunker(chunk_size=60, chunk_overlap=0).split(text, offsets))
+
+    for chunk in chunks:
+        page = max(n for n, offset in enumerate(offsets, start=1) if offset <= chunk.start)
+        assert chunk.page == page
+        assert chunk.text.split(" is here.")[0] in pages[page - 1]
+    assert [chunk.page for chunk in chunks][0] == 1 and chunks[-1].page == 3
+    assert {chunk.page for chunk in chunks} == {1, 2, 3}
+    assert all(chunk.page is None for chunk in TextChunker(60, 0).split(text))
+
+
+def test_iter_batches():
+    assert list(iter_batches(iter(range(7)), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(iter_batches([], 3)) == []
@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+from src.config.settings import get_settings
+from src.core.document_manager import DuplicateDocumentError
+from src.core.fake_models import FakeChatModel, FakeEmbeddings
+from src.core.workflow import ConversationalWorkflow
+
+REPORT = " ".join(f"Paragraph {n} of the zebra migration report covers route {n} in detail." for n in range(60))
+
+
+@pytest.fixture
+def workflow(manager):
+    workflow = ConversationalWorkflow(manager, embeddings=FakeEmbeddings(64), llm=FakeChatModel())
+    yield workflow
+    workflow.close()
+
+
+@pytest.fixture
+def dedup_mode(monkeypatch):
+    def set_mode(mode: str) -> None:
+        monkeypatch.setattr(get_settings(), "DEDUP_MODE", mode)
+    return set_mode
+
+
+def _upload(manager, filename: str, text: str) -> str:
+    """Store and index a text file, returning its document id or, for a duplicate, the id it is known by."""
+    async def upload():
+        stored = await manager.store_document(filename, text.encode("utf-8"), {})
+        await manager.index_documents([stored])
+        return stored[0]
+
+    try:
+        return asyncio.run(upload())
+    except DuplicateDocumentError as e:
+        return e.document_id
+
+
+def _chunks(manager, document_id: str) -> list:
+    return [row[0] for row in manager.db.execute("SELECT chunk_id FROM chunks WHERE document_id = ?", (document_id,))]
+
+
+def _searchable(workflow, word: str) -> set:
+    store = workflow.retrieval_agent.vector_store
+    return {chunk_id for chunk_id, _ in store.lexical_search(word, k=100)}
+
+
+def test_identical_uploads_are_separate_documents_by_default(manager, workflow):
+    assert get_settings().DEDUP_MODE == "off"
+    first = _upload(manager, "report.txt", REPORT)
+    second = _upload(manager, "report.txt", REPORT)
+
+    assert first != second
+    assert manager.get_document(second)["duplicate_of"] is None
+    assert _chunks(manager, first) and _chunks(manager, second)
+    assert len(_searchable(workflow, "zebra")) == len(_chunks(manager, first)) * 2
+
+
+def test_skip_mode_answers_with_the_stored_document(manager, workflow, dedup_mode):
+    dedup_mode("skip")
+    original = _upload(manager, "report.txt", REPORT)
+
+    with pytest.raises(DuplicateDocumentError) as error:
+        asyncio.run(manager.store_document("copy.txt", REPORT.encode("utf-8"), {}))
+    assert error.value.document_id == error.value.duplicate_of == original
+    assert manager.list_documents()["total"] == 1
+
+
+def test_deleting_the_original_hands_chunks_and_files_to_the_linked_copy(manager, workflow, dedup_mode):
+    dedup_mode("link")
+    original = _upload(manager, "report.txt", REPORT)
+    chunk_ids = _chunks(manager, original)
+    # Same text in a differently encoded file: caught after extraction
+    copy = _upload(manager, "copy.txt", REPORT.replace(" ", "  "))
+
+    assert copy != original
+    assert manager.get_document(copy)["duplicate_of"] == original
+    assert manager.get_document(copy)["chunk_count"] == len(chunk_ids)
+    assert not (manager.docs_dir / f"{copy}.txt").exists()
+    assert manager.get_document_text(copy) == manager.get_document_text(original)
+
+    assert asyncio.run(manager.delete_document(original))
+    heir = manager.get_document(copy)
+    assert heir["duplicate_of"] is None and heir["chunk_count"] == len(chunk_ids)
+    assert _chunks(manager, copy) == chunk_ids
+    assert (manager.docs_dir / f"{copy}.txt").exists()
+    assert not (manager.docs_dir / f"{original}.txt").exists()
+    assert manager.get_document_text(copy).startswith("Paragraph 0")
+    assert _searchable(workflow, "zebra") == set(chunk_ids)
+
+    # The last holder takes the chunks with it
+    assert asyncio.run(manager.delete_document(copy))
+    assert _searchable(workflow, "zebra") == set()
+    assert manager.list_documents()["total"] == 0
+
+
+def test_deleting_an_owner_hands_shared_chunks_to_the_referencing_document(manager, workflow, dedup_mode):
+    dedup_mode("link")
+    original = _upload(manager, "report.txt", REPORT)
+    # A new version: its unchanged chunks near-duplicate the original's and are shared, not indexed again
+    appendix = " ".join(f"Appendix note {n} on the okapi survey at site {n}." for n in range(40))
+    revised = _upload(manager, "report-v2.txt", REPORT + " " + appendix)
+    shared = {row[0] for row in manager.db.execute("SELECT chunk_id FROM chunk_refs WHERE document_id = ?", (revised,))}
+    assert manager.get_document(revised)["duplicate_of"] is None
+    assert shared and shared <= set(_chunks(manager, original))
+    own = set(_chunks(manager, revised))
+    dropped = set(_chunks(manager, original)) - shared
+    assert dropped
+
+    assert asyncio.run(manager.delete_document(original))
+    # The shared chunks stay searchable, now owned by the new version; the original's others are gone
+    assert set(_chunks(manager, revised)) == own | shared
+    assert shared <= _searchable(workflow, "zebra") <= own | shared
+    assert not dropped & _searchable(workflow, "zebra")
+    assert manager.db.execute("SELECT COUNT(*) FROM chunk_refs").fetchone()[0] == 0
+
+
+def test_failed_indexing_removes_the_batch_and_its_linked_copies(manager, workflow, dedup_mode, monkeypatch):
+    dedup_mode("link")
+
+    async def fail(*args, **kwargs):
+        raise RuntimeError("embedding service down")
+
+    async def upload():
+        stored = await manager.store_document("report.txt", REPORT.encode("utf-8"), {})
+        with pytest.raises(DuplicateDocumentError) as error:
+            await manager.store_document("copy.txt", REPORT.encode("utf-8"), {})
+        monkeypatch.setattr(workflow, "add_documents", fail)
+        with pytest.raises(RuntimeError):
+            await manager.index_documents([stored])
+        return stored[0], error.value.document_id
+
+    original, copy = asyncio.run(upload())
+    assert manager.get_document(original) is None and manager.get_document(copy) is None
+    assert not (manager.docs_dir / f"{original}.txt").exists()
+    assert manager.list_documents()["total"] == 0
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from src.config.settings import get_settings
+from src.core.index_backends import ShardedBackend, read_backend
+
+DIMENSION = 8
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "INDEX_SHARDS", 3)
+    return settings
+
+
+def test_sharded_snapshot_round_trips(tmp_path, settings):
+    vectors = np.random.default_rng(0).standard_normal((30, DIMENSION)).astype(np.float32)
+    backend = ShardedBackend("flat", DIMENSION, settings)
+    backend.add(vectors, np.arange(30, dtype=np.int64))
+    backend.write(str(tmp_path / "index"))
+
+    loaded = read_backend(str(tmp_path / "index"), "flat", settings)
+    assert isinstance(loaded, ShardedBackend) and len(loaded.shards) == 3
+    assert loaded.ntotal == 30
+    assert loaded.search(vectors[[4, 17]], k=1)[1][:, 0].tolist() == [4, 17]
+
+
+def test_reading_a_directory_without_shards_names_it(tmp_path, settings):
+    (tmp_path / "index").mkdir()
+    with pytest.raises(FileNotFoundError, match="index"):
+        read_backend(str(tmp_path / "index"), "flat", settings)
@@ -0,0 +1,200 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api import routes
+from src.config.settings import get_settings
+from src.core import concurrency
+from src.core.collection_registry import CollectionRegistry
+from src.core.concurrency import ModelRateLimitError, RateLimiter, TokenBucket
+from src.core.model_calls import ResilientEmbeddings, call_with_retries, hedged
+from src.core.telemetry import MODEL_HEDGES, MODEL_RETRIES
+from src.core.workflow import ConversationalWorkflow
+
+
+class ResourceExhausted(Exception):
+    """Named like the Google client's 429 error."""
+
+
+class ServiceUnavailable(Exception):
+    """Named like the Google client's 503 error."""
+
+
+class _FlakyEmbeddings:
+    """Fails its first `failures` calls with `error`, and sleeps `delays[n]` on call n."""
+
+    def __init__(self, failures: int = 0, error: Exception = ServiceUnavailable("try again"), delays=()):
+        self.failures = failures
+        self.error = error
+        self.delays = list(delays)
+        self.calls = 0
+
+    async def aembed_query(self, text, **options):
+        call = self.calls
+        self.calls += 1
+        if call < len(self.delays):
+            await asyncio.sleep(self.delays[call])
+        if call < self.failures:
+            raise self.error
+        return [float(call)]
+
+    async def aembed_documents(self, texts, **options):
+        return [await self.aembed_query(text) for text in texts]
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(concurrency, "time", clock)
+    return clock
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "MODEL_MAX_RETRIES", 3)
+    monkeypatch.setattr(settings, "MODEL_RETRY_BASE_DELAY_MS", 1)
+    monkeypatch.setattr(settings, "MODEL_RETRY_MAX_DELAY_MS", 5)
+
+
+def _count(counter, *labels) -> float:
+    return counter.labels(*labels)._value.get()
+
+
+def test_token_bucket_refills_per_minute(clock):
+    bucket = TokenBucket(60)  # One unit per second
+    assert bucket.wait_time(60) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.now += 30
+    assert bucket.wait_time(10) == 0
+    # Overdrawing puts later callers behind the debt
+    bucket.take(40)
+    assert bucket.wait_time(1) == pytest.approx(11.0)
+    # Calls larger than the bucket wait for a full bucket only
+    clock.now += 1000
+    assert bucket.wait_time(500) == 0
+
+
+def test_rate_limiter_refuses_waits_beyond_the_maximum(clock):
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=600, max_wait_seconds=5)
+    assert asyncio.run(limiter.acquire(tokens=600)) == 0
+    with pytest.raises(ModelRateLimitError) as error:
+        asyncio.run(limiter.acquire(tokens=100))
+    assert error.value.retry_after == pytest.approx(10.0)
+
+
+def test_transient_failures_are_retried():
+    client = _FlakyEmbeddings(failures=2)
+    retries = _count(MODEL_RETRIES, "embedding", "unavailable")
+
+    assert asyncio.run(call_with_retries(lambda: client.aembed_query("q"), "embedding")) == [2.0]
+    assert client.calls == 3
+    assert _count(MODEL_RETRIES, "embedding", "unavailable") == retries + 2
+
+
+def test_other_errors_are_not_retried():
+    client = _FlakyEmbeddings(failures=1, error=ValueError("bad request"))
+    with pytest.raises(ValueError):
+        asyncio.run(call_with_retries(lambda: client.aembed_query("q"), "embedding"))
+    assert client.calls == 1
+
+
+def test_persistent_rate_limit_becomes_model_rate_limit_error():
+    client = _FlakyEmbeddings(failures=10, error=ResourceExhausted("quota exceeded, retry_delay { seconds: 0.01 }"))
+    retries = _count(MODEL_RETRIES, "embedding", "rate_limited")
+
+    with pytest.raises(ModelRateLimitError) as error:
+        asyncio.run(call_with_retries(lambda: client.aembed_query("q"), "embedding"))
+    assert client.calls == 4
+    assert _count(MODEL_RETRIES, "embedding", "rate_limited") == retries + 3
+    assert error.value.retry_after == pytest.approx(0.01)
+    assert isinstance(error.value.__cause__, ResourceExhausted)
+
+
+def test_retries_wait_as_long_as_the_server_asks():
+    client = _FlakyEmbeddings(failures=1, error=ResourceExhausted("retry_delay { seconds: 0.2 }"))
+
+    async def timed():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await call_with_retries(lambda: client.aembed_query("q"), "embedding")
+        return loop.time() - started
+
+    assert asyncio.run(timed()) >= 0.2
+
+
+def test_slow_query_embedding_is_hedged():
+    client = _FlakyEmbeddings(delays=[5.0])
+    embeddings = ResilientEmbeddings(client)
+    embeddings.hedge_delay_seconds = 0.01
+    hedges = _count(MODEL_HEDGES, "embedding")
+
+    # The duplicate request answers while the first is still waiting
+    assert asyncio.run(asyncio.wait_for(embeddings.aembed_query("q"), timeout=1)) == [1.0]
+    assert client.calls == 2
+    assert _count(MODEL_HEDGES, "embedding") == hedges + 1
+
+
+def test_fast_query_embedding_is_not_hedged():
+    client = _FlakyEmbeddings()
+    embeddings = ResilientEmbeddings(client)
+    embeddings.hedge_delay_seconds = 1.0
+
+    assert asyncio.run(embeddings.aembed_query("q")) == [0.0]
+    assert client.calls == 1
+
+
+def test_hedged_raises_when_every_request_fails():
+    async def fail():
+        await asyncio.sleep(0.02)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(hedged(fail, 0.01, "embedding"))
+
+
+def test_rate_limit_error_is_found_through_wrapping():
+    limited = ModelRateLimitError("slow down", retry_after=2.5)
+    try:
+        try:
+            raise limited
+        except ModelRateLimitError as e:
+            raise Exception(f"Workflow execution failed: {str(e)}")
+    except Exception as wrapped:
+        assert routes._rate_limit_error(wrapped) is limited
+    assert routes._rate_limit_error(ValueError("other")) is None
+
+
+def test_ask_answers_429_with_retry_after(tmp_path, monkeypatch):
+    client = _FlakyEmbeddings(failures=10, error=ResourceExhausted("retry_delay { seconds: 2.5 }"))
+
+    async def aexecute(self, query, **options):
+        # Fails the way the workflow does: a rate-limited model call inside a wrapped error
+        try:
+            return await call_with_retries(lambda: client.aembed_query(query), "llm")
+        except Exception as e:
+            raise Exception(f"Workflow execution failed: {str(e)}")
+
+    monkeypatch.setattr(get_settings(), "MODEL_MAX_RETRIES", 0)
+    monkeypatch.setattr(ConversationalWorkflow, "aexecute", aexecute)
+    app = FastAPI()
+    app.include_router(routes.router)
+    app.state.collections = CollectionRegistry(tmp_path, memory_limit_bytes=1 << 30, max_loaded=1)
+    try:
+        response = TestClient(app).post("/api/v1/ask", json={"query": "What is the total?"})
+    finally:
+        app.state.collections.close()
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
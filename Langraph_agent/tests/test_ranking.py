@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from src.core.ranking import cosine_similarities, estimate_tokens, maximal_marginal_relevance, pack_context
+
+QUERY = [1.0, 0.1]
+# Two near-identical chunks close to the query, and a different, less relevant one
+VECTORS = np.array([[1.0, 0.1], [0.99, 0.12], [0.3, 1.0]], dtype=np.float32)
+
+
+def test_estimate_tokens_rounds_up():
+    assert [estimate_tokens(text) for text in ("", "abc", "abcd", "abcde")] == [0, 1, 1, 2]
+
+
+def test_cosine_similarities_ignore_length():
+    similarities = cosine_similarities([2.0, 0.0], np.array([[3.0, 0.0], [0.0, 1.0], [0.0, 0.0]]))
+    assert similarities == pytest.approx([1.0, 0.0, 0.0])
+
+
+def test_mmr_of_no_candidates_is_empty():
+    assert maximal_marginal_relevance(QUERY, np.zeros((0, 2), dtype=np.float32), k=3) == []
+
+
+def test_mmr_returns_every_candidate_once_when_k_exceeds_them():
+    assert sorted(maximal_marginal_relevance(QUERY, VECTORS, k=10)) == [0, 1, 2]
+
+
+def test_mmr_pushes_near_duplicates_down():
+    assert maximal_marginal_relevance(QUERY, VECTORS, k=3) == [0, 2, 1]
+    assert maximal_marginal_relevance(QUERY, VECTORS, k=2) == [0, 2]
+
+
+def test_mmr_with_lambda_one_ranks_by_relevance():
+    relevance = cosine_similarities(QUERY, VECTORS)
+    assert maximal_marginal_relevance(QUERY, VECTORS, k=3, lambda_mult=1.0) == np.argsort(-relevance).tolist()
+
+
+def test_mmr_with_lambda_zero_only_maximizes_diversity():
+    # Every first pick scores 0, so the first row wins; then the least redundant follow
+    vectors = np.array([[0.0, 1.0], [1.0, 0.0], [0.1, 1.0]], dtype=np.float32)
+    assert maximal_marginal_relevance(QUERY, vectors, k=3, lambda_mult=0.0) == [0, 1, 2]
+
+
+def test_pack_context_of_no_texts_is_empty():
+    assert pack_context([], token_budget=100) == []
+
+
+def test_pack_context_skips_texts_that_overflow():
+    texts = ["a" * 40, "b" * 40, "c" * 8]  # 10, 10 and 2 tokens
+    assert pack_context(texts, token_budget=12) == [(0, texts[0]), (2, texts[2])]
+    assert pack_context(texts, token_budget=22) == list(enumerate(texts))
+
+
+def test_pack_context_truncates_an_oversized_first_text():
+    texts = ["x" * 100, "short"]
+    assert pack_context(texts, token_budget=10) == [(0, "x" * 40)]
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from src.core.fake_models import FakeChatModel, FakeEmbeddings
+from src.core.routing import NO_DOCUMENTS_ANSWER, SMALL_TALK, classify_query
+from src.core.workflow import ConversationalWorkflow
+
+MAX_WORDS = 12
+GREETING, THANKS, FAREWELL = (SMALL_TALK[kind][1] for kind in ("greeting", "thanks", "farewell"))
+
+
+@pytest.mark.parametrize("query, kind, answer", [
+    # Small talk, ignoring case, punctuation and trailing filler words
+    ("Hi", "small_talk", GREETING),
+    ("Hello there!", "small_talk", GREETING),
+    ("good morning everyone", "small_talk", GREETING),
+    ("Thanks so much", "small_talk", THANKS),
+    ("thank you very much for the help", "small_talk", THANKS),
+    ("Bye!", "small_talk", FAREWELL),
+    # Greetings leading into a question are questions
+    ("hi, what is the invoice total?", "full", None),
+    ("thanks, and who signed it?", "full", None),
+    # Short factual questions
+    ("What is the invoice total?", "simple", None),
+    ("how many employees are listed", "simple", None),
+    ("Who signed the contract?", "simple", None),
+    ("Is the warranty still valid?", "simple", None),
+    # Explanation, comparison, several questions, long or unrecognized questions
+    ("Why did the invoice total change?", "full", None),
+    ("What is the difference between the two plans?", "full", None),
+    ("What is the total? Who approved it?", "full", None),
+    ("What " + "very " * MAX_WORDS + "long question is this?", "full", None),
+    ("Tell me about the contract", "full", None),
+    ("", "full", None),
+])
+def test_classify_query(query, kind, answer):
+    assert classify_query(query, MAX_WORDS) == (kind, answer)
+
+
+@pytest.fixture
+def workflow(manager):
+    workflow = ConversationalWorkflow(manager, embeddings=FakeEmbeddings(64), llm=FakeChatModel())
+    yield workflow
+    workflow.close()
+
+
+def _route(workflow, query: str, history=()) -> dict:
+    return workflow._route_query({"query": query, "history": list(history), "summary": None})
+
+
+def test_questions_about_an_empty_collection_skip_retrieval_and_the_model(workflow):
+    update = _route(workflow, "What is the invoice total?")
+    assert update["route"] == "no_documents"
+    assert update["reasoning_output"] == NO_DOCUMENTS_ANSWER and update["retrieved_docs"] == []
+
+    # Small talk keeps its own answer; in a conversation the model still answers
+    assert _route(workflow, "hello")["route"] == "small_talk"
+    conversation = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "Hello!"}]
+    assert "reasoning_output" not in _route(workflow, "What did I just say?", conversation)
+
+    result = asyncio.run(workflow.aexecute("What is the invoice total?"))
+    assert result["response"]["answer"] == NO_DOCUMENTS_ANSWER
+
+
+def test_questions_are_routed_once_documents_exist(manager, workflow):
+    async def upload():
+        stored = await manager.store_document("invoice.txt", b"The invoice total is 42 euros. " * 10, {})
+        await manager.index_documents([stored])
+
+    asyncio.run(upload())
+    assert _route(workflow, "What is the invoice total?") == {"route": "simple"}
+    assert _route(workflow, "Why did the invoice total change?") == {"route": "full"}
+    # A short follow-up may depend on the conversation
+    conversation = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "Hello!"}]
+    assert _route(workflow, "What is the invoice total?", conversation) == {"route": "full"}
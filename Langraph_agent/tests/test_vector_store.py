@@ -0,0 +1,111 @@
+import os
+
+os.environ.setdefault("MODEL_PROVIDER", "fake")
+
+import numpy as np
+import pytest
+
+from src.core import vector_store as vector_store_module
+from src.core.vector_store import VectorStore
+
+DIMENSION = 8
+
+
+class _NoEmbeddings:
+    """Stand-in for the embedding model; vectors are supplied directly."""
+
+
+def _vectors(start: int, count: int) -> np.ndarray:
+    return np.random.default_rng(start).standard_normal((count, DIMENSION)).astype(np.float32)
+
+
+def _add(store: VectorStore, start: int, count: int) -> list:
+    with store.transaction() as writer:
+        return writer.add_vectors(_vectors(start, count), [(f"chunk{start + i}", "doc.txt", None, 0) for i in range(count)])
+
+
+def test_second_store_sees_new_generation_after_refresh(tmp_path):
+    writer = VectorStore(_NoEmbeddings(), tmp_path)
+    reader = VectorStore(_NoEmbeddings(), tmp_path)
+    _add(writer, 0, 100)
+    reader.refresh(force=True)
+    generation = reader.generation
+
+    ids = _add(writer, 100, 5)
+    assert reader.generation == generation and len(reader) == 100
+    assert reader.refresh(force=True)
+    assert reader.generation == writer.generation > generation
+    assert len(reader) == 105
+    assert reader.search(_vectors(100, 5)[2], k=1)[0][0] == ids[2]
+    assert reader.lexical_search("chunk102", k=1)[0][0] == ids[2]
+
+
+def test_search_skips_deleted_chunks(tmp_path):
+    store = VectorStore(_NoEmbeddings(), tmp_path)
+    ids = _add(store, 0, 50)
+    ids += _add(store, 50, 5)
+    # Too few to compact: the deleted vectors stay in the index and base and delta results are filtered
+    deleted = ids[:5] + ids[50:52]
+    with store.transaction() as writer:
+        writer.remove(deleted)
+
+    reader = VectorStore(_NoEmbeddings(), tmp_path)
+    reader.load()
+    for current in (store, reader):
+        queries = np.concatenate([_vectors(0, 50), _vectors(50, 5)])[deleted]
+        results = current.search_batch(queries, k=5)
+        assert all(len(hits) == 5 for hits in results)
+        assert not {i for hits in results for i, _ in hits} & set(deleted)
+        assert not {i for i, _ in current.lexical_search("chunk0 chunk50 chunk51", k=5)} & set(deleted)
+
+
+def test_deletes_leave_earlier_snapshots_unchanged(tmp_path):
+    writer = VectorStore(_NoEmbeddings(), tmp_path)
+    ids = _add(writer, 0, 20)
+    reader = VectorStore(_NoEmbeddings(), tmp_path)
+    reader.load()
+    before = reader.snapshot()
+
+    with writer.transaction() as transaction:
+        transaction.remove(ids[3:4])
+    ids += _add(writer, 20, 2)
+    assert reader.refresh(force=True)
+    after = reader.snapshot()
+
+    # A query still running on the earlier snapshot keeps seeing the deleted chunk, and not the new ones
+    assert reader.lexical_search("chunk3", k=1, snapshot=before)[0][0] == ids[3]
+    assert reader.lexical_search("chunk3", k=1, snapshot=after) == []
+    assert reader.lexical_search("chunk21", k=1, snapshot=before) == []
+    assert reader.lexical_search("chunk21", k=1, snapshot=after)[0][0] == ids[21]
+
+
+def test_crashed_writer_leaves_previous_generation(tmp_path, monkeypatch):
+    store = VectorStore(_NoEmbeddings(), tmp_path)
+    _add(store, 0, 100)
+    _add(store, 100, 5)
+    generation = store.generation
+
+    def crash(*args):
+        raise OSError("writer died before replacing the manifest")
+
+    # Docstore rows and the delta segment are written, the manifest is not
+    with monkeypatch.context() as patch:
+        patch.setattr(vector_store_module.os, "replace", crash)
+        with pytest.raises(OSError):
+            _add(store, 200, 5)
+
+    fresh = VectorStore(_NoEmbeddings(), tmp_path)
+    fresh.load()
+    for current in (store, fresh):
+        current.refresh(force=True)
+        assert current.generation == generation
+        assert len(current) == 105
+        assert current.search(_vectors(200, 5)[0], k=1)[0][0] < 105
+
+    # The next writer continues from the committed generation
+    ids = _add(store, 300, 5)
+    assert ids[0] == 105
+    fresh.refresh(force=True)
+    assert len(fresh) == 110
+    assert fresh.documents[ids[0]][0] == "chunk300"
+    assert fresh.search(_vectors(300, 5)[0], k=1)[0][0] == ids[0]